@@ -0,0 +1,379 @@
+#!/usr/bin/python3
+
+import asyncio
+import bisect
+import os
+import signal
+import sqlite3
+import sys
+import time
+
+from collections import Counter
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from acdsc import inotify
+from acdsc.exporter import Metrics, content_type
+from acdsc.parser import make_ac_parser
+
+# acServer asks AUTH_PLUGIN_ADDRESS (with the GUID appended) whether a
+# driver may join and expects OK|guid or DENY|reason back. Every allow and
+# deny source is loaded into an in-memory index that is swapped as a whole
+# when a source changes, so lookups never touch the disk
+latency_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25)
+reload_delay = 0.2
+poll_interval = 2
+
+# allow/deny database, reasons are returned to denied drivers
+schema = '''
+CREATE TABLE IF NOT EXISTS guids (
+    guid TEXT PRIMARY KEY,
+    action TEXT NOT NULL CHECK (action IN ('allow', 'deny')),
+    reason TEXT NOT NULL DEFAULT ''
+)
+'''
+
+
+def auth_path(name):
+    return '/{}'.format(name)
+
+
+def auth_address(listen, name):
+    # acServer appends the GUID to AUTH_PLUGIN_ADDRESS
+    return '{}:{}{}?guid='.format(listen[0], listen[1], auth_path(name))
+
+
+def read_guid_file(path):
+    # guid -> reason, one GUID per line optionally followed by a reason
+    guids = {}
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                guid, _, reason = line.partition(' ')
+                guids[guid] = reason.strip()
+    return guids
+
+
+def read_entry_list_guids(path):
+    # GUID may list several GUIDs separated by ;
+    parser = make_ac_parser(path)
+    guids = set()
+    for section in parser.prefix_sections('CAR'):
+        for guid in parser.get(section, 'GUID', fallback='').split(';'):
+            if guid.strip():
+                guids.add(guid.strip())
+    return guids
+
+
+def read_guid_db(path):
+    allow = set()
+    deny = {}
+    db = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+    try:
+        for guid, action, reason in db.execute(
+                'SELECT guid, action, reason FROM guids'):
+            if action == 'deny':
+                deny[guid] = reason
+            else:
+                allow.add(guid)
+    finally:
+        db.close()
+    return allow, deny
+
+
+def init_guid_db(path):
+    db = sqlite3.connect(path)
+    try:
+        db.execute(schema)
+        db.commit()
+    finally:
+        db.close()
+
+
+def response_head(status, kind, length, keep_alive):
+    lines = ['HTTP/1.1 {} {}'.format(status, HTTPStatus(status).phrase),
+             'Content-Type: {}'.format(kind),
+             'Content-Length: {}'.format(length)]
+    if not keep_alive:
+        lines.append('Connection: close')
+    return '{}\r\n\r\n'.format('\r\n'.join(lines)).encode('latin-1')
+
+
+class GuidIndex(object):
+    # Immutable allow/deny lookup tables, allowed GUIDs are kept per
+    # instance (entry lists) and shared (files and database)
+
+    def __init__(self, instances, allow, deny, allowlist):
+        self.instances = instances
+        self.allow = allow
+        self.deny = deny
+        self.allowlist = allowlist
+
+    def check(self, name, guid):
+        # (allowed, reason)
+        if guid in self.deny:
+            return False, self.deny[guid] or 'banned'
+        if not self.allowlist or guid in self.allow or \
+                guid in self.instances.get(name, ()):
+            return True, None
+        return False, 'not on the allow list'
+
+
+class AuthSources(object):
+
+    def __init__(self, entry_lists, allow_files, deny_files, db, allowlist):
+        self.entry_lists = entry_lists
+        self.allow_files = allow_files
+        self.deny_files = deny_files
+        self.db = db
+        self.allowlist = allowlist
+
+    def paths(self):
+        paths = list(self.entry_lists.values()) + list(self.allow_files) + \
+            list(self.deny_files)
+        if self.db is not None:
+            paths.extend([self.db, '{}-wal'.format(self.db)])
+        return paths
+
+    def stamps(self):
+        # files replaced by a rename may keep their mtime, not their inode
+        found = []
+        for path in self.paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                found.append(None)
+            else:
+                found.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return found
+
+    def load(self):
+        instances = {name: frozenset(read_entry_list_guids(path))
+                     for name, path in self.entry_lists.items()}
+        allow = set()
+        deny = {}
+        for path in self.allow_files:
+            allow.update(read_guid_file(path))
+        for path in self.deny_files:
+            deny.update(read_guid_file(path))
+        if self.db is not None:
+            db_allow, db_deny = read_guid_db(self.db)
+            allow.update(db_allow)
+            deny.update(db_deny)
+        return GuidIndex(instances, frozenset(allow), deny, self.allowlist)
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def add_to(self, metrics, name, help_text, labels):
+        total = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            metrics.add(name, 'histogram', help_text,
+                        dict(labels, le=bucket), total, '_bucket')
+        metrics.add(name, 'histogram', help_text, labels, self.sum, '_sum')
+        metrics.add(name, 'histogram', help_text, labels, self.count,
+                    '_count')
+
+
+class AuthServer(object):
+
+    stop_signals = (signal.SIGTERM, signal.SIGINT)
+
+    def __init__(self, sources, listen):
+        self.sources = sources
+        self.listen = listen
+        self.paths = {auth_path(name): name for name in sources.entry_lists}
+        self.stamps = sources.stamps()
+        self.index = sources.load()
+        self.generation = 0
+        self.loaded = time.time()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.reload_handle = None
+        self.latency = {name: Histogram() for name in sources.entry_lists}
+        self.results = Counter()
+
+    ## Reloading
+
+    def schedule_reload(self):
+        # coalesce the events of a single save (or a burst of saves)
+        loop = asyncio.get_running_loop()
+        if self.reload_handle is not None:
+            self.reload_handle.cancel()
+        self.reload_handle = loop.call_later(
+            reload_delay, lambda: asyncio.ensure_future(self.reload()))
+
+    async def reload(self):
+        # a reload started earlier may finish later, it must not replace
+        # the index of a newer one
+        loop = asyncio.get_running_loop()
+        self.generation += 1
+        generation = self.generation
+        stamps = self.sources.stamps()
+        try:
+            index = await loop.run_in_executor(None, self.sources.load)
+        except (IOError, sqlite3.Error, ValueError) as err:
+            self.reload_errors += 1
+            sys.stderr.write('reload failed, keeping the previous index: '
+                             '{}\n'.format(err))
+            return
+        if generation != self.generation:
+            return
+        self.stamps = stamps
+        self.index = index
+        self.loaded = time.time()
+        self.reloads += 1
+
+    def watch(self):
+        # watch the directories of the sources, files are often replaced
+        # by renaming a new copy over them
+        loop = asyncio.get_running_loop()
+        watcher = inotify.Inotify()
+        names = {}
+        for path in self.sources.paths():
+            directory = os.path.dirname(os.path.abspath(path))
+            if directory not in names.values():
+                wd = watcher.add_watch(
+                    directory, inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO |
+                    inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MODIFY)
+                names[wd] = directory
+        watched = set(os.path.abspath(path) for path in self.sources.paths())
+
+        def changed():
+            for wd, _, _, name in watcher.read(0):
+                if os.path.join(names.get(wd, ''), name) in watched:
+                    self.schedule_reload()
+                    return
+
+        loop.add_reader(watcher.fileno(), changed)
+        return watcher
+
+    async def poll(self):
+        # without inotify compare the sources every poll_interval seconds
+        while True:
+            await asyncio.sleep(poll_interval)
+            if self.sources.stamps() != self.stamps:
+                await self.reload()
+
+    ## HTTP
+
+    def respond(self, path, query):
+        # (status, content type, body)
+        if path == '/metrics':
+            return 200, content_type, self.metrics().render()
+        name = self.paths.get(path)
+        if name is None:
+            return 404, 'text/plain', b'not found'
+        guid = ''.join(parse_qs(query).get('guid', [''])).strip()
+        if not guid:
+            self.results[(name, 'deny')] += 1
+            return 200, 'text/plain', b'DENY|no GUID'
+        allowed, reason = self.index.check(name, guid)
+        self.results[(name, 'ok' if allowed else 'deny')] += 1
+        if allowed:
+            return 200, 'text/plain', 'OK|{}'.format(guid).encode('utf-8')
+        return 200, 'text/plain', 'DENY|{}'.format(reason).encode('utf-8')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                started = time.perf_counter()
+                keep_alive = request.rstrip().endswith(b'HTTP/1.1')
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.partition(b':')
+                    if key.strip().lower() == b'connection':
+                        keep_alive = value.strip().lower() != b'close'
+                try:
+                    target = request.split()[1].decode('latin-1')
+                except IndexError:
+                    break
+                url = urlsplit(target)
+                status, kind, body = self.respond(url.path, url.query)
+                writer.write(response_head(status, kind, len(body),
+                                           keep_alive) + body)
+                await writer.drain()
+                name = self.paths.get(url.path)
+                if name is not None:
+                    self.latency[name].observe(
+                        time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def metrics(self):
+        metrics = Metrics()
+        for (name, result), count in sorted(self.results.items()):
+            metrics.add('acdsc_auth_requests_total', 'counter',
+                        'Auth requests by result',
+                        {'instance': name, 'result': result}, count)
+        for name, histogram in sorted(self.latency.items()):
+            histogram.add_to(metrics, 'acdsc_auth_request_seconds',
+                             'Time to answer an auth request',
+                             {'instance': name})
+        metrics.add('acdsc_auth_denied_guids', 'gauge',
+                    'GUIDs on the deny list', {}, len(self.index.deny))
+        metrics.add('acdsc_auth_allowed_guids', 'gauge',
+                    'GUIDs on the shared allow list', {},
+                    len(self.index.allow))
+        metrics.add('acdsc_auth_reloads_total', 'counter',
+                    'Times the sources were reloaded', {}, self.reloads)
+        metrics.add('acdsc_auth_reload_errors_total', 'counter',
+                    'Failed reloads', {}, self.reload_errors)
+        metrics.add('acdsc_auth_loaded_timestamp_seconds', 'gauge',
+                    'When the sources were last loaded', {},
+                    round(self.loaded, 3))
+        return metrics
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        for signum in self.stop_signals:
+            loop.add_signal_handler(signum, stopping.set)
+        server = None
+        watcher = None
+        poller = None
+        if inotify.available():
+            watcher = self.watch()
+        else:
+            poller = asyncio.ensure_future(self.poll())
+        try:
+            # watched before answering, changes since the sources were
+            # loaded would be missed otherwise
+            if self.sources.stamps() != self.stamps:
+                await self.reload()
+            server = await asyncio.start_server(self.handle, *self.listen)
+            await stopping.wait()
+        finally:
+            if server is not None:
+                server.close()
+            if watcher is not None:
+                loop.remove_reader(watcher.fileno())
+                watcher.close()
+            if poller is not None:
+                poller.cancel()
@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+
+import configparser
+import hashlib
+import json
+import os
+
+# On-disk index of content/cars and content/tracks. The car and track
+# listings are refreshed only when the mtime of content/cars or
+# content/tracks changes, details (skins, tyres, layouts, pits) of a single
+# car or track are read on first use and re-read only when the mtimes of
+# the files and directories they come from change
+index_version = 1
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def list_dirs(path):
+    try:
+        return sorted(entry.name for entry in os.scandir(path)
+                      if entry.is_dir())
+    except OSError:
+        return []
+
+
+def read_tyres(tyres_ini):
+    parser = configparser.ConfigParser(strict=False, interpolation=None)
+    try:
+        parser.read(tyres_ini)
+    except configparser.Error:
+        return []
+    names = set()
+    for section in parser.sections():
+        if parser.has_option(section, 'SHORT_NAME'):
+            names.add(parser.get(section, 'SHORT_NAME').strip())
+    return sorted(names)
+
+
+def read_pits(ui_track_json):
+    try:
+        with open(ui_track_json, 'r', encoding='utf-8-sig') as fh:
+            return int(json.load(fh).get('pitboxes'))
+    except (IOError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class ContentIndex(object):
+
+    def __init__(self, server_path, cache_dir):
+        self.content = os.path.join(server_path, 'content')
+        key = hashlib.sha1(
+            os.path.abspath(server_path).encode('utf-8')).hexdigest()[:12]
+        self.index_file = os.path.join(
+            cache_dir, 'content-{}.json'.format(key))
+        self.dirty = False
+        self.index = self.load()
+        self.refresh()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r') as fh:
+                index = json.load(fh)
+            if index.get('version') == index_version:
+                return index
+        except (IOError, ValueError):
+            pass
+        return {'version': index_version,
+                'cars_mtime': None,
+                'tracks_mtime': None,
+                'cars': {},
+                'tracks': {}}
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        temp_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        with open(temp_file, 'w') as fh:
+            json.dump(self.index, fh)
+        os.replace(temp_file, self.index_file)
+        self.dirty = False
+
+    def exists(self):
+        return os.path.isdir(self.content)
+
+    def refresh_listing(self, kind):
+        path = os.path.join(self.content, kind)
+        current = mtime(path)
+        if current == self.index['{}_mtime'.format(kind)]:
+            return
+        entries = self.index[kind]
+        names = set(list_dirs(path))
+        for name in set(entries) - names:
+            del entries[name]
+        for name in names - set(entries):
+            entries[name] = None
+        self.index['{}_mtime'.format(kind)] = current
+        self.dirty = True
+
+    def refresh(self):
+        self.refresh_listing('cars')
+        self.refresh_listing('tracks')
+
+    ## Cars
+
+    def car_fingerprint(self, car):
+        path = os.path.join(self.content, 'cars', car)
+        return [mtime(os.path.join(path, 'skins')),
+                mtime(os.path.join(path, 'data', 'tyres.ini'))]
+
+    def car(self, car):
+        if car not in self.index['cars']:
+            return None
+        entry = self.index['cars'][car]
+        fingerprint = self.car_fingerprint(car)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            path = os.path.join(self.content, 'cars', car)
+            entry = {
+                'fingerprint': fingerprint,
+                'skins': list_dirs(os.path.join(path, 'skins')),
+                'tyres': read_tyres(os.path.join(path, 'data', 'tyres.ini'))
+            }
+            self.index['cars'][car] = entry
+            self.dirty = True
+        return entry
+
+    def has_car(self, car):
+        return car in self.index['cars']
+
+    def cars(self):
+        return sorted(self.index['cars'])
+
+    def skins(self, car):
+        entry = self.car(car)
+        return entry['skins'] if entry else []
+
+    def tyres(self, cars):
+        names = set()
+        for car in cars:
+            entry = self.car(car)
+            if entry:
+                names.update(entry['tyres'])
+        return names
+
+    ## Tracks
+
+    def track_fingerprint(self, track):
+        path = os.path.join(self.content, 'tracks', track)
+        fingerprint = [mtime(path), mtime(os.path.join(path, 'ui'))]
+        entry = self.index['tracks'].get(track)
+        for layout in sorted(entry['layouts']) if entry else []:
+            fingerprint.append(mtime(self.ui_track_json(track, layout)))
+        return fingerprint
+
+    def ui_track_json(self, track, layout):
+        path = os.path.join(self.content, 'tracks', track, 'ui')
+        if layout:
+            path = os.path.join(path, layout)
+        return os.path.join(path, 'ui_track.json')
+
+    def track(self, track):
+        if track not in self.index['tracks']:
+            return None
+        entry = self.index['tracks'][track]
+        if entry is None or entry['fingerprint'] != \
+                self.track_fingerprint(track):
+            path = os.path.join(self.content, 'tracks', track)
+            # layouts are sub directories with their own data/ (or ui/)
+            layouts = set(
+                name for name in list_dirs(path)
+                if os.path.isdir(os.path.join(path, name, 'data')))
+            layouts.update(
+                name for name in list_dirs(os.path.join(path, 'ui'))
+                if os.path.exists(os.path.join(
+                    path, 'ui', name, 'ui_track.json')))
+            if os.path.isdir(os.path.join(path, 'data')) or not layouts:
+                layouts.add('')
+            entry = {'layouts': {
+                layout: read_pits(self.ui_track_json(track, layout))
+                for layout in layouts}}
+            self.index['tracks'][track] = entry
+            entry['fingerprint'] = self.track_fingerprint(track)
+            self.dirty = True
+        return entry
+
+    def has_track(self, track):
+        return track in self.index['tracks']
+
+    def layouts(self, track):
+        entry = self.track(track)
+        return sorted(entry['layouts']) if entry else []
+
+    def pits(self, track, layout=''):
+        entry = self.track(track)
+        if entry is None:
+            return None
+        return entry['layouts'].get(layout or '')
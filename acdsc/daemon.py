@@ -1,23 +1,30 @@
 #!/usr/bin/python3
 
-import atexit
+import json
 import os
+import select
 import signal
-import subprocess as sub
 import sys
 import time
 
+import psutil
+
+from acdsc.settings import log_settings, metrics_settings
+
 
 class Daemon(object):
 
-    def __init__(self, pidfile):
+    def __init__(self, pidfile, logfile=os.devnull):
         self.pidfile = pidfile
+        self.logfile = logfile
 
     def daemonize(self):
         try:
             pid = os.fork()
             if pid > 0:
-                # exit first parent
+                # exit first parent once the second one has written the
+                # pidfile
+                os.waitpid(pid, 0)
                 sys.exit(0)
         except OSError as err:
             sys.stderr.write('fork #1 failed: {0}\n'.format(err))
@@ -32,7 +39,9 @@ class Daemon(object):
         try:
             pid = os.fork()
             if pid > 0:
-                # exit from second parent
+                # write pidfile and exit from second parent
+                with open(self.pidfile, 'w+') as f:
+                    f.write('{}\n'.format(pid))
                 sys.exit(0)
         except OSError as err:
             sys.stderr.write('fork #2 failed: {0}\n'.format(err))
@@ -42,22 +51,18 @@ class Daemon(object):
         sys.stdout.flush()
         sys.stderr.flush()
         si = open(os.devnull, 'r')
-        so = open(os.devnull, 'a+')
-        se = open(os.devnull, 'a+')
+        so = open(self.logfile, 'a+')
+        se = open(self.logfile, 'a+')
 
         os.dup2(si.fileno(), sys.stdin.fileno())
         os.dup2(so.fileno(), sys.stdout.fileno())
         os.dup2(se.fileno(), sys.stderr.fileno())
 
-        # write pidfile
-        atexit.register(self.delpid)
-
-        pid = str(os.getpid())
-        with open(self.pidfile, 'w+') as f:
-            f.write(pid + '\n')
-
     def delpid(self):
-        os.remove(self.pidfile)
+        try:
+            os.remove(self.pidfile)
+        except FileNotFoundError:
+            pass
 
     def getpid(self):
         with open(self.pidfile, 'r') as pf:
@@ -70,17 +75,37 @@ class Daemon(object):
         except IOError:
             pid = None
 
-        if pid:
+        if pid and psutil.pid_exists(pid):
             message = 'pidfile {0} already exist. Daemon already running?\n'
             sys.stderr.write(message.format(self.pidfile))
             sys.exit(1)
 
         # Start the daemon
         self.daemonize()
-        self.run()
+        try:
+            self.run()
+        finally:
+            self.delpid()
 
-    def stop(self):
-        # Get the pid from the pidfile
+    def spawn(self):
+        # Start the daemon from a forked child and return once it has been
+        # detached, unlike start() the calling process keeps running
+        pid = os.fork()
+        if pid > 0:
+            _, status = os.waitpid(pid, 0)
+            return os.waitstatus_to_exitcode(status) == os.EX_OK
+        code = 1
+        try:
+            self.start()
+            code = os.EX_OK
+        except SystemExit as err:
+            code = err.code if isinstance(err.code, int) else 1
+        finally:
+            os._exit(code)
+
+    def stop(self, grace=10):
+        # Returns (seconds it took, whether SIGKILL was needed) or None when
+        # the daemon was not running
         try:
             pid = self.getpid()
         except IOError:
@@ -91,34 +116,201 @@ class Daemon(object):
             sys.stderr.write(message.format(self.pidfile))
             return  # not an error in a restart
 
-        # Try killing the daemon process
-        try:
-            while 1:
-                os.kill(pid, signal.SIGTERM)
-                time.sleep(0.1)
-        except OSError as err:
-            e = str(err.args)
-            if e.find('No such process') > 0:
-                if os.path.exists(self.pidfile):
-                    os.remove(self.pidfile)
-                else:
-                    print (str(err.args))
-                    sys.exit(1)
-
-    def restart(self):
-        self.stop()
+        return stop_daemons([self], grace)[0]
+
+    def restart(self, grace=10):
+        self.stop(grace)
         self.start()
 
     def run(self):
         pass
 
 
+def daemon_processes(pid):
+    # the daemon and everything it has started
+    try:
+        leader = psutil.Process(pid)
+        return [leader] + leader.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def signal_processes(pid, processes, signum):
+    # daemons are session (and process group) leaders after daemonize, signal
+    # the whole group to reach children that have been orphaned as well
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signum)
+    except (ProcessLookupError, PermissionError):
+        pass
+    for process in processes:
+        try:
+            process.send_signal(signum)
+        except psutil.NoSuchProcess:
+            pass
+
+
+def wait_processes(processes, timeout):
+    # Wait up to timeout seconds for processes to exit using pidfds (falling
+    # back to psutil), returns {pid: monotonic time of exit} for exited ones
+    exited = {}
+    fds = {}
+    try:
+        for process in processes:
+            try:
+                fds[os.pidfd_open(process.pid)] = process.pid
+            except ProcessLookupError:
+                exited[process.pid] = time.monotonic()
+    except (AttributeError, OSError):
+        for fd in fds:
+            os.close(fd)
+
+        def on_exit(process):
+            exited[process.pid] = time.monotonic()
+        psutil.wait_procs([process for process in processes
+                           if process.pid not in exited],
+                          timeout=timeout,
+                          callback=on_exit)
+        return exited
+    poller = select.poll()
+    for fd in fds:
+        poller.register(fd, select.POLLIN)
+    deadline = time.monotonic() + timeout
+    try:
+        while fds:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for fd, _ in poller.poll(remaining * 1000):
+                exited[fds.pop(fd)] = time.monotonic()
+                poller.unregister(fd)
+                os.close(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    return exited
+
+
+def stop_daemons(daemons, grace):
+    # Stop daemons concurrently: SIGTERM to all of them at once, SIGKILL to
+    # whatever is left after grace seconds. Returns (seconds, killed) or None
+    # (not running) per daemon
+    started = time.monotonic()
+    targets = []
+    for daemon in daemons:
+        try:
+            pid = daemon.getpid()
+        except (IOError, ValueError):
+            pid = None
+        processes = daemon_processes(pid) if pid else []
+        if not processes:
+            daemon.delpid()
+        else:
+            signal_processes(pid, processes, signal.SIGTERM)
+        targets.append((daemon, pid, processes))
+
+    everything = [process for _, _, processes in targets
+                  for process in processes]
+    exited = wait_processes(everything, grace)
+    killed = set()
+    leftover = [process for process in everything
+                if process.pid not in exited]
+    if leftover:
+        for daemon, pid, processes in targets:
+            alive = [process for process in processes
+                     if process.pid not in exited]
+            if alive:
+                killed.add(daemon)
+                signal_processes(pid, alive, signal.SIGKILL)
+        exited.update(wait_processes(leftover, 5))
+
+    results = []
+    for daemon, pid, processes in targets:
+        if not processes:
+            results.append(None)
+            continue
+        daemon.delpid()
+        done = max(exited.get(process.pid, time.monotonic())
+                   for process in processes)
+        results.append((done - started, daemon in killed))
+    return results
+
+
 class ACDaemon(Daemon):
 
     def __init__(self, config):
-        super().__init__(config['pidfile'])
-        self.cwd = config['server-path']
+        self.log_dir = os.path.abspath(config['log-dir'])
+        super().__init__(config['pidfile'],
+                         os.path.join(self.log_dir, 'acdsc.log'))
+        self.cwd = os.path.abspath(config['server-path'])
+        self.config_file = os.path.abspath(config['config-file'])
+        self.entry_list = os.path.abspath(config['entry-list'])
+        self.state_file = state_file(config['pidfile'])
+        self.metrics_file = metrics_file(config['pidfile'])
+
+    def daemonize(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        super().daemonize()
 
     def run(self):
-        # TODO: logs?
-        sub.run('./acServer', cwd=self.cwd, shell=True)
+        # only the daemon itself supervises, status and stop stay light
+        from acdsc.logs import RotatingLog
+        from acdsc.metrics import RingBuffer
+        from acdsc.supervisor import Child, Supervisor
+
+        args = ['./acServer', '-c', self.config_file, '-e', self.entry_list]
+        log = RotatingLog(server_log(self.log_dir), **log_settings)
+        metrics = RingBuffer(self.metrics_file, metrics_settings['capacity'])
+        child = Child('acServer', args, self.cwd, self.state_file, log,
+                      metrics)
+        try:
+            Supervisor([child], metrics_settings['interval']).run()
+        finally:
+            log.close()
+            metrics.close()
+
+
+def state_file(pidfile):
+    return '{}.state'.format(os.path.splitext(os.path.abspath(pidfile))[0])
+
+
+def read_state(state_file):
+    try:
+        with open(state_file, 'r') as fh:
+            state = json.load(fh)
+    except (IOError, ValueError):
+        return None
+    state['uptime'] = None
+    if state['state'] == 'running' and state['started']:
+        state['uptime'] = time.time() - state['started']
+    return state
+
+
+def metrics_file(pidfile):
+    return '{}.metrics'.format(os.path.splitext(os.path.abspath(pidfile))[0])
+
+
+def pid_running(pid):
+    # a killed daemon may linger as a zombie until it is reaped
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def daemon_status(daemon, state):
+    # running, stale (pidfile of a dead daemon), crashed (the supervisor
+    # gave up restarting acServer) or stopped
+    try:
+        pid = daemon.getpid()
+    except (IOError, ValueError):
+        pid = None
+    if pid is not None:
+        return 'running' if pid_running(pid) else 'stale'
+    if state is not None and state['state'] == 'crash-loop':
+        return 'crashed'
+    return 'stopped'
+
+
+def server_log(log_dir):
+    return os.path.join(log_dir, 'acServer.log')
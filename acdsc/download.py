@@ -0,0 +1,290 @@
+#!/usr/bin/python3
+
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zlib
+
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+import click
+
+chunk_size = 64 * 1024
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class DownloadChanged(Exception):
+    pass
+
+
+class ResumableDownload(object):
+    # Read-only file object streaming url through a .part file: bytes already
+    # on disk are replayed first, the rest is fetched with an HTTP Range
+    # request and re-requested from the current offset if the connection
+    # breaks mid-way. The ETag (or Last-Modified) of the first response is
+    # kept next to the .part file and sent as If-Range, a .part file of an
+    # earlier version of url is thrown away instead of resumed
+
+    def __init__(self, url, part_file, retries=5, timeout=30):
+        self.url = url
+        self.part_file = part_file
+        self.retries = retries
+        self.timeout = timeout
+        self.sha256 = hashlib.sha256()
+        self.offset = 0
+        self.fetched = 0
+        self.resumed = 0
+        self.response = None
+        self.replay = None
+        self.validator = read_validator(part_file)
+        if os.path.exists(part_file):
+            self.replay = open(part_file, 'rb')
+            self.resumed = self.fetched = os.path.getsize(part_file)
+        self.part = open(part_file, 'ab')
+
+    def connect(self):
+        request = Request(self.url)
+        if self.fetched:
+            request.add_header('Range', 'bytes={}-'.format(self.fetched))
+            if self.validator:
+                request.add_header('If-Range', self.validator)
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except HTTPError as err:
+            if err.code != 416:
+                raise
+            # the .part file is already complete
+            self.response = io.BytesIO()
+            return
+        validator = response_validator(response)
+        if self.fetched and response.status != 206:
+            if not self.offset:
+                # url changed (or the server ignores ranges) before
+                # anything was read, start over
+                self.restart(validator)
+            elif validator is None or validator != self.validator:
+                response.close()
+                raise DownloadChanged('{} changed during the download'.format(
+                    self.url))
+            else:
+                # no range support, skip what we already have
+                skip = self.fetched
+                while skip:
+                    skipped = len(response.read(min(skip, chunk_size)))
+                    if not skipped:
+                        raise URLError('{} is shorter than expected'.format(
+                            self.url))
+                    skip -= skipped
+        elif not self.fetched:
+            self.save_validator(validator)
+        self.response = response
+
+    def restart(self, validator):
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+        self.part.seek(0)
+        self.part.truncate()
+        self.fetched = self.resumed = 0
+        self.save_validator(validator)
+
+    def save_validator(self, validator):
+        self.validator = validator
+        validator_file = '{}.validator'.format(self.part_file)
+        if validator is None:
+            remove_file(validator_file)
+            return
+        with open(validator_file, 'w') as fh:
+            fh.write('{}\n'.format(validator))
+
+    def read_response(self, size):
+        for attempt in range(self.retries + 1):
+            try:
+                if self.response is None:
+                    self.connect()
+                return self.response.read(size)
+            except (HTTPException, URLError, OSError):
+                if self.response is not None:
+                    self.response.close()
+                    self.response = None
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+
+    def read(self, size=chunk_size):
+        if size is None or size < 0:
+            size = chunk_size
+        if self.replay is not None and not self.offset:
+            # check the .part file is still current before replaying it
+            self.read_response(0)
+        data = b''
+        if self.replay is not None:
+            data = self.replay.read(size)
+            if not data:
+                self.replay.close()
+                self.replay = None
+        if not data:
+            data = self.read_response(size)
+            self.part.write(data)
+            self.fetched += len(data)
+        self.offset += len(data)
+        self.sha256.update(data)
+        return data
+
+    def drain(self):
+        while self.read(chunk_size):
+            pass
+
+    def close(self):
+        for fh in (self.replay, self.response, self.part):
+            if fh is not None:
+                fh.close()
+
+
+class HashingReader(object):
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=chunk_size):
+        data = self.fh.read(size)
+        self.sha256.update(data)
+        return data
+
+    def drain(self):
+        while self.read(chunk_size):
+            pass
+
+    def close(self):
+        self.fh.close()
+
+
+def response_validator(response):
+    # weak ETags are not allowed in If-Range
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def read_validator(part_file):
+    try:
+        with open('{}.validator'.format(part_file), 'r') as fh:
+            return fh.read().strip() or None
+    except IOError:
+        return None
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_part(part_file):
+    remove_file(part_file)
+    remove_file('{}.validator'.format(part_file))
+
+
+def read_checksum(cache_file):
+    try:
+        with open('{}.sha256'.format(cache_file), 'r') as fh:
+            return fh.read().strip()
+    except IOError:
+        return None
+
+
+def cached_download(url, cache_dir):
+    return os.path.join(
+        cache_dir, 'downloads', os.path.basename(urlparse(url).path))
+
+
+def extract(stream, path):
+    # extract the tar stream, refusing members outside path (and special
+    # files) where tarfile supports filters
+    with tarfile.open(fileobj=stream, mode='r|*') as tar:
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(path, filter='data')
+        else:
+            tar.extractall(path)
+
+
+def install_tree(staging, path):
+    # move the extracted files into path
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(staging):
+        target = os.path.join(path, name)
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        os.replace(os.path.join(staging, name), target)
+    os.rmdir(staging)
+
+
+def fetch_and_extract(url, path, cache_dir, checksum=None):
+    # Download url to the download cache while extracting the tar stream
+    # next to path, the files are moved into path only once the checksum
+    # matches. A complete and verified cached copy is extracted without any
+    # network access
+    cache_file = cached_download(url, cache_dir)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    expected = read_checksum(cache_file)
+    if (os.path.exists(cache_file) and expected and
+            checksum in (None, expected)):
+        click.echo('..extracting cached {} to {}'.format(cache_file, path))
+        stream = HashingReader(open(cache_file, 'rb'))
+    else:
+        part_file = '{}.part'.format(cache_file)
+        stream = ResumableDownload(url, part_file)
+        if stream.resumed:
+            click.echo('..resuming download of {} at {} bytes'.format(
+                url, stream.resumed))
+        click.echo('..downloading {} and extracting to {}'.format(url, path))
+    path = os.path.abspath(path)
+    staging = tempfile.mkdtemp(prefix='.{}.'.format(os.path.basename(path)),
+                               dir=os.path.dirname(path))
+    try:
+        try:
+            extract(stream, staging)
+            # consume tar padding so the cached copy is complete
+            stream.drain()
+        except (tarfile.TarError, EOFError, zlib.error, DownloadChanged):
+            # do not resume from (or reuse) a corrupt download
+            stream.close()
+            if isinstance(stream, ResumableDownload):
+                remove_part(stream.part_file)
+            else:
+                os.remove(cache_file)
+            raise
+        finally:
+            stream.close()
+        digest = stream.sha256.hexdigest()
+        if isinstance(stream, ResumableDownload):
+            if checksum and digest != checksum:
+                remove_part(stream.part_file)
+                raise ChecksumError('{} checksum mismatch: {} != {}'.format(
+                    url, digest, checksum))
+            os.replace(stream.part_file, cache_file)
+            remove_file('{}.validator'.format(stream.part_file))
+            with open('{}.sha256'.format(cache_file), 'w') as fh:
+                fh.write('{}\n'.format(digest))
+        elif digest != expected:
+            os.remove(cache_file)
+            raise ChecksumError('cached {} checksum mismatch: {} != {}'.format(
+                cache_file, digest, expected))
+        install_tree(staging, path)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+    return digest
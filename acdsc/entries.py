@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+import csv
+import json
+import os
+
+from itertools import cycle, islice
+
+from acdsc.parser import ACParser
+from acdsc.plan import (
+    add_defaults, check_related, check_values, default_values)
+from acdsc.settings import entry_list_settings
+
+# formats of entries import/export, jsonl has an entry (object) per line
+entry_formats = ('csv', 'json', 'jsonl')
+
+
+def parse_weighted(car):
+    # car or car:weight -> (model, weight or None when not given), weights
+    # are positive whole numbers
+    model, colon, weight = car.partition(':')
+    if not colon:
+        return model, None
+    if not model or not weight.isdigit() or int(weight) < 1:
+        raise ValueError('{} is not car:weight with a weight of 1 or '
+                         'more'.format(car))
+    return model, int(weight)
+
+
+def round_robin(models, count):
+    return list(islice(cycle(models), count))
+
+
+def weighted(weights, count):
+    # smooth weighted round robin: models are interleaved in proportion to
+    # their weights instead of being handed out in blocks
+    total = sum(weight for _, weight in weights)
+    current = [0] * len(weights)
+    models = []
+    for _ in range(count):
+        for number, (_, weight) in enumerate(weights):
+            current[number] += weight
+        best = max(range(len(weights)), key=current.__getitem__)
+        current[best] -= total
+        models.append(weights[best][0])
+    return models
+
+
+def assign_skins(models, skins):
+    # hand out each model's skins in turn, skins maps model -> list of skins
+    skin_cycles = {model: cycle(skins.get(model) or ['']) for model in models}
+    return [next(skin_cycles[model]) for model in models]
+
+
+def make_entry_list(models, skins):
+    # build a whole entry list parser in one pass
+    parser = ACParser()
+    for number, (model, skin) in enumerate(zip(models, skins)):
+        section = 'CAR_{}'.format(number)
+        parser.add_section(section)
+        for key, value in entry_list_settings.items():
+            parser.set(section, key, '{}'.format(value['default']))
+        parser.set(section, 'MODEL', model)
+        parser.set(section, 'SKIN', skin)
+    return parser
+
+
+## Import and export
+
+def file_format(path):
+    # entry format of path from its extension, None when unknown
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    extension = {'ndjson': 'jsonl'}.get(extension, extension)
+    return extension if extension in entry_formats else None
+
+
+def read_entries(fh, entry_format):
+    # Yield (where, values) of the entries in fh, CSV and JSON lines are
+    # read as they go. Empty CSV cells and JSON nulls leave a setting as it
+    # is, keys may be given as in entry_list.ini or as command line options
+    if entry_format == 'csv':
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield 'line {}'.format(reader.line_num), {
+                key: value for key, value in row.items()
+                if key and value not in (None, '')}
+    elif entry_format == 'jsonl':
+        for number, line in enumerate(fh, 1):
+            if line.strip():
+                yield 'line {}'.format(number), json.loads(line)
+    else:
+        for number, values in enumerate(json.load(fh)):
+            yield 'entry {}'.format(number), values
+
+
+def split_guids(value):
+    return [guid.strip() for guid in value.split(';') if guid.strip()]
+
+
+def guid_index(parser):
+    # GUID -> CAR section of every GUID in the entry list
+    index = {}
+    for section in parser.prefix_sections('CAR'):
+        for guid in split_guids(parser.get(section, 'GUID', fallback='')):
+            index.setdefault(guid, section)
+    return index
+
+
+def merge_entries(parser, entries):
+    # Merge (where, values) entries into parser in one pass: an entry with a
+    # GUID already in the list updates that CAR section, others are added.
+    # Returns counts and the errors of the entries that were skipped
+    index = guid_index(parser)
+    seen = set()
+    counts = {'added': 0, 'updated': 0, 'duplicates': 0}
+    errors = []
+    for where, values in entries:
+        if not isinstance(values, dict):
+            errors.append('{}: expected a mapping of settings'.format(where))
+            continue
+        found = len(errors)
+        checked = check_values(entry_list_settings,
+                               {key: value for key, value in values.items()
+                                if value is not None},
+                               where, errors)
+        if len(errors) > found:
+            continue
+        guids = split_guids(checked.get('GUID', ''))
+        sections = sorted(set(index[guid] for guid in guids if guid in index))
+        if len(sections) > 1:
+            errors.append('{}: GUIDs are in {}'.format(
+                where, ', '.join(sections)))
+            continue
+        current = (parser.items(sections[0]) if sections else
+                   default_values(entry_list_settings))
+        check_related(current, checked, where, errors)
+        if len(errors) > found:
+            continue
+        if any(guid in seen for guid in guids):
+            counts['duplicates'] += 1
+        seen.update(guids)
+        if sections:
+            section = sections[0]
+            counts['updated'] += 1
+        else:
+            section = parser.next_section('CAR')
+            parser.add_section(section)
+            add_defaults(parser, section, entry_list_settings)
+            counts['added'] += 1
+        if 'GUID' in checked:
+            for guid in split_guids(parser.get(section, 'GUID')):
+                if index.get(guid) == section:
+                    del index[guid]
+        for key, value in checked.items():
+            parser.set(section, key, value)
+        for guid in guids:
+            index[guid] = section
+    return counts, errors
+
+
+def write_entries(parser, fh, entry_format):
+    # entries in the order of the entry list, settings first
+    sections = parser.prefix_sections('CAR')
+    keys = list(entry_list_settings)
+    keys.extend(sorted(set(key for section in sections
+                           for key in parser.options(section)) - set(keys)))
+    rows = (dict(parser.items(section)) for section in sections)
+    if entry_format == 'csv':
+        writer = csv.DictWriter(fh, keys, restval='', lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    elif entry_format == 'jsonl':
+        for row in rows:
+            fh.write('{}\n'.format(json.dumps(row)))
+    else:
+        json.dump(list(rows), fh, indent=2)
+        fh.write('\n')
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+import hashlib
+import os
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+
+from acdsc.daemon import ACDaemon, daemon_status, read_state, state_file
+from acdsc.lobby import LobbyQuery, lobby_port, session_name
+
+# Prometheus text exposition of acServer instances. Metrics are collected
+# by a background refresh every interval seconds and scrapes are answered
+# from the last collected body, so scrapes never touch processes or lobbies
+content_type = 'text/plain; version=0.0.4; charset=utf-8'
+statuses = ('running', 'stale', 'crashed', 'stopped')
+
+
+def escape(value):
+    return '{}'.format(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    # metric families in the order they were first seen
+
+    def __init__(self):
+        self.families = OrderedDict()
+
+    def add(self, name, kind, help_text, labels, value, suffix=''):
+        # suffix names the samples of a histogram (_bucket, _sum, _count)
+        family = self.families.setdefault(name, (kind, help_text, []))
+        family[2].append((labels, value, suffix))
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, samples) in self.families.items():
+            out.append('# HELP {} {}'.format(name, help_text))
+            out.append('# TYPE {} {}'.format(name, kind))
+            for labels, value, suffix in samples:
+                label_text = ','.join(
+                    '{}="{}"'.format(key, escape(label))
+                    for key, label in labels.items())
+                if label_text:
+                    label_text = '{{{}}}'.format(label_text)
+                out.append('{}{}{} {}'.format(name, suffix, label_text, value))
+        return '{}\n'.format('\n'.join(out)).encode('utf-8')
+
+
+def config_fingerprint(config):
+    digest = hashlib.sha256()
+    for path in (config['config-file'], config['entry-list']):
+        try:
+            with open(path, 'rb') as fh:
+                digest.update(fh.read())
+        except IOError:
+            pass
+        digest.update(b'\0')
+    return digest.hexdigest()[:12]
+
+
+def process_metrics(metrics, labels, pid):
+    try:
+        process = psutil.Process(pid)
+        with process.oneshot():
+            cpu = process.cpu_times()
+            rss = process.memory_info().rss
+            threads = process.num_threads()
+            switches = process.num_ctx_switches()
+            fds = process.num_fds()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return
+    metrics.add('acdsc_process_cpu_seconds_total', 'counter',
+                'acServer user and system CPU time', labels,
+                cpu.user + cpu.system)
+    metrics.add('acdsc_process_resident_memory_bytes', 'gauge',
+                'acServer resident memory', labels, rss)
+    metrics.add('acdsc_process_threads', 'gauge',
+                'acServer threads', labels, threads)
+    metrics.add('acdsc_process_open_fds', 'gauge',
+                'acServer open file descriptors', labels, fds)
+    metrics.add('acdsc_process_voluntary_ctx_switches_total', 'counter',
+                'acServer voluntary context switches', labels,
+                switches.voluntary)
+    metrics.add('acdsc_process_involuntary_ctx_switches_total', 'counter',
+                'acServer involuntary context switches', labels,
+                switches.involuntary)
+
+
+def lobby_metrics(metrics, labels, info):
+    metrics.add('acdsc_lobby_up', 'gauge',
+                'Whether the lobby HTTP_PORT answered', labels,
+                int(info is not None))
+    if info is None:
+        return
+    metrics.add('acdsc_players', 'gauge',
+                'Connected clients', labels, info.get('clients', 0))
+    metrics.add('acdsc_max_clients', 'gauge',
+                'Maximum number of clients', labels,
+                info.get('maxclients', 0))
+    metrics.add('acdsc_session_info', 'gauge',
+                'Current session of the server', dict(labels, **{
+                    'session': session_name(info) or '-',
+                    'track': info.get('track', '')}), 1)
+    if 'timeleft' in info:
+        metrics.add('acdsc_session_time_left_seconds', 'gauge',
+                    'Time left in the current session', labels,
+                    info['timeleft'])
+
+
+def collect(targets, lobbies):
+    # targets are (name, ctx.obj style config) pairs, lobbies a LobbyQuery
+    metrics = Metrics()
+    ports = []
+    for _, config in targets:
+        try:
+            ports.append(lobby_port(config))
+        except Exception:
+            ports.append(None)
+    results = lobbies.query(ports)
+    for (name, config), result in zip(targets, results):
+        labels = OrderedDict([('instance', name)])
+        state = read_state(state_file(config['pidfile']))
+        status = daemon_status(ACDaemon(config), state)
+        metrics.add('acdsc_up', 'gauge',
+                    'Whether the acdsc daemon is running', labels,
+                    int(status == 'running'))
+        for known in statuses:
+            metrics.add('acdsc_status', 'gauge',
+                        'Daemon status', dict(labels, status=known),
+                        int(status == known))
+        metrics.add('acdsc_config_info', 'gauge',
+                    'Fingerprint of the server configuration and entry list',
+                    dict(labels, fingerprint=config_fingerprint(config)), 1)
+        if state is not None:
+            metrics.add('acdsc_restarts_total', 'counter',
+                        'acServer restarts by the supervisor', labels,
+                        state['restarts'])
+            if status == 'running' and state['uptime'] is not None:
+                metrics.add('acdsc_uptime_seconds', 'gauge',
+                            'Seconds since acServer was (re)started',
+                            labels, round(state['uptime'], 3))
+            if status == 'running' and state['pid']:
+                process_metrics(metrics, labels, state['pid'])
+        lobby_metrics(metrics, labels, result['info'])
+        metrics.add('acdsc_lobby_query_seconds', 'gauge',
+                    'Time the lobby query took', labels,
+                    round(result['elapsed'], 6))
+    return metrics
+
+
+class MetricsCache(object):
+    # Keeps the last rendered metrics, refreshed by a background thread.
+    # Lobby connections are kept alive from one refresh to the next
+
+    def __init__(self, targets, interval, collect=collect):
+        self.targets = targets
+        self.interval = interval
+        self.collect = collect
+        self.lobbies = LobbyQuery()
+        self.body = b''
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        started = time.time()
+        metrics = self.collect(self.targets, self.lobbies)
+        metrics.add('acdsc_exporter_refresh_seconds', 'gauge',
+                    'Time the last refresh took', {},
+                    round(time.time() - started, 6))
+        metrics.add('acdsc_exporter_refresh_timestamp_seconds', 'gauge',
+                    'When the metrics were last refreshed', {},
+                    round(time.time(), 3))
+        self.body = metrics.render()
+        return self.body
+
+    def loop(self, on_refresh=None):
+        # refresh every interval seconds until stopped, a failing refresh
+        # keeps serving the previous metrics
+        while not self.stopping.wait(self.interval):
+            try:
+                body = self.refresh()
+            except Exception as err:
+                sys.stderr.write('refresh failed: {}\n'.format(err))
+                continue
+            if on_refresh is not None:
+                on_refresh(body)
+
+    def start(self):
+        self.refresh()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.lobbies.close()
+
+
+def make_handler(cache):
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = cache.body
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', '{}'.format(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+
+def serve(cache, host, port):
+    server = ThreadingHTTPServer((host, port), make_handler(cache))
+    server.daemon_threads = True
+    return server
+
+
+def write_textfile(path, body):
+    # node_exporter reads the textfile collector directory at any time
+    temp_file = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_file, 'wb') as fh:
+        fh.write(body)
+    os.replace(temp_file, path)
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+import os
+import shutil
+
+from collections import OrderedDict
+
+from acdsc.parser import make_ac_parser
+from acdsc.settings import plugin_settings, server_settings
+
+# *_PORT settings and the protocols acServer binds them with
+port_settings = OrderedDict([
+    ('UDP_PORT', ('udp',)),
+    ('TCP_PORT', ('tcp',)),
+    ('HTTP_PORT', ('udp', 'tcp')),
+    ('UDP_PLUGIN_LOCAL_PORT', ('udp',))
+])
+
+
+class Instance(object):
+
+    def __init__(self, instances_dir, name):
+        self.name = name
+        self.path = os.path.join(instances_dir, name)
+        self.config_file = os.path.join(self.path, 'cfg', 'server_cfg.ini')
+        self.entry_list = os.path.join(self.path, 'cfg', 'entry_list.ini')
+        self.pidfile = os.path.join(self.path, 'acds.pid')
+        self.log_dir = os.path.join(self.path, 'logs')
+        self.server_path = os.path.join(self.path, 'server')
+
+    def exists(self):
+        return os.path.exists(self.config_file)
+
+    def has_overlay(self):
+        return os.path.isdir(self.server_path)
+
+    def parser(self):
+        return make_ac_parser(self.config_file)
+
+    def config(self, config):
+        # ctx.obj style configuration for running this instance, from its
+        # overlay when it has one
+        server_path = config['server']['server-path']
+        if self.has_overlay():
+            server_path = self.server_path
+        return dict(config, **{
+            'instance': self.name,
+            'pidfile': self.pidfile,
+            'config-file': self.config_file,
+            'entry-list': self.entry_list,
+            'log-dir': self.log_dir,
+            'server-path': server_path
+        })
+
+
+def list_instances(instances_dir):
+    try:
+        names = sorted(os.listdir(instances_dir))
+    except FileNotFoundError:
+        return []
+    instances = [Instance(instances_dir, name) for name in names]
+    return [instance for instance in instances if instance.exists()]
+
+
+def select_instances(instances_dir, names):
+    instances = list_instances(instances_dir)
+    if not names:
+        return instances
+    by_name = {instance.name: instance for instance in instances}
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(', '.join(missing))
+    return [by_name[name] for name in names]
+
+
+def plugin_address(parser):
+    # (host, port) of UDP_PLUGIN_ADDRESS or None when not set
+    value = parser.get('SERVER', 'UDP_PLUGIN_ADDRESS', fallback='')
+    host, _, port = value.strip().rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        return None
+
+
+def config_port_keys(parser):
+    # (key, protocol, port) of every port bound by a server configuration
+    # and its plugin relay
+    ports = []
+    for key, protocols in port_settings.items():
+        try:
+            port = int(parser.get('SERVER', key))
+        except Exception:
+            continue
+        if port:
+            ports.extend((key, protocol, port) for protocol in protocols)
+    address = plugin_address(parser)
+    if address is not None:
+        ports.append(('UDP_PLUGIN_ADDRESS', 'udp', address[1]))
+    return ports
+
+
+def config_ports(parser):
+    # (protocol, port) pairs bound by a server configuration and its plugin
+    # relay
+    return [(protocol, port) for _, protocol, port in config_port_keys(parser)]
+
+
+def used_ports(parsers):
+    used = set()
+    for parser in parsers:
+        used.update(config_ports(parser))
+    return used
+
+
+def free_port(used, protocols, start):
+    port = start
+    while any((protocol, port) in used for protocol in protocols):
+        port += 1
+    return port
+
+
+def assign_ports(parser, used):
+    # Give parser a collision free UDP_PORT/TCP_PORT pair (acServer uses the
+    # same number for both by default) and HTTP_PORT
+    game_port = free_port(
+        used, ('udp', 'tcp'), int(server_settings['UDP_PORT']['default']))
+    used.update([('udp', game_port), ('tcp', game_port)])
+    http_port = free_port(
+        used, ('udp', 'tcp'), int(server_settings['HTTP_PORT']['default']))
+    used.update([('udp', http_port), ('tcp', http_port)])
+    parser.set('SERVER', 'UDP_PORT', str(game_port))
+    parser.set('SERVER', 'TCP_PORT', str(game_port))
+    parser.set('SERVER', 'HTTP_PORT', str(http_port))
+    return game_port, http_port
+
+
+def assign_plugin_ports(parser, used):
+    # Point acServer at a plugin relay on localhost: UDP_PLUGIN_LOCAL_PORT
+    # takes commands and UDP_PLUGIN_ADDRESS is where the relay listens
+    local_port = free_port(used, ('udp',), plugin_settings['local_port'])
+    used.add(('udp', local_port))
+    relay_port = free_port(used, ('udp',), plugin_settings['relay_port'])
+    used.add(('udp', relay_port))
+    parser.set('SERVER', 'UDP_PLUGIN_LOCAL_PORT', str(local_port))
+    parser.set('SERVER', 'UDP_PLUGIN_ADDRESS',
+               '127.0.0.1:{}'.format(relay_port))
+    return local_port, relay_port
+
+
+def create_instance(instances_dir, name, config_file, entry_list):
+    instance = Instance(instances_dir, name)
+    if instance.exists():
+        raise FileExistsError(instance.path)
+    # the template (main server configuration) may be running as well
+    parser = make_ac_parser(config_file)
+    used = used_ports(
+        [parser] + [i.parser() for i in list_instances(instances_dir)])
+    assign_ports(parser, used)
+    if plugin_address(parser) is not None:
+        assign_plugin_ports(parser, used)
+    os.makedirs(os.path.dirname(instance.config_file), exist_ok=True)
+    os.makedirs(instance.log_dir, exist_ok=True)
+    shutil.copyfile(entry_list, instance.entry_list)
+    with open(instance.config_file, 'w') as fh:
+        parser.write(fh)
+    return instance
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+
+event_header = struct.Struct('iIII')
+
+
+class InotifyError(OSError):
+    pass
+
+
+def load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+libc = load_libc()
+
+
+def available():
+    return libc is not None
+
+
+class Inotify(object):
+    # Minimal ctypes binding to the Linux inotify API, events are returned as
+    # (wd, mask, cookie, name) tuples
+
+    def __init__(self):
+        if libc is None:
+            raise InotifyError('inotify is not available')
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise InotifyError(errno, os.strerror(errno))
+        self.poller = select.poll()
+        self.poller.register(self.fd, select.POLLIN)
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise InotifyError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd):
+        libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        # block until events are available (or timeout seconds have passed)
+        if timeout is not None:
+            if not self.poller.poll(timeout * 1000):
+                return []
+        return self.parse(os.read(self.fd, 64 * 1024))
+
+    def parse(self, data):
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, offset)
+            offset += event_header.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import os
+import time
+
+from acdsc.parser import make_ac_parser
+
+# acServer answers lobby queries on HTTP_PORT: /INFO describes the server
+# and session, /JSON| lists the cars and connected drivers. All servers are
+# queried concurrently over kept alive connections, so a poll takes as long
+# as the slowest server
+lobby_host = '127.0.0.1'
+lobby_timeout = 2
+max_idle = 4
+session_names = {0: 'booking', 1: 'practice', 2: 'qualify', 3: 'race'}
+
+
+class LobbyError(Exception):
+    pass
+
+
+class StaleConnection(Exception):
+    # a kept alive connection was closed by the server
+    pass
+
+
+def lobby_port(config):
+    parser = make_ac_parser(config['config-file'])
+    return parser.get('SERVER', 'HTTP_PORT', fallback=None)
+
+
+def session_name(info):
+    try:
+        session = info['sessiontypes'][info['session']]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return session_names.get(session, '{}'.format(session))
+
+
+async def read_response(reader):
+    # (status, body, whether the connection can be reused)
+    status_line = await reader.readline()
+    if not status_line:
+        raise StaleConnection()
+    version, status = status_line.split(None, 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip().lower()
+    keep_alive = (version == b'HTTP/1.1' and
+                  headers.get('connection') != 'close')
+    if headers.get('transfer-encoding') == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b''.join(chunks)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return int(status), body, keep_alive
+
+
+class LobbyClient(object):
+    # Minimal HTTP/1.1 GET client keeping idle connections per (host, port)
+
+    def __init__(self, timeout=lobby_timeout):
+        self.timeout = timeout
+        self.idle = {}
+
+    async def connect(self, address):
+        idle = self.idle.get(address)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(*address)
+        return reader, writer, False
+
+    def release(self, address, reader, writer):
+        idle = self.idle.setdefault(address, [])
+        if len(idle) < max_idle:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def fetch(self, address, path):
+        while True:
+            reader, writer, reused = await self.connect(address)
+            try:
+                writer.write('GET {} HTTP/1.1\r\nHost: {}:{}\r\n'
+                             'Connection: keep-alive\r\n\r\n'.format(
+                                 path, *address).encode('latin-1'))
+                await writer.drain()
+                status, body, keep_alive = await read_response(reader)
+            except (StaleConnection, ConnectionError,
+                    asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise StaleConnection()
+            except BaseException:
+                # timeouts cancel requests half way through
+                writer.close()
+                raise
+            if keep_alive:
+                self.release(address, reader, writer)
+            else:
+                writer.close()
+            return status, body
+
+    async def get_json(self, host, port, path):
+        try:
+            status, body = await asyncio.wait_for(
+                self.fetch((host, int(port)), path), self.timeout)
+        except asyncio.TimeoutError:
+            raise LobbyError('timed out after {:g}s'.format(self.timeout))
+        except StaleConnection:
+            raise LobbyError('connection closed')
+        except (OSError, ValueError) as err:
+            raise LobbyError('{}'.format(err))
+        if status != 200:
+            raise LobbyError('HTTP {}'.format(status))
+        try:
+            return json.loads(body.decode('utf-8', 'replace'))
+        except ValueError:
+            raise LobbyError('invalid JSON from {}'.format(path))
+
+    def close(self):
+        for idle in self.idle.values():
+            for _, writer in idle:
+                writer.close()
+        self.idle = {}
+
+
+class ResponseCache(object):
+    # Lobby responses remembered on disk for ttl seconds, so repeated polls
+    # (e.g. from dashboards) within ttl need no requests at all
+
+    def __init__(self, cache_file, ttl):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.dirty = False
+        try:
+            with open(cache_file, 'r') as fh:
+                self.responses = json.load(fh)
+        except (IOError, ValueError):
+            self.responses = {}
+
+    def get(self, key):
+        entry = self.responses.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, key, response):
+        self.responses[key] = [time.time(), response]
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        now = time.time()
+        self.responses = {key: entry for key, entry in self.responses.items()
+                          if now - entry[0] <= self.ttl}
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        with open(temp_file, 'w') as fh:
+            json.dump(self.responses, fh)
+        os.replace(temp_file, self.cache_file)
+        self.dirty = False
+
+
+def players(cars):
+    # connected drivers from a /JSON| response
+    return [{'name': car.get('DriverName', ''),
+             'team': car.get('DriverTeam', ''),
+             'model': car.get('Model', ''),
+             'skin': car.get('Skin', '')}
+            for car in (cars or {}).get('Cars') or []
+            if car.get('IsConnected')]
+
+
+class LobbyQuery(object):
+    # Queries lobbies from synchronous code, keeping its own event loop so
+    # the connections stay alive between calls
+
+    def __init__(self, timeout=lobby_timeout, cache=None):
+        self.loop = asyncio.new_event_loop()
+        self.client = LobbyClient(timeout)
+        self.cache = cache
+
+    async def get_json(self, port, path):
+        key = '{}:{}{}'.format(lobby_host, port, path)
+        if self.cache is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                return response, True
+        response = await self.client.get_json(lobby_host, port, path)
+        if self.cache is not None:
+            self.cache.put(key, response)
+        return response, False
+
+    async def query_one(self, port, with_players):
+        result = {'port': port, 'info': None, 'players': None,
+                  'error': None, 'cached': False}
+        started = time.monotonic()
+        if not port:
+            result['error'] = 'no HTTP_PORT configured'
+        else:
+            paths = ['/INFO'] + (['/JSON|'] if with_players else [])
+            try:
+                responses = await asyncio.gather(
+                    *(self.get_json(port, path) for path in paths))
+            except LobbyError as err:
+                result['error'] = '{}'.format(err)
+            else:
+                result['info'] = responses[0][0]
+                result['cached'] = all(cached for _, cached in responses)
+                if with_players:
+                    result['players'] = players(responses[1][0])
+        result['elapsed'] = time.monotonic() - started
+        return result
+
+    async def query_all(self, ports, with_players):
+        return await asyncio.gather(
+            *(self.query_one(port, with_players) for port in ports))
+
+    def query(self, ports, with_players=False):
+        # results in the order of ports
+        results = self.loop.run_until_complete(
+            self.query_all(ports, with_players))
+        if self.cache is not None:
+            self.cache.save()
+        return results
+
+    def close(self):
+        self.client.close()
+        # let the transports finish closing before the loop goes away
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
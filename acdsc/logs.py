@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+
+import bisect
+import glob
+import gzip
+import os
+import shutil
+import struct
+import threading
+import time
+
+from collections import deque
+
+from acdsc import inotify
+
+# Every line is prefixed with the time it was captured. A sparse index of
+# (time, byte offset) records is kept next to each segment so that reading
+# from a point in time only needs a bisect and a seek
+index_record = struct.Struct('<dQ')
+index_seconds = 5
+index_bytes = 1024 * 1024
+prefix_length = len('2000-01-01 00:00:00.000 ')
+chunk_size = 64 * 1024
+
+
+def line_prefix(now):
+    return '{}.{:03d} '.format(
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
+        int(now * 1000) % 1000).encode('ascii')
+
+
+def line_time(line):
+    try:
+        stamp = line[:prefix_length - 5].decode('ascii')
+        millis = int(line[prefix_length - 4:prefix_length - 1])
+        return time.mktime(
+            time.strptime(stamp, '%Y-%m-%d %H:%M:%S')) + millis / 1000
+    except ValueError:
+        return None
+
+
+def index_path(segment):
+    if segment.endswith('.gz'):
+        segment = segment[:-3]
+    return '{}.idx'.format(segment)
+
+
+def compress(segment):
+    temp_file = '{}.gz.tmp'.format(segment)
+    with open(segment, 'rb') as src, gzip.open(temp_file, 'wb') as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+    os.replace(temp_file, '{}.gz'.format(segment))
+    os.remove(segment)
+
+
+class RotatingLog(object):
+    # Append-only log file rotated by size and/or age, rotated segments are
+    # renamed to <path>.<timestamp> and optionally gzipped in the background
+
+    def __init__(self, path, max_bytes=None, interval=None, keep=10,
+                 compress=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.keep = keep
+        self.compress = compress
+        self.open()
+
+    def open(self):
+        self.fh = open(self.path, 'ab')
+        self.size = self.fh.tell()
+        self.index = open(index_path(self.path), 'ab')
+        self.index_time = 0
+        self.index_offset = None
+        self.line_start = True
+        records = read_index(index_path(self.path))
+        self.created = records[0][0] if records else time.time()
+
+    def close(self):
+        self.fh.close()
+        self.index.close()
+
+    def should_rotate(self, now):
+        if not self.size:
+            return False
+        if self.max_bytes and self.size >= self.max_bytes:
+            return True
+        return bool(self.interval and now - self.created >= self.interval)
+
+    def rotate(self, now):
+        self.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        segment = '{}.{}'.format(self.path, stamp)
+        suffix = 0
+        while os.path.exists(segment) or os.path.exists(segment + '.gz'):
+            suffix += 1
+            segment = '{}.{}-{}'.format(self.path, stamp, suffix)
+        os.rename(self.path, segment)
+        os.rename(index_path(self.path), index_path(segment))
+        if self.compress:
+            threading.Thread(target=compress, args=(segment,)).start()
+        for old in segments(self.path)[:-self.keep or None]:
+            for path in (old, index_path(old)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        self.open()
+
+    def index_due(self, now):
+        if self.index_offset is None:
+            return True
+        return (now - self.index_time >= index_seconds or
+                self.size - self.index_offset >= index_bytes)
+
+    def write(self, data):
+        now = time.time()
+        if self.line_start and self.should_rotate(now):
+            self.rotate(now)
+        prefix = line_prefix(now)
+        out = []
+        for line in data.splitlines(keepends=True):
+            if self.line_start:
+                if self.index_due(now):
+                    self.index.write(index_record.pack(now, self.size))
+                    self.index.flush()
+                    self.index_time = now
+                    self.index_offset = self.size
+                out.append(prefix)
+                self.size += len(prefix)
+            out.append(line)
+            self.size += len(line)
+            self.line_start = line.endswith(b'\n')
+        self.fh.write(b''.join(out))
+        self.fh.flush()
+
+
+## Reading
+
+def read_index(path):
+    try:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % index_record.size
+    return list(index_record.iter_unpack(data[:usable]))
+
+
+def segments(path):
+    # rotated segments from oldest to newest followed by the current file
+    rotated = {}
+    for segment in glob.glob(glob.escape(path) + '.*'):
+        if segment.endswith(('.idx', '.tmp')):
+            continue
+        base = segment[:-3] if segment.endswith('.gz') else segment
+        # prefer the uncompressed copy while compression is in progress
+        if base not in rotated or segment == base:
+            rotated[base] = segment
+    found = [rotated[base] for base in sorted(rotated)]
+    if os.path.exists(path):
+        found.append(path)
+    return found
+
+
+def open_segment(segment):
+    if segment.endswith('.gz'):
+        return gzip.open(segment, 'rb')
+    return open(segment, 'rb')
+
+
+def iter_lines(fh):
+    pending = b''
+    while True:
+        data = fh.read(chunk_size)
+        if not data:
+            break
+        lines = (pending + data).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+def read_lines(path, since=None):
+    # Yield lines from all segments, seeking straight to the segment and the
+    # indexed offset just before since when given
+    found = segments(path)
+    start = 0
+    offset = 0
+    if since is not None:
+        for number, segment in enumerate(found):
+            records = read_index(index_path(segment))
+            if not records or records[0][0] > since:
+                break
+            start = number
+            times = [record[0] for record in records]
+            offset = records[max(bisect.bisect_right(times, since) - 1, 0)][1]
+    for number, segment in enumerate(found[start:]):
+        try:
+            fh = open_segment(segment)
+        except FileNotFoundError:
+            # compressed (or pruned) while reading
+            continue
+        with fh:
+            if number == 0 and offset:
+                fh.seek(offset)
+            for line in iter_lines(fh):
+                if since is not None:
+                    stamp = line_time(line)
+                    if stamp is not None and stamp < since:
+                        continue
+                    since = None
+                yield line
+
+
+def tail_segment(segment, count):
+    # last count lines of a segment, plain files are read backwards in
+    # chunks, compressed ones have to be read through
+    if segment.endswith('.gz'):
+        with gzip.open(segment, 'rb') as fh:
+            return list(deque(iter_lines(fh), maxlen=count))
+    with open(segment, 'rb') as fh:
+        position = fh.seek(0, os.SEEK_END)
+        data = b''
+        while position and data.count(b'\n') <= count:
+            step = min(chunk_size, position)
+            position -= step
+            fh.seek(position)
+            data = fh.read(step) + data
+    return data.splitlines(keepends=True)[-count:]
+
+
+def tail_lines(path, count):
+    # last count lines, from the rotated segments as well when the current
+    # one has fewer
+    found = []
+    for segment in reversed(segments(path)):
+        if len(found) >= count:
+            break
+        try:
+            found = tail_segment(segment, count - len(found)) + found
+        except FileNotFoundError:
+            # compressed (or pruned) while reading
+            continue
+    return found
+
+
+def follow(path):
+    # Yield lines appended to path, blocking on inotify (or sleeping when it
+    # is not available) at end of file and reopening the file on rotation
+    watcher = None
+    if inotify.available():
+        watcher = inotify.Inotify()
+        watcher.add_watch(os.path.dirname(path) or '.',
+                          inotify.IN_MODIFY | inotify.IN_CREATE |
+                          inotify.IN_MOVED_TO | inotify.IN_MOVED_FROM)
+    try:
+        fh = open(path, 'rb')
+        fh.seek(0, os.SEEK_END)
+    except FileNotFoundError:
+        fh = None
+    pending = b''
+    try:
+        while True:
+            if fh is None and os.path.exists(path):
+                fh = open(path, 'rb')
+            data = fh.read(chunk_size) if fh is not None else b''
+            if data:
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line + b'\n'
+                continue
+            if fh is not None and rotated(path, fh):
+                fh.close()
+                fh = open(path, 'rb')
+                continue
+            if watcher is not None:
+                watcher.read()
+            else:
+                time.sleep(0.5)
+    finally:
+        if fh is not None:
+            fh.close()
+        if watcher is not None:
+            watcher.close()
+
+
+def rotated(path, fh):
+    try:
+        return os.stat(path).st_ino != os.fstat(fh.fileno()).st_ino
+    except FileNotFoundError:
+        return False
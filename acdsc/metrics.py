@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+
+import math
+import mmap
+import os
+import struct
+import time
+
+from collections import OrderedDict, namedtuple
+
+import psutil
+
+# Process samples are kept in a fixed size ring buffer file memory mapped by
+# both the sampler and the readers. The header holds the sequence number of
+# the next record and every record starts with its own sequence number, so
+# readers can tell overwritten records apart without any locking
+magic = b'ACDSMTRC'
+version = 1
+header = struct.Struct('<8sIIQ')
+head = struct.Struct('<Q')
+head_offset = 16
+record = struct.Struct('<QddQIIQQQQ')
+
+Sample = namedtuple('Sample', [
+    'time', 'cpu_percent', 'rss', 'threads', 'sockets', 'ctx_voluntary',
+    'ctx_involuntary', 'net_sent', 'net_recv'])
+
+
+def ring_size(capacity):
+    return header.size + capacity * record.size
+
+
+class RingBuffer(object):
+    # Writer side of the ring buffer, an existing file with the same
+    # capacity is reused so the history survives restarts
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not self.compatible(fd):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, ring_size(capacity))
+                os.pwrite(fd, header.pack(magic, version, capacity, 0), 0)
+            self.map = mmap.mmap(fd, ring_size(capacity))
+        finally:
+            os.close(fd)
+        self.head = head.unpack_from(self.map, head_offset)[0]
+
+    def compatible(self, fd):
+        if os.fstat(fd).st_size != ring_size(self.capacity):
+            return False
+        found = header.unpack(os.pread(fd, header.size, 0))
+        return found[:3] == (magic, version, self.capacity)
+
+    def append(self, sample):
+        # the record is complete before the head moves past it
+        offset = header.size + self.head % self.capacity * record.size
+        record.pack_into(self.map, offset, self.head, *sample)
+        self.head += 1
+        head.pack_into(self.map, head_offset, self.head)
+
+    def close(self):
+        self.map.close()
+
+
+def read_samples(path, since=None):
+    # Samples from oldest to newest. Records before the head are complete,
+    # the head is read before the records are copied and again after it:
+    # the writer may have been overwriting any slot of a record it has
+    # reached in the meantime, those are dropped
+    try:
+        with open(path, 'rb') as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return []
+    with data:
+        if len(data) < header.size:
+            return []
+        found_magic, found_version, capacity, _ = header.unpack_from(data)
+        if (found_magic, found_version) != (magic, version) or \
+                len(data) < ring_size(capacity):
+            return []
+        last = head.unpack_from(data, head_offset)[0]
+        records = data[header.size:ring_size(capacity)]
+        written = head.unpack_from(data, head_offset)[0]
+    samples = []
+    for seq in range(max(last - capacity, written - capacity + 1, 0), last):
+        values = record.unpack_from(records, seq % capacity * record.size)
+        if values[0] != seq:
+            continue
+        sample = Sample(*values[1:])
+        if since is None or sample.time >= since:
+            samples.append(sample)
+    return samples
+
+
+def connections(process):
+    # Process.connections was renamed to net_connections in psutil 6
+    method = getattr(process, 'net_connections', None) or process.connections
+    return method(kind='inet')
+
+
+class ProcessSampler(object):
+    # cpu_percent is measured between two calls, so the first call for a new
+    # process only primes it and returns no sample
+
+    def __init__(self):
+        self.process = None
+
+    def sample(self, pid):
+        try:
+            if self.process is None or self.process.pid != pid:
+                self.process = psutil.Process(pid)
+                self.process.cpu_percent()
+                return None
+            with self.process.oneshot():
+                cpu_percent = self.process.cpu_percent()
+                rss = self.process.memory_info().rss
+                threads = self.process.num_threads()
+                switches = self.process.num_ctx_switches()
+            sockets = len(connections(self.process))
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self.process = None
+            return None
+        # psutil has no per process network counters, network I/O is host
+        # wide
+        net = psutil.net_io_counters()
+        return Sample(time.time(), cpu_percent, rss, threads, sockets,
+                      switches.voluntary, switches.involuntary,
+                      net.bytes_sent, net.bytes_recv)
+
+
+## Summaries
+
+def percentile(values, percent):
+    # nearest rank
+    ordered = sorted(values)
+    rank = int(math.ceil(len(ordered) * percent / 100.0))
+    return ordered[max(rank - 1, 0)]
+
+
+def summarize(values):
+    # (min, avg, max, p99) or None without values
+    if not values:
+        return None
+    return (min(values),
+            sum(values) / len(values),
+            max(values),
+            percentile(values, 99))
+
+
+def rates(samples, field):
+    # per second rates of a counter between consecutive samples, counter
+    # resets (e.g. acServer restarts) are skipped
+    found = []
+    for previous, current in zip(samples, samples[1:]):
+        elapsed = current.time - previous.time
+        delta = getattr(current, field) - getattr(previous, field)
+        if elapsed > 0 and delta >= 0:
+            found.append(delta / elapsed)
+    return found
+
+
+def history(samples):
+    # metric name -> values, gauges as sampled and counters as rates
+    return OrderedDict([
+        ('cpu %', [sample.cpu_percent for sample in samples]),
+        ('rss MiB', [sample.rss / 1024 / 1024 for sample in samples]),
+        ('threads', [sample.threads for sample in samples]),
+        ('sockets', [sample.sockets for sample in samples]),
+        ('voluntary ctx/s', rates(samples, 'ctx_voluntary')),
+        ('involuntary ctx/s', rates(samples, 'ctx_involuntary')),
+        ('host net out KiB/s',
+         [rate / 1024 for rate in rates(samples, 'net_sent')]),
+        ('host net in KiB/s',
+         [rate / 1024 for rate in rates(samples, 'net_recv')])
+    ])
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+
+import json
+import os
+import shutil
+import time
+
+# Instance overlays. An instance gets its own server tree in which every
+# file of the shared install is a hardlink, so N servers use the disk and
+# the page cache of one install. Only cfg/ (a link to the instance's own
+# configuration), results/ and logs are private. A manifest of the linked
+# files is kept to detect shared files modified in place
+private = ('cfg', 'results', 'logs')
+manifest_name = 'overlay.json'
+
+
+def file_state(stat):
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def link_tree(source, target):
+    # Mirror source in target with hardlinks (copies across filesystems),
+    # returns the manifest of the mirrored files and how many were copied
+    files = {}
+    copied = 0
+    for root, directories, names in os.walk(source):
+        relative = os.path.relpath(root, source)
+        if relative == '.':
+            directories[:] = [name for name in directories
+                              if name not in private]
+            names = [name for name in names if name not in private]
+        os.makedirs(os.path.join(target, relative), exist_ok=True)
+        for name in names:
+            path = os.path.normpath(os.path.join(relative, name))
+            source_file = os.path.join(source, path)
+            target_file = os.path.join(target, path)
+            if os.path.islink(source_file):
+                os.symlink(os.readlink(source_file), target_file)
+                continue
+            try:
+                os.link(source_file, target_file)
+            except OSError:
+                shutil.copy2(source_file, target_file)
+                copied += 1
+            files[path] = file_state(os.stat(target_file))
+    return files, copied
+
+
+def build_overlay(instance, source):
+    # (Re)build the server tree of a stopped instance from the install in
+    # source, returns (files linked, files copied, seconds)
+    started = time.monotonic()
+    source = os.path.realpath(source)
+    target = '{}.new'.format(instance.server_path)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    files, copied = link_tree(source, target)
+    os.symlink(os.path.join('..', 'cfg'), os.path.join(target, 'cfg'))
+    results = os.path.join(instance.server_path, 'results')
+    if os.path.isdir(results):
+        os.rename(results, os.path.join(target, 'results'))
+    else:
+        os.makedirs(os.path.join(target, 'results'))
+    if os.path.exists(instance.server_path):
+        old = '{}.old'.format(instance.server_path)
+        os.rename(instance.server_path, old)
+        os.rename(target, instance.server_path)
+        shutil.rmtree(old)
+    else:
+        os.rename(target, instance.server_path)
+    write_manifest(instance, source, files)
+    return len(files), copied, time.monotonic() - started
+
+
+def rebuild_overlay(instances, source, name):
+    # rebuild the overlay of instance name (if it is one of instances) from
+    # source, for instances that were running while source was updated
+    instance = instances.get(name)
+    if instance is not None:
+        build_overlay(instance, source)
+
+
+def write_manifest(instance, source, files):
+    manifest_file = os.path.join(instance.path, manifest_name)
+    temp_file = '{}.{}.tmp'.format(manifest_file, os.getpid())
+    with open(temp_file, 'w') as fh:
+        json.dump({'source': source, 'created': time.time(), 'files': files},
+                  fh)
+    os.replace(temp_file, manifest_file)
+
+
+def read_manifest(instance):
+    try:
+        with open(os.path.join(instance.path, manifest_name), 'r') as fh:
+            return json.load(fh)
+    except (IOError, ValueError):
+        return None
+
+
+def overlay_source(instance):
+    # the install the overlay was built from
+    manifest = read_manifest(instance)
+    return manifest['source'] if manifest is not None else None
+
+
+def verify_overlay(instance, live):
+    # (level, path, message) of overlay files that differ from the manifest,
+    # files replaced in the live install (e.g. by an update) since the
+    # overlay was built are summed up in a single warning
+    manifest = read_manifest(instance)
+    if manifest is None:
+        return [('error', instance.server_path, 'no overlay manifest')]
+    problems = []
+    stale = 0
+    for path, (size, mtime_ns, inode) in sorted(manifest['files'].items()):
+        try:
+            stat = os.stat(os.path.join(instance.server_path, path))
+        except FileNotFoundError:
+            problems.append(('error', path, 'missing'))
+            continue
+        if stat.st_ino != inode:
+            problems.append(('error', path, 'replaced in the overlay'))
+        elif [stat.st_size, stat.st_mtime_ns] != [size, mtime_ns]:
+            if stat.st_nlink > 1:
+                problems.append(('error', path, 'shared file modified in '
+                                 'place ({} links)'.format(stat.st_nlink)))
+            else:
+                problems.append(('error', path, 'modified'))
+        else:
+            try:
+                live_stat = os.stat(os.path.join(live, path))
+            except FileNotFoundError:
+                stale += 1
+                continue
+            # copies (across filesystems) have inodes of their own
+            stale += (live_stat.st_ino != inode and
+                      [live_stat.st_size, live_stat.st_mtime_ns] !=
+                      [size, mtime_ns])
+    if stale:
+        problems.append(('warning', instance.server_path,
+                         '{} file(s) differ from the live install {} '
+                         '(rebuild the overlay)'.format(stale, live)))
+    return problems
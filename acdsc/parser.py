@@ -1,18 +1,58 @@
 #!/usr/bin/python3
 
+import bisect
 import configparser
+import io
+import os
+import stat
 
 
 class ACParser(configparser.ConfigParser):
+    # Numbered sections (CAR_0, WEATHER_1, ...) are indexed per prefix as a
+    # sorted list of (id, section) so ordered listing and the next free id
+    # need no filtering or sorting
 
     optionxform = str
 
+    def __init__(self, *args, **kwargs):
+        self._prefix_index = {}
+        super().__init__(*args, **kwargs)
+
+    def _read(self, fp, fpname):
+        # configparser reads sections without going through add_section
+        super()._read(fp, fpname)
+        self._prefix_index = {}
+        for section in self._sections:
+            self._index_section(section)
+
+    def _index_section(self, section):
+        key = split_section(section)
+        if key is not None:
+            ids = self._prefix_index.setdefault(key[0], [])
+            item = (key[1], section)
+            if not ids or ids[-1] < item:
+                ids.append(item)
+            else:
+                bisect.insort(ids, item)
+
+    def add_section(self, section):
+        super().add_section(section)
+        self._index_section(section)
+
+    def remove_section(self, section):
+        existed = super().remove_section(section)
+        key = split_section(section)
+        if existed and key is not None:
+            ids = self._prefix_index[key[0]]
+            del ids[bisect.bisect_left(ids, (key[1], section))]
+        return existed
+
     def prefix_sections(self, prefix):
-        def startswith_prefix(value):
-            return value.startswith('{}_'.format(prefix))
+        return [section for _, section in self._prefix_index.get(prefix, [])]
 
-        return sorted(filter(startswith_prefix, self.sections()),
-                      key=numeric_sort)
+    def next_section(self, prefix):
+        ids = self._prefix_index.get(prefix)
+        return '{}_{}'.format(prefix, ids[-1][0] + 1 if ids else 0)
 
     def write(self, fp):
         for section in self._sections:
@@ -37,8 +77,6 @@ def convert_ini_key(ini_key):
 def to_ini(kv):
     key, value = kv
     if value is not None:
-        if isinstance(value, str):
-            return (convert_key(key), value.encode('utf-8'))
         return (convert_key(key), '{}'.format(value))
     return (convert_key(key), value)
 
@@ -49,6 +87,50 @@ def make_ac_parser(config_file):
     return parser
 
 
+def render_ac_parser(parser):
+    fh = io.StringIO()
+    parser.write(fh)
+    return fh.getvalue()
+
+
+def write_ac_parser(parser, config_file):
+    # Write to a temporary file in the same directory, fsync and rename it
+    # over config_file so acServer never reads a half-written file. The
+    # permissions of config_file are kept
+    directory = os.path.dirname(os.path.abspath(config_file))
+    temp_file = os.path.join(directory, '.{}.{}.tmp'.format(
+        os.path.basename(config_file), os.getpid()))
+    try:
+        mode = stat.S_IMODE(os.stat(config_file).st_mode)
+    except FileNotFoundError:
+        mode = None
+    try:
+        with open(temp_file, 'w') as fh:
+            parser.write(fh)
+            fh.flush()
+            if mode is not None:
+                os.fchmod(fh.fileno(), mode)
+            os.fsync(fh.fileno())
+        os.replace(temp_file, config_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def split_section(section):
+    # CAR_12 -> ('CAR', 12), None for sections without a numeric suffix
+    prefix, _, idx = section.rpartition('_')
+    if prefix and idx.isdigit():
+        return prefix, int(idx)
+    return None
+
+
 def numeric_sort(a):
     return int(a.split('_')[-1])
 
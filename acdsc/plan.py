@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+
+import json
+
+from collections import OrderedDict
+
+import click
+
+from acdsc.parser import convert_key
+from acdsc.settings import (
+    entry_list_settings, server_settings, session_settings, weather_settings)
+from acdsc.validators import content_index, related_problems
+
+# Plan files describe many configuration edits at once:
+#
+#   server:   {KEY: value, ...}
+#   sessions: {SESSION: {KEY: value, ...} or null to remove the session}
+#   weather:  {set: {ID: {KEY: value}}, add: [{KEY: value}], remove: [ID]}
+#   entries:  {set: {ID: {KEY: value}}, add: [{KEY: value}], remove: [ID]}
+#
+# keys may be given as in the .ini-files (MAX_CLIENTS) or as command line
+# options (max-clients)
+section_plans = OrderedDict([
+    ('weather', ('WEATHER', weather_settings, 'parser')),
+    ('entries', ('CAR', entry_list_settings, 'entry-parser'))
+])
+
+
+class PlanError(Exception):
+
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+def load_plan(plan_file):
+    try:
+        with open(plan_file, 'r') as fh:
+            if plan_file.endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise PlanError(['PyYAML is required for YAML plans'])
+                return yaml.safe_load(fh) or {}
+            return json.load(fh)
+    except ValueError as err:
+        raise PlanError(['{}: {}'.format(plan_file, err)])
+
+
+def check_value(settings, key, value):
+    validator = click.types.convert_type(settings[key]['validator'])
+    validator.convert('{}'.format(value), None, None)
+    return '{}'.format(value)
+
+
+def check_values(settings, values, where, errors):
+    checked = OrderedDict()
+    if not isinstance(values, dict):
+        errors.append('{}: expected a mapping of settings'.format(where))
+        return checked
+    for key, value in values.items():
+        ini_key = convert_key(key)
+        if ini_key not in settings:
+            errors.append('{}: unknown setting {}'.format(where, ini_key))
+            continue
+        try:
+            checked[ini_key] = check_value(settings, ini_key, value)
+        except click.BadParameter as err:
+            errors.append('{}.{}: {}'.format(
+                where, ini_key, err.format_message()))
+    return checked
+
+
+def default_values(settings):
+    return OrderedDict((key, '{}'.format(value['default']))
+                       for key, value in settings.items())
+
+
+def check_related(current, checked, where, errors):
+    # settings depending on other settings (SKIN of MODEL) are checked once
+    # the whole section is known, the current values updated with the plan
+    index = content_index()
+    if index is None:
+        return
+    values = OrderedDict(current)
+    values.update(checked)
+    for key, message in related_problems(index, values, checked):
+        errors.append('{}.{}: {}'.format(where, key, message))
+
+
+def check_sections(name, prefix, settings, parser, plan, errors):
+    checked = {'set': OrderedDict(), 'add': [], 'remove': []}
+    if not isinstance(plan, dict):
+        errors.append('{}: expected set/add/remove'.format(name))
+        return checked
+    for key in set(plan) - set(checked):
+        errors.append('{}: unknown operation {}'.format(name, key))
+    for idx, values in (plan.get('set') or {}).items():
+        section = '{}_{}'.format(prefix, idx)
+        if not parser.has_section(section):
+            errors.append('{}: {} does not exist'.format(name, section))
+        where = '{}.set.{}'.format(name, idx)
+        checked['set'][section] = check_values(settings, values, where,
+                                               errors)
+        if parser.has_section(section):
+            check_related(parser.items(section), checked['set'][section],
+                          where, errors)
+    for idx in plan.get('remove') or []:
+        section = '{}_{}'.format(prefix, idx)
+        if not parser.has_section(section):
+            errors.append('{}: {} does not exist'.format(name, section))
+        checked['remove'].append(section)
+    for number, values in enumerate(plan.get('add') or []):
+        where = '{}.add.{}'.format(name, number)
+        checked['add'].append(check_values(settings, values, where, errors))
+        check_related(default_values(settings), checked['add'][-1], where,
+                      errors)
+    return checked
+
+
+def validate_plan(plan, config):
+    # Check the whole plan in one pass against the settings and the current
+    # configuration, raises PlanError listing every problem found
+    errors = []
+    if not isinstance(plan, dict):
+        raise PlanError(['plan: expected a mapping'])
+    known = ['server', 'sessions'] + list(section_plans)
+    for key in plan:
+        if key not in known:
+            errors.append('plan: unknown section {}'.format(key))
+    checked = {
+        'server': check_values(
+            server_settings, plan.get('server') or {}, 'server', errors),
+        'sessions': OrderedDict()
+    }
+    current = ()
+    if config['parser'].has_section('SERVER'):
+        current = config['parser'].items('SERVER')
+    check_related(current, checked['server'], 'server', errors)
+    sessions = plan.get('sessions') or {}
+    if not isinstance(sessions, dict):
+        errors.append('sessions: expected a mapping of sessions')
+        sessions = {}
+    for session, values in sessions.items():
+        session = convert_key(session)
+        if session not in session_settings:
+            errors.append('sessions: unknown session {}'.format(session))
+        elif values is None:
+            if not config['parser'].has_section(session):
+                errors.append('sessions: {} does not exist'.format(session))
+            checked['sessions'][session] = None
+        else:
+            checked['sessions'][session] = check_values(
+                session_settings[session],
+                values,
+                'sessions.{}'.format(session),
+                errors)
+    for name, (prefix, settings, parser) in section_plans.items():
+        checked[name] = check_sections(name,
+                                       prefix,
+                                       settings,
+                                       config[parser],
+                                       plan.get(name) or {},
+                                       errors)
+    if errors:
+        raise PlanError(errors)
+    return checked
+
+
+def add_defaults(parser, section, settings):
+    for key, value in default_values(settings).items():
+        parser.set(section, key, value)
+
+
+def apply_plan(checked, config):
+    # Apply a plan returned by validate_plan to the parsers in config
+    parser = config['parser']
+    if checked['server'] and not parser.has_section('SERVER'):
+        parser.add_section('SERVER')
+    for key, value in checked['server'].items():
+        parser.set('SERVER', key, value)
+    for session, values in checked['sessions'].items():
+        if values is None:
+            parser.remove_section(session)
+            continue
+        if not parser.has_section(session):
+            parser.add_section(session)
+            add_defaults(parser, session, session_settings[session])
+        for key, value in values.items():
+            parser.set(session, key, value)
+    for name, (prefix, settings, parser) in section_plans.items():
+        parser = config[parser]
+        for section, values in checked[name]['set'].items():
+            for key, value in values.items():
+                parser.set(section, key, value)
+        for section in checked[name]['remove']:
+            parser.remove_section(section)
+        for values in checked[name]['add']:
+            section = parser.next_section(prefix)
+            parser.add_section(section)
+            add_defaults(parser, section, settings)
+            for key, value in values.items():
+                parser.set(section, key, value)
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+
+import struct
+
+from collections import namedtuple
+
+# acServer UDP plugin protocol. acServer sends events to UDP_PLUGIN_ADDRESS
+# and takes commands on UDP_PLUGIN_LOCAL_PORT, every packet starts with its
+# type byte. Integers and floats are little endian, strings are a length
+# byte followed by ASCII (string) or UTF-32LE (wide string) characters
+NEW_SESSION = 50
+NEW_CONNECTION = 51
+CONNECTION_CLOSED = 52
+CAR_UPDATE = 53
+CAR_INFO = 54
+END_SESSION = 55
+VERSION = 56
+CHAT = 57
+CLIENT_LOADED = 58
+SESSION_INFO = 59
+ERROR = 60
+LAP_COMPLETED = 73
+CLIENT_EVENT = 130
+
+CE_COLLISION_WITH_CAR = 10
+CE_COLLISION_WITH_ENV = 11
+
+# commands
+REALTIMEPOS_INTERVAL = 200
+GET_CAR_INFO = 201
+SEND_CHAT = 202
+BROADCAST_CHAT = 203
+GET_SESSION_INFO = 204
+SET_SESSION_INFO = 205
+KICK_USER = 206
+NEXT_SESSION = 207
+RESTART_SESSION = 208
+ADMIN_COMMAND = 209
+
+event_names = {
+    NEW_SESSION: 'new_session',
+    NEW_CONNECTION: 'new_connection',
+    CONNECTION_CLOSED: 'connection_closed',
+    CAR_UPDATE: 'car_update',
+    CAR_INFO: 'car_info',
+    END_SESSION: 'end_session',
+    VERSION: 'version',
+    CHAT: 'chat',
+    CLIENT_LOADED: 'client_loaded',
+    SESSION_INFO: 'session_info',
+    ERROR: 'error',
+    LAP_COMPLETED: 'lap_completed',
+    CLIENT_EVENT: 'client_event'
+}
+commands = frozenset(range(REALTIMEPOS_INTERVAL, ADMIN_COMMAND + 1))
+
+# fixed size parts, offsets are relative to the type byte
+car_update = struct.Struct('<B3f3fBHf')
+lap_completed = struct.Struct('<BIBB')
+leaderboard_entry = struct.Struct('<BIHB')
+grip_level = struct.Struct('<f')
+client_event = struct.Struct('<BB')
+collision = struct.Struct('<f3f3f')
+session_header = struct.Struct('<BBBB')
+session_values = struct.Struct('<BHHHBB')
+elapsed_ms = struct.Struct('<i')
+
+CarUpdate = namedtuple('CarUpdate', [
+    'car_id', 'position', 'velocity', 'gear', 'engine_rpm',
+    'spline_position'])
+Connection = namedtuple('Connection', [
+    'driver_name', 'driver_guid', 'car_id', 'car_model', 'car_skin'])
+CarInfo = namedtuple('CarInfo', [
+    'car_id', 'is_connected', 'car_model', 'car_skin', 'driver_name',
+    'driver_team', 'driver_guid'])
+LapCompleted = namedtuple('LapCompleted', [
+    'car_id', 'lap_time', 'cuts', 'leaderboard', 'grip_level'])
+LeaderboardEntry = namedtuple('LeaderboardEntry', [
+    'car_id', 'time', 'laps', 'completed'])
+ClientEvent = namedtuple('ClientEvent', [
+    'kind', 'car_id', 'other_car_id', 'impact_speed', 'world_position',
+    'relative_position'])
+SessionInfo = namedtuple('SessionInfo', [
+    'version', 'session_index', 'current_session_index', 'session_count',
+    'server_name', 'track', 'track_config', 'name', 'type', 'time', 'laps',
+    'wait_time', 'ambient_temp', 'road_temp', 'weather_graphics',
+    'elapsed_ms'])
+Chat = namedtuple('Chat', ['car_id', 'message'])
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def read_string(view, offset):
+    length = view[offset]
+    end = offset + 1 + length
+    return str(view[offset + 1:end], 'ascii', 'replace'), end
+
+
+def read_wide_string(view, offset):
+    length = view[offset]
+    end = offset + 1 + length * 4
+    return str(view[offset + 1:end], 'utf-32-le', 'replace'), end
+
+
+def decode_car_update(view):
+    values = car_update.unpack_from(view, 1)
+    return CarUpdate(values[0], values[1:4], values[4:7], *values[7:])
+
+
+def decode_connection(view):
+    driver_name, offset = read_wide_string(view, 1)
+    driver_guid, offset = read_wide_string(view, offset)
+    car_id = view[offset]
+    car_model, offset = read_string(view, offset + 1)
+    car_skin, offset = read_string(view, offset)
+    return Connection(driver_name, driver_guid, car_id, car_model, car_skin)
+
+
+def decode_car_info(view):
+    car_id, is_connected = view[1], bool(view[2])
+    values = []
+    offset = 3
+    for _ in range(5):
+        value, offset = read_wide_string(view, offset)
+        values.append(value)
+    return CarInfo(car_id, is_connected, *values)
+
+
+def decode_lap_completed(view):
+    car_id, lap_time, cuts, count = lap_completed.unpack_from(view, 1)
+    offset = 1 + lap_completed.size
+    leaderboard = []
+    for _ in range(count):
+        entry = leaderboard_entry.unpack_from(view, offset)
+        leaderboard.append(LeaderboardEntry(
+            entry[0], entry[1], entry[2], bool(entry[3])))
+        offset += leaderboard_entry.size
+    return LapCompleted(car_id, lap_time, cuts, leaderboard,
+                        grip_level.unpack_from(view, offset)[0])
+
+
+def decode_client_event(view):
+    kind, car_id = client_event.unpack_from(view, 1)
+    offset = 1 + client_event.size
+    other_car_id = None
+    if kind == CE_COLLISION_WITH_CAR:
+        other_car_id = view[offset]
+        offset += 1
+    values = collision.unpack_from(view, offset)
+    return ClientEvent(kind, car_id, other_car_id, values[0], values[1:4],
+                       values[4:7])
+
+
+def decode_session_info(view):
+    header = session_header.unpack_from(view, 1)
+    offset = 1 + session_header.size
+    strings = []
+    server_name, offset = read_wide_string(view, offset)
+    for _ in range(3):
+        value, offset = read_string(view, offset)
+        strings.append(value)
+    values = session_values.unpack_from(view, offset)
+    offset += session_values.size
+    weather_graphics, offset = read_string(view, offset)
+    elapsed = elapsed_ms.unpack_from(view, offset)[0]
+    return SessionInfo(*header, server_name, *strings, *values,
+                       weather_graphics, elapsed)
+
+
+def decode_chat(view):
+    return Chat(view[1], read_wide_string(view, 2)[0])
+
+
+decoders = {
+    CAR_UPDATE: decode_car_update,
+    NEW_CONNECTION: decode_connection,
+    CONNECTION_CLOSED: decode_connection,
+    CAR_INFO: decode_car_info,
+    LAP_COMPLETED: decode_lap_completed,
+    CLIENT_EVENT: decode_client_event,
+    NEW_SESSION: decode_session_info,
+    SESSION_INFO: decode_session_info,
+    CHAT: decode_chat,
+    CLIENT_LOADED: lambda view: view[1],
+    VERSION: lambda view: view[1],
+    END_SESSION: lambda view: read_wide_string(view, 1)[0],
+    ERROR: lambda view: read_wide_string(view, 1)[0]
+}
+
+# shortest packet of each type: its fixed size parts and a length byte per
+# string, so a packet can be checked without decoding it
+min_lengths = {
+    CAR_UPDATE: 1 + car_update.size,
+    NEW_CONNECTION: 6,
+    CONNECTION_CLOSED: 6,
+    CAR_INFO: 8,
+    LAP_COMPLETED: 1 + lap_completed.size + grip_level.size,
+    CLIENT_EVENT: 1 + client_event.size + collision.size,
+    NEW_SESSION: 1 + session_header.size + 4 + session_values.size + 1 +
+    elapsed_ms.size,
+    SESSION_INFO: 1 + session_header.size + 4 + session_values.size + 1 +
+    elapsed_ms.size,
+    CHAT: 3,
+    CLIENT_LOADED: 2,
+    VERSION: 2,
+    END_SESSION: 2,
+    ERROR: 2
+}
+
+
+def decode(packet):
+    # (type, decoded event) of a packet read straight from its buffer,
+    # unknown packet types decode to None
+    view = memoryview(packet)
+    if not view:
+        raise DecodeError('empty packet')
+    kind = view[0]
+    decoder = decoders.get(kind)
+    if decoder is None:
+        return kind, None
+    try:
+        return kind, decoder(view)
+    except (struct.error, IndexError) as err:
+        raise DecodeError('{}: {}'.format(event_names[kind], err))
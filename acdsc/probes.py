@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+import json
+import os
+import shutil
+import time
+
+
+def path_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+def fingerprint(paths):
+    return [[path, path_mtime(path)] for path in paths]
+
+
+class ProbeCache(object):
+    # Successful environment probes are remembered for ttl seconds as long as
+    # the probed paths (and their mtimes) stay the same
+
+    def __init__(self, cache_file, ttl):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.dirty = False
+        try:
+            with open(cache_file, 'r') as fh:
+                self.probes = json.load(fh)
+        except (IOError, ValueError):
+            self.probes = {}
+
+    def fresh(self, name, paths):
+        entry = self.probes.get(name)
+        if entry is None:
+            return False
+        if time.time() - entry['checked'] > self.ttl:
+            return False
+        return entry['paths'] == fingerprint(paths)
+
+    def record(self, name, paths):
+        self.probes[name] = {
+            'checked': time.time(),
+            'paths': fingerprint(paths)
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        with open(temp_file, 'w') as fh:
+            json.dump(self.probes, fh)
+        os.replace(temp_file, self.cache_file)
+        self.dirty = False
+
+
+## Probes
+
+# the installers (and the download machinery behind them) are imported
+# only when a probe actually has to run
+
+def probe_steam(config):
+    from acdsc.steam import has_steam, install_steam
+
+    if not has_steam():
+        install_steam(config['cache-dir'])
+
+
+def probe_steamcmd(config):
+    from acdsc.steamcmd import (
+        assert_working_steamcmd, has_steamcmd, install_steamcmd)
+
+    if not has_steamcmd(config['steamcmd-path']):
+        install_steamcmd(config['steamcmd-path'], config['cache-dir'])
+    assert_working_steamcmd(config['steamcmd'])
+
+
+def probe_acds(config):
+    from acdsc.steam import has_acds
+    from acdsc.steamcmd import update_acds
+
+    if not has_acds(config['steam-path'], config['server-path']):
+        run_probes(config, ['steamcmd'])
+        update_acds(config['steamcmd'])
+
+
+probes = {
+    'steam': probe_steam,
+    'steamcmd': probe_steamcmd,
+    'acds': probe_acds
+}
+
+
+def probe_paths(config, name):
+    if name == 'steam':
+        return [shutil.which('steam')]
+    if name == 'steamcmd':
+        return [config['steamcmd-path'], config['steamcmd']]
+    return [config['steam-path'], config['server-path']]
+
+
+def run_probes(config, names):
+    # Run the given probes unless they have succeeded recently enough, the
+    # fingerprint is taken after probing as steamcmd likes to update itself
+    cache = config['probe-cache']
+    for name in names:
+        if cache.fresh(name, probe_paths(config, name)):
+            continue
+        probes[name](config)
+        cache.record(name, probe_paths(config, name))
+    cache.save()
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+import os
+import re
+import socket
+import time
+
+from collections import OrderedDict
+
+import psutil
+
+from acdsc.daemon import ACDaemon, daemon_status, read_state, server_log
+from acdsc.lobby import LobbyQuery
+from acdsc.parser import make_ac_parser
+
+# Readiness of started servers. acServer is ready once it accepts
+# connections on TCP_PORT, has bound UDP_PORT and answers lobby queries on
+# HTTP_PORT, and when asked for once it has logged its lobby registration.
+# Servers are started at most jobs at a time, the next one is started as
+# soon as one of them is ready, has failed or timed out
+ready_ports = ('TCP_PORT', 'UDP_PORT', 'HTTP_PORT')
+lobby_registered = re.compile(rb'lobby registration successful', re.I)
+poll_interval = 0.1
+
+
+def tcp_listening(port):
+    try:
+        socket.create_connection(('127.0.0.1', port), 0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+def udp_ports():
+    # local ports of every bound UDP socket, from the kernel tables when
+    # there are any (psutil would go through the fds of every process)
+    ports = set()
+    found = False
+    for table in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(table, 'r') as fh:
+                next(fh, None)
+                for line in fh:
+                    address = line.split()[1]
+                    ports.add(int(address.rpartition(':')[2], 16))
+            found = True
+        except FileNotFoundError:
+            continue
+    if not found:
+        ports.update(connection.laddr.port for connection in
+                     psutil.net_connections('udp'))
+    return ports
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+class Startup(object):
+    # A server being started and the probes it has not passed yet
+
+    def __init__(self, name, config, lobby=False):
+        self.name = name
+        self.daemon = ACDaemon(config)
+        parser = make_ac_parser(config['config-file'])
+        self.ports = OrderedDict(
+            (key, parser.getint('SERVER', key, fallback=0))
+            for key in ready_ports)
+        self.pending = [key for key, port in self.ports.items() if port]
+        if lobby:
+            self.pending.append('lobby')
+        # only lines acServer logs from now on count
+        self.log_file = server_log(self.daemon.log_dir)
+        self.offset = file_size(self.log_file)
+        self.started = None
+
+    def spawn(self):
+        self.started = time.monotonic()
+        return self.daemon.spawn()
+
+    def registered(self):
+        # whether the lobby registration has been logged, complete lines
+        # are read only once
+        try:
+            fh = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            return False
+        with fh:
+            if fh.seek(0, os.SEEK_END) < self.offset:
+                # rotated
+                self.offset = 0
+            fh.seek(self.offset)
+            data = fh.read()
+        if lobby_registered.search(data):
+            return True
+        self.offset += data.rfind(b'\n') + 1
+        return False
+
+    def status(self):
+        return daemon_status(self.daemon, read_state(self.daemon.state_file))
+
+
+def check(startups, lobbies):
+    # drop the probes startups pass now, the lobbies are queried
+    # concurrently
+    if any('UDP_PORT' in startup.pending for startup in startups):
+        bound = udp_ports()
+    querying = [startup for startup in startups
+                if 'HTTP_PORT' in startup.pending]
+    if querying:
+        results = lobbies.query([startup.ports['HTTP_PORT']
+                                 for startup in querying])
+        for startup, result in zip(querying, results):
+            if result['error'] is None:
+                startup.pending.remove('HTTP_PORT')
+    for startup in startups:
+        passed = []
+        for probe in startup.pending:
+            if probe == 'TCP_PORT':
+                ready = tcp_listening(startup.ports[probe])
+            elif probe == 'UDP_PORT':
+                ready = startup.ports[probe] in bound
+            elif probe == 'lobby':
+                ready = startup.registered()
+            else:
+                continue
+            if ready:
+                passed.append(probe)
+        startup.pending = [probe for probe in startup.pending
+                           if probe not in passed]
+
+
+def start_servers(targets, jobs, timeout, lobby=False):
+    # Start (name, config) targets and wait for them to be ready, at most
+    # jobs of them at once. Yields (name, seconds to ready, None) or
+    # (name, None, error) in the order they are done
+    waiting = list(targets)
+    starting = []
+    lobbies = LobbyQuery(timeout=1)
+    try:
+        while waiting or starting:
+            while waiting and len(starting) < jobs:
+                startup = Startup(*waiting.pop(0), lobby=lobby)
+                if startup.spawn():
+                    starting.append(startup)
+                else:
+                    yield startup.name, None, 'failed to start'
+            check(starting, lobbies)
+            now = time.monotonic()
+            for startup in list(starting):
+                elapsed = now - startup.started
+                status = startup.status()
+                if not startup.pending:
+                    result = (elapsed, None)
+                elif status != 'running':
+                    result = (None, 'acServer {} after {:.2f}s'.format(
+                        status, elapsed))
+                elif elapsed > timeout:
+                    result = (None, 'not ready after {:g}s (no {})'.format(
+                        timeout, ', '.join(startup.pending)))
+                else:
+                    continue
+                starting.remove(startup)
+                yield (startup.name,) + result
+            if starting:
+                time.sleep(poll_interval)
+    finally:
+        lobbies.close()
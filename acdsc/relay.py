@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+
+import asyncio
+import os
+import signal
+import socket
+
+from collections import Counter
+
+from acdsc import plugin
+
+# Relays the acServer UDP plugin stream to any number of consumers. Every
+# consumer has a bounded queue of packets waiting to be sent, packets that
+# do not fit are dropped (and counted) so a slow consumer never holds up
+# the others. Commands sent by consumers are forwarded to acServer
+
+# car updates of a full grid arrive in bursts, a larger receive buffer
+# (capped by net.core.rmem_max) keeps the kernel from dropping them
+receive_buffer = 4 * 1024 * 1024
+
+
+def parse_consumer(value):
+    # udp:HOST:PORT or unix:PATH -> (kind, address)
+    kind, _, address = value.partition(':')
+    if kind == 'udp':
+        host, _, port = address.rpartition(':')
+        return kind, (host or '127.0.0.1', int(port))
+    if kind == 'unix' and address:
+        return kind, address
+    raise ValueError('{} is not udp:HOST:PORT or unix:PATH'.format(value))
+
+
+class Consumer(asyncio.DatagramProtocol):
+
+    def __init__(self, relay, kind, address, queue_size):
+        self.relay = relay
+        self.kind = kind
+        self.address = address
+        self.queue = asyncio.Queue(queue_size)
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.transport = None
+        self.local_path = None
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def name(self):
+        if self.kind == 'udp':
+            return 'udp:{}:{}'.format(*self.address)
+        return 'unix:{}'.format(self.address)
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        if self.kind == 'udp':
+            await loop.create_datagram_endpoint(
+                lambda: self, remote_addr=self.address)
+            return
+        # commands come back to the address the packets were sent from
+        self.local_path = '{}.relay'.format(self.address)
+        try:
+            os.remove(self.local_path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.local_path)
+        await loop.create_datagram_endpoint(lambda: self, sock=sock)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        if self.local_path is not None:
+            try:
+                os.remove(self.local_path)
+            except FileNotFoundError:
+                pass
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.relay.command(self, data)
+
+    def error_received(self, exc):
+        self.errors += 1
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def offer(self, packet):
+        try:
+            self.queue.put_nowait(packet)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def send(self):
+        while True:
+            packet = await self.queue.get()
+            await self.writable.wait()
+            try:
+                if self.kind == 'udp':
+                    self.transport.sendto(packet)
+                else:
+                    self.transport.sendto(packet, self.address)
+            except OSError:
+                self.errors += 1
+                continue
+            self.sent += 1
+
+    def stats(self):
+        return {'sent': self.sent,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'queued': self.queue.qsize()}
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, relay):
+        self.relay = relay
+
+    def connection_made(self, transport):
+        self.relay.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.relay.packet(data)
+
+
+class Relay(object):
+
+    stop_signals = (signal.SIGTERM, signal.SIGINT)
+
+    def __init__(self, listen, server, consumers, queue_size=1024,
+                 on_event=None):
+        self.listen = listen
+        self.server = server
+        self.consumers = [Consumer(self, kind, address, queue_size)
+                          for kind, address in consumers]
+        self.on_event = on_event
+        self.transport = None
+        self.packets = Counter()
+        self.invalid = 0
+        self.commands = 0
+        self.rejected = 0
+
+    def packet(self, data):
+        # the same bytes object is queued to every consumer
+        for consumer in self.consumers:
+            consumer.offer(data)
+        # packets are only decoded for on_event, car updates (most of the
+        # stream) never are
+        if not data or len(data) < plugin.min_lengths.get(data[0], 1):
+            self.invalid += 1
+            return
+        kind = data[0]
+        if self.on_event is None or kind == plugin.CAR_UPDATE:
+            self.packets[kind] += 1
+            return
+        try:
+            event = plugin.decode(data)[1]
+        except plugin.DecodeError:
+            self.invalid += 1
+            return
+        self.packets[kind] += 1
+        self.on_event(kind, event)
+
+    def command(self, consumer, data):
+        if not data or data[0] not in plugin.commands:
+            self.rejected += 1
+            return
+        self.commands += 1
+        self.transport.sendto(data, self.server)
+
+    def stats(self):
+        return {'packets': {plugin.event_names.get(kind, '{}'.format(kind)):
+                            count for kind, count in self.packets.items()},
+                'invalid': self.invalid,
+                'commands': self.commands,
+                'rejected': self.rejected,
+                'consumers': {consumer.name: consumer.stats()
+                              for consumer in self.consumers}}
+
+    def run(self, report=None, interval=None):
+        asyncio.run(self.main(report, interval))
+
+    async def main(self, report, interval):
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        for signum in self.stop_signals:
+            loop.add_signal_handler(signum, stopping.set)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+            sock.bind(self.listen)
+        except OSError:
+            sock.close()
+            raise
+        await loop.create_datagram_endpoint(
+            lambda: ServerProtocol(self), sock=sock)
+        senders = []
+        try:
+            for consumer in self.consumers:
+                await consumer.open()
+                senders.append(asyncio.ensure_future(consumer.send()))
+            while not stopping.is_set():
+                try:
+                    await asyncio.wait_for(stopping.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+                if report is not None:
+                    report(self.stats())
+        finally:
+            for sender in senders:
+                sender.cancel()
+            for consumer in self.consumers:
+                consumer.close()
+            self.transport.close()
@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+
+import json
+import os
+import re
+import sqlite3
+import time
+
+# acServer writes a results JSON per session to results/. Files are
+# ingested once into SQLite, a file is only read again when its inode, size
+# or mtime changes. Laps carry the track and session type of their session
+# so leaderboards are answered from a single index
+schema = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    ended REAL NOT NULL,
+    track TEXT NOT NULL,
+    track_config TEXT NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    guid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    car TEXT NOT NULL,
+    best_lap INTEGER,
+    total_time INTEGER
+);
+CREATE TABLE IF NOT EXISTS laps (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    ended REAL NOT NULL,
+    track TEXT NOT NULL,
+    track_config TEXT NOT NULL,
+    session_type TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    car TEXT NOT NULL,
+    lap_time INTEGER NOT NULL,
+    cuts INTEGER NOT NULL,
+    tyre TEXT NOT NULL,
+    sectors TEXT NOT NULL,
+    timestamp INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_file ON sessions(file_id);
+CREATE INDEX IF NOT EXISTS sessions_track
+    ON sessions(track, track_config, type, ended);
+CREATE INDEX IF NOT EXISTS results_session ON results(session_id);
+CREATE INDEX IF NOT EXISTS results_guid ON results(guid);
+CREATE INDEX IF NOT EXISTS laps_session ON laps(session_id);
+CREATE INDEX IF NOT EXISTS laps_track ON laps(track, track_config, lap_time);
+CREATE INDEX IF NOT EXISTS laps_guid ON laps(guid, track, lap_time);
+CREATE INDEX IF NOT EXISTS laps_car ON laps(car, track, lap_time);
+'''
+
+# PRAGMA user_version of the schema, older databases are migrated by
+# open_db
+schema_version = 1
+migrations = {
+    # the session time is when the results file was written, at the end
+    1: ['ALTER TABLE sessions RENAME COLUMN started TO ended',
+        'ALTER TABLE laps RENAME COLUMN started TO ended']
+}
+# files per transaction
+batch_size = 200
+# acServer's lap time for drivers without a lap
+no_lap = 999999999
+# laps slower than this times the driver's best (in and out laps, spins)
+# are left out of consistency
+consistency_cutoff = 1.07
+result_file = re.compile(
+    r'(\d{4})_(\d{1,2})_(\d{1,2})_(\d{1,2})_(\d{1,2})_[A-Z]+\.json$')
+
+
+def open_db(db_file):
+    os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+    db = sqlite3.connect(db_file)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.execute('PRAGMA foreign_keys=ON')
+    migrate(db)
+    db.executescript(schema)
+    return db
+
+
+def migrate(db):
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    if version >= schema_version:
+        return
+    if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND "
+                  "name = 'sessions'").fetchone() is not None:
+        with db:
+            for step in range(version + 1, schema_version + 1):
+                for statement in migrations[step]:
+                    db.execute(statement)
+    db.execute('PRAGMA user_version = {:d}'.format(schema_version))
+
+
+def session_ended(path, mtime):
+    # results files are named after the local time the session ended
+    match = result_file.search(os.path.basename(path))
+    if match is None:
+        return mtime
+    return time.mktime(tuple(int(part) for part in match.groups()) +
+                       (0, 0, 0, -1))
+
+
+def scan(directories, known):
+    # (path, stat) of results files that are new or changed since ingested
+    for directory in directories:
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            path = os.path.abspath(entry.path)
+            if known.get(path) != (stat.st_ino, stat.st_size,
+                                   stat.st_mtime_ns):
+                yield path, stat
+
+
+def lap_rows(session_id, ended, session, laps):
+    for lap in laps:
+        yield (session_id, ended, session['TrackName'],
+               session['TrackConfig'], session['Type'],
+               lap.get('DriverGuid', ''), lap.get('DriverName', ''),
+               lap.get('CarModel', ''), lap['LapTime'], lap.get('Cuts', 0),
+               lap.get('Tyre', ''), json.dumps(lap.get('Sectors') or []),
+               lap.get('Timestamp'))
+
+
+def result_rows(session_id, results):
+    for position, result in enumerate(results, 1):
+        best_lap = result.get('BestLap')
+        yield (session_id, position, result.get('DriverGuid', ''),
+               result.get('DriverName', ''), result.get('CarModel', ''),
+               None if best_lap in (None, no_lap) else best_lap,
+               result.get('TotalTime') or None)
+
+
+def ingest_file(db, path, stat):
+    # returns the number of laps inserted, None for unreadable files
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as fh:
+            session = json.load(fh)
+        session['TrackName']
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+    session.setdefault('TrackConfig', '')
+    session.setdefault('Type', '')
+    db.execute('DELETE FROM files WHERE path = ?', (path,))
+    file_id = db.execute(
+        'INSERT INTO files (path, inode, size, mtime_ns) VALUES (?, ?, ?, ?)',
+        (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)).lastrowid
+    ended = session_ended(path, stat.st_mtime)
+    session_id = db.execute(
+        'INSERT INTO sessions (file_id, ended, track, track_config, type) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (file_id, ended, session['TrackName'], session['TrackConfig'],
+         session['Type'])).lastrowid
+    db.executemany(
+        'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+        result_rows(session_id, session.get('Result') or []))
+    laps = [lap for lap in session.get('Laps') or [] if lap.get('LapTime')]
+    db.executemany(
+        'INSERT INTO laps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        lap_rows(session_id, ended, session, laps))
+    return len(laps)
+
+
+def ingest_results(db, directories):
+    # Ingest new and changed results files, returns (files ingested, laps
+    # inserted, unreadable files)
+    known = {path: (inode, size, mtime_ns)
+             for path, inode, size, mtime_ns in db.execute(
+                 'SELECT path, inode, size, mtime_ns FROM files')}
+    files = laps = skipped = pending = 0
+    for path, stat in scan(directories, known):
+        inserted = ingest_file(db, path, stat)
+        if inserted is None:
+            skipped += 1
+            continue
+        files += 1
+        laps += inserted
+        pending += 1
+        if pending >= batch_size:
+            db.commit()
+            pending = 0
+    db.commit()
+    return files, laps, skipped
+
+
+## Queries
+
+def filters(track, track_config=None, car=None, guid=None, session_type=None,
+            since=None, prefix=''):
+    # WHERE clause over laps (aliased by prefix) and its parameters
+    clauses = ['{}track = ?'.format(prefix), '{}cuts = 0'.format(prefix)]
+    params = [track]
+    for column, value in (('track_config', track_config), ('car', car),
+                          ('guid', guid), ('session_type', session_type)):
+        if value is not None:
+            clauses.append('{}{} = ?'.format(prefix, column))
+            params.append(value)
+    if since is not None:
+        clauses.append('{}ended >= ?'.format(prefix))
+        params.append(since)
+    return ' AND '.join(clauses), params
+
+
+def rows(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def leaderboard(db, limit=20, **kwargs):
+    # best valid lap of every driver, the name and car are the ones of that
+    # lap (SQLite takes bare columns from the MIN() row)
+    where, params = filters(**kwargs)
+    return rows(db.execute(
+        'SELECT guid, name, car, MIN(lap_time) AS best_lap, '
+        'COUNT(*) AS laps FROM laps WHERE {} GROUP BY guid '
+        'ORDER BY best_lap LIMIT ?'.format(where), params + [limit]))
+
+
+def best_laps(db, limit=20, **kwargs):
+    where, params = filters(**kwargs)
+    return rows(db.execute(
+        'SELECT guid, name, car, lap_time, tyre, sectors, ended '
+        'FROM laps WHERE {} ORDER BY lap_time LIMIT ?'.format(where),
+        params + [limit]))
+
+
+def consistency(db, limit=20, min_laps=5, **kwargs):
+    # standard deviation of every driver's valid laps within
+    # consistency_cutoff of their best lap
+    where, params = filters(**kwargs)
+    lap_where, lap_params = filters(prefix='l.', **kwargs)
+    found = rows(db.execute(
+        'WITH best AS (SELECT guid, MIN(lap_time) AS best_lap FROM laps '
+        'WHERE {} GROUP BY guid) '
+        'SELECT l.guid, MAX(l.name) AS name, MAX(l.car) AS car, '
+        'best.best_lap, COUNT(*) AS laps, AVG(l.lap_time) AS average, '
+        'AVG(l.lap_time * l.lap_time) - AVG(l.lap_time) * AVG(l.lap_time) '
+        'AS variance FROM laps l JOIN best ON best.guid = l.guid '
+        'WHERE {} AND l.lap_time <= best.best_lap * ? '
+        'GROUP BY l.guid HAVING COUNT(*) >= ?'.format(where, lap_where),
+        params + lap_params + [consistency_cutoff, min_laps]))
+    for row in found:
+        row['stddev'] = max(row.pop('variance'), 0) ** 0.5
+    return sorted(found, key=lambda row: row['stddev'])[:limit]
+
+
+def format_lap(milliseconds):
+    if milliseconds is None:
+        return '-'
+    minutes, milliseconds = divmod(int(round(milliseconds)), 60 * 1000)
+    return '{}:{:02d}.{:03d}'.format(minutes, *divmod(milliseconds, 1000))
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+
+import json
+import os
+import shutil
+import socket
+import time
+
+from collections import OrderedDict
+
+from acdsc.daemon import ACDaemon, daemon_status
+from acdsc.parser import make_ac_parser, write_ac_parser
+from acdsc.plan import PlanError, apply_plan, load_plan, validate_plan
+from acdsc.update import restart_server
+from acdsc.validation import format_problem, validate_configs
+
+# Event rotation. A schedule file lists events, each a plan (see plan.py)
+# applied on top of the previous event:
+#
+#   events:
+#     - {name: gt3, plan: gt3-monza.json, at: '2026-10-20 20:00'}
+#     - {name: mx5, plan: {server: {TRACK: vallelunga}}, after: race}
+#
+# Every event is rendered to a server_cfg.ini/entry_list.ini pair and
+# validated before the schedule starts. At the switch point (the time in at,
+# the end of the next RACE session with after: race, or right away) the
+# pair is swapped in and the server restarted
+time_formats = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S',
+                '%Y-%m-%dT%H:%M')
+switch_points = ('race',)
+
+
+def parse_time(value):
+    # seconds since the epoch of a local time
+    for time_format in time_formats:
+        try:
+            return time.mktime(time.strptime('{}'.format(value),
+                                             time_format))
+        except ValueError:
+            continue
+    raise ValueError('{} is not a time (e.g. 2026-10-20 20:00)'.format(value))
+
+
+def load_schedule(schedule_file):
+    # events of a schedule file, raises PlanError listing every problem
+    schedule = load_plan(schedule_file)
+    if isinstance(schedule, dict):
+        schedule = schedule.get('events')
+    if not isinstance(schedule, list) or not schedule:
+        raise PlanError(['{}: expected a list of events'.format(
+            schedule_file)])
+    directory = os.path.dirname(os.path.abspath(schedule_file))
+    errors = []
+    events = []
+    for number, event in enumerate(schedule):
+        where = 'events.{}'.format(number)
+        if not isinstance(event, dict) or 'plan' not in event:
+            errors.append('{}: expected a mapping with a plan'.format(where))
+            continue
+        for key in set(event) - set(['name', 'plan', 'at', 'after']):
+            errors.append('{}: unknown key {}'.format(where, key))
+        plan = event['plan']
+        name = event.get('name')
+        if isinstance(plan, str):
+            name = name or os.path.splitext(os.path.basename(plan))[0]
+            plan = os.path.join(directory, plan)
+        at = None
+        if event.get('at') is not None:
+            try:
+                at = parse_time(event['at'])
+            except ValueError as err:
+                errors.append('{}.at: {}'.format(where, err))
+        after = event.get('after')
+        if after is not None and after not in switch_points:
+            errors.append('{}.after: expected one of {}'.format(
+                where, ', '.join(switch_points)))
+        if at is not None and after is not None:
+            errors.append('{}: at and after are exclusive'.format(where))
+        events.append(OrderedDict([('name', name or 'event{}'.format(number)),
+                                   ('plan', plan),
+                                   ('at', at),
+                                   ('after', after)]))
+    if errors:
+        raise PlanError(errors)
+    return events
+
+
+def render_events(events, config, name, host, directory):
+    # Render every event to directory/NN-NAME/ and validate it, returns
+    # the events with their config-file and entry-list. Raises PlanError
+    # listing the problems of the first invalid event, the events after it
+    # would be rendered on top of it
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    errors = []
+    base = dict(config, **{
+        'parser': make_ac_parser(config['config-file']),
+        'entry-parser': make_ac_parser(config['entry-list'])
+    })
+    for number, event in enumerate(events):
+        where = '{:02d}-{}'.format(number, event['name'])
+        target = os.path.join(directory, where)
+        os.makedirs(target)
+        try:
+            plan = event['plan']
+            if not isinstance(plan, dict):
+                plan = load_plan(plan)
+            checked = validate_plan(plan, base)
+        except (PlanError, IOError) as err:
+            errors.extend('{}: {}'.format(where, error) for error in
+                          getattr(err, 'errors', ['{}'.format(err)]))
+            break
+        apply_plan(checked, base)
+        rendered = dict(config, **{
+            'config-file': os.path.join(target, 'server_cfg.ini'),
+            'entry-list': os.path.join(target, 'entry_list.ini')
+        })
+        write_ac_parser(base['parser'], rendered['config-file'])
+        write_ac_parser(base['entry-parser'], rendered['entry-list'])
+        errors.extend('{}: {}'.format(where, format_problem(found))
+                      for found in validate_configs([(name, rendered)], host)
+                      if found['level'] == 'error')
+        if errors:
+            break
+        event['config-file'] = rendered['config-file']
+        event['entry-list'] = rendered['entry-list']
+        # the next event starts from this one
+        base = dict(rendered, **{
+            'parser': make_ac_parser(rendered['config-file']),
+            'entry-parser': make_ac_parser(rendered['entry-list'])
+        })
+    if errors:
+        raise PlanError(errors)
+    return events
+
+
+def pending_events(events, now):
+    # events still to come, of those whose time has already passed only the
+    # last one is switched to
+    pending = list(events)
+    while (len(pending) > 1 and pending[1]['at'] is not None and
+           pending[1]['at'] <= now):
+        pending.pop(0)
+    return pending
+
+
+def race_finished(results_dir, since):
+    # whether acServer wrote a RACE results file after since
+    try:
+        entries = list(os.scandir(results_dir))
+    except FileNotFoundError:
+        return False
+    return any(entry.name.endswith('_RACE.json') and
+               entry.stat().st_mtime > since for entry in entries)
+
+
+def switch_due(event, since, results_dir):
+    if event['at'] is not None:
+        return time.time() >= event['at']
+    if event['after'] == 'race':
+        return race_finished(results_dir, since)
+    return True
+
+
+def swap_in(event, config):
+    # replace the configuration with the rendered pair, each file is
+    # replaced atomically (and durably, see write_ac_parser)
+    for key in ('entry-list', 'config-file'):
+        write_ac_parser(make_ac_parser(event[key]), config[key])
+
+
+def wait_listening(port, timeout):
+    # seconds until port accepts TCP connections, None on timeout
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return time.monotonic() - started
+        except OSError:
+            time.sleep(0.05)
+    return None
+
+
+def switch(event, config, grace, ready_timeout):
+    # Swap the rendered pair in and restart a running server, returns the
+    # record of the switch: seconds the restart took and until acServer
+    # accepted connections again (time-to-ready, None when it did not)
+    started = time.monotonic()
+    running = daemon_status(ACDaemon(config), None) == 'running'
+    swap_in(event, config)
+    record = OrderedDict([('event', event['name']),
+                          ('time', time.time()),
+                          ('restarted', running),
+                          ('restart', None),
+                          ('ready', None)])
+    if not running:
+        return record
+    record['restart'], spawned = restart_server(config, grace)
+    port = make_ac_parser(config['config-file']).getint(
+        'SERVER', 'TCP_PORT', fallback=0)
+    if spawned and port and wait_listening(port, ready_timeout) is not None:
+        record['ready'] = time.monotonic() - started
+    return record
+
+
+def record_switch(history_file, record):
+    os.makedirs(os.path.dirname(history_file), exist_ok=True)
+    with open(history_file, 'a') as fh:
+        fh.write('{}\n'.format(json.dumps(record)))
@@ -5,8 +5,7 @@ from collections import OrderedDict
 import click
 
 from acdsc.validators import (
-    is_car_list, is_track, is_track_subversion, max_clients, is_car,
-    is_car_skin, is_tyre_list)
+    is_car_list, is_track, max_clients, is_car, is_guid_list)
 
 
 # NOTE: Assetto Corsa Dedicated Server requires non-anonymous user
@@ -16,6 +15,43 @@ steam_settings = {
     'appid': 302550
 }
 
+# acServer output is captured to logs/acServer.log which is rotated when it
+# grows over max_bytes or gets older than interval seconds
+log_settings = {
+    'max_bytes': 64 * 1024 * 1024,
+    'interval': 24 * 60 * 60,
+    'keep': 10,
+    'compress': True
+}
+
+# acServer is sampled every interval seconds while running, the samples
+# are kept in a ring buffer of capacity records (24 hours by default)
+metrics_settings = {
+    'interval': 5,
+    'capacity': 24 * 60 * 60 // 5
+}
+
+# acdsc plugin-relay fills in UDP_PLUGIN_LOCAL_PORT and UDP_PLUGIN_ADDRESS
+# with the first free ports from local_port and relay_port, every consumer
+# of the relay can have queue packets waiting before packets are dropped
+plugin_settings = {
+    'local_port': 11000,
+    'relay_port': 12000,
+    'queue': 1024
+}
+
+# NOTE: optional sha256 checksums of the steam and steamcmd installer
+# tarballs, downloads not matching a configured checksum are rejected
+download_checksums = {
+    'steam': None,
+    'steamcmd': None
+}
+
+# acServer reads its configuration when it starts, so acdsc watch restarts
+# a running server when a setting changes. Settings marked 'restart': False
+# (names shown for entries and sessions) do not change how the server runs
+# and are not worth kicking drivers for, their changes are reported as
+# pending until the server is restarted for another reason
 server_settings = OrderedDict([
     ('NAME', {
         'default': 'acdsc default',
@@ -37,7 +73,7 @@ server_settings = OrderedDict([
         'default': 'extended_circuit',
         'description': 'subversion of the track (as in content/tracks/TRACK/ '
                        '-directory)',
-        'validator': is_track_subversion
+        'validator': click.STRING
     }),
     ('SUN_ANGLE', {
         'default': '-8',
@@ -222,7 +258,7 @@ server_settings = OrderedDict([
         'default': 'V;E;HR;ST',
         'description': 'list of the tyre\'s shortnames that will be allowed '
                        'in the server.',
-        'validator': is_tyre_list
+        'validator': click.STRING
     }),
     ('MAX_BALLAST_KG', {
         'default': '50',
@@ -306,7 +342,8 @@ session_settings = OrderedDict([
             'default': 'Booking',
             'description': 'booking session - add this section only if your '
                            'server is in booking mode',
-            'validator': click.STRING
+            'validator': click.STRING,
+            'restart': False
             }),
          ('TIME', {
             'default': '5',
@@ -318,7 +355,8 @@ session_settings = OrderedDict([
          ('NAME', {
             'default': 'Free Practice',
             'description': 'practice session',
-            'validator': click.STRING
+            'validator': click.STRING,
+            'restart': False
             }),
          ('TIME', {
             'default': '0',
@@ -335,7 +373,8 @@ session_settings = OrderedDict([
          ('NAME', {
             'default': 'Qualify',
             'description': 'qualify session',
-            'validator': click.STRING
+            'validator': click.STRING,
+            'restart': False
             }),
          ('TIME', {
             'default': '5',
@@ -352,7 +391,8 @@ session_settings = OrderedDict([
          ('NAME', {
             'default': 'Race',
             'description': 'race session',
-            'validator': click.STRING
+            'validator': click.STRING,
+            'restart': False
             }),
          ('TIME', {
             'default': '0',
@@ -429,12 +469,13 @@ entry_list_settings = OrderedDict([
     ('DRIVERNAME', {
         'default': '',
         'description': 'Driver name',
-        'validator': click.STRING
+        'validator': click.STRING,
+        'restart': False
     }),
     ('GUID', {
         'default': '',
         'description': 'Steam GUID',
-        'validator': click.STRING  # TODO: GUID validator (no duplicates)
+        'validator': is_guid_list
     }),
     ('MODEL', {
         'default': 'bmw_m3_e30',
@@ -444,7 +485,8 @@ entry_list_settings = OrderedDict([
     ('TEAM', {
         'default': '',
         'description': 'Team name',
-        'validator': click.STRING
+        'validator': click.STRING,
+        'restart': False
     }),
     ('BALLAST', {
         'default': 0,
@@ -454,7 +496,7 @@ entry_list_settings = OrderedDict([
     ('SKIN', {
         'default': '',
         'description': 'Car skin',
-        'validator': is_car_skin
+        'validator': click.STRING
     }),
     ('SPECTATOR_MODE', {
         'default': 0,
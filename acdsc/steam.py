@@ -1,14 +1,15 @@
 #!/usr/bin/python3
 
 import os
+import shutil
 import subprocess as sub
-import tarfile
 import tempfile
 
-from urllib.request import urlopen
-
 import click
 
+from acdsc.download import fetch_and_extract
+from acdsc.settings import download_checksums
+
 
 url = 'http://repo.steampowered.com/steam/archive/precise/steam_latest.tar.gz'
 
@@ -21,30 +22,20 @@ def has_acds(steam_path, server_path):
 
 
 def has_steam():
-    cp = sub.run(
-        'command -v steam', stdout=sub.PIPE, stderr=sub.PIPE, shell=True)
-    return cp.returncode == os.EX_OK
+    return shutil.which('steam') is not None
 
 
 # TODO: Steam requires make, gpg, ca-certificates and 32bit libgcc1
 # Steam
-def install_steam():
+def install_steam(cache_dir):
     click.secho('ERROR: steam not found!', fg='red')
     click.confirm(
         'Do you wish to attempt installation from {}?'.format(url),
         abort=True)
-    click.echo('..downloading {}'.format(url))
-    response = urlopen(url)
     temp_dir = tempfile.TemporaryDirectory()
     steam_dir = os.path.join(temp_dir.name, 'steam')
-    temp_file = tempfile.NamedTemporaryFile(delete=False)
-    with temp_file as fh:
-        fh.write(response.read())
-    click.echo('..extracting to {}'.format(steam_dir))
-    tar = tarfile.open(temp_file.name)
-    tar.extractall(temp_dir.name)
-    tar.close()
-    os.unlink(temp_file.name)
+    fetch_and_extract(
+        url, temp_dir.name, cache_dir, download_checksums['steam'])
     click.echo('..running sudo make install')
     sub.call('sudo make install', cwd=steam_dir, shell=True)
     temp_dir.cleanup()
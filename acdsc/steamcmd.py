@@ -3,14 +3,11 @@
 import os
 import shutil
 import subprocess as sub
-import tarfile
-import tempfile
-
-from urllib.request import urlopen
 
 import click
 
-from acdsc.settings import steam_settings
+from acdsc.download import fetch_and_extract
+from acdsc.settings import download_checksums, steam_settings
 
 url = 'https://steamcdn-a.akamaihd.net/client/installer/steamcmd_linux.tar.gz'
 
@@ -20,7 +17,7 @@ def has_steamcmd(path):
     return os.path.exists(path) and os.path.exists(steamcmd)
 
 
-def install_steamcmd(path):
+def install_steamcmd(path, cache_dir):
     click.secho(
         'ERROR: steamcmd not found from {}!'.format(path),
         fg='red')
@@ -30,16 +27,12 @@ def install_steamcmd(path):
     if os.path.exists(path):
         shutil.rmtree(path)
     os.makedirs(path)
-    click.echo('..downloading {}'.format(url))
-    response = urlopen(url)
-    temp_file = tempfile.NamedTemporaryFile(delete=False)
-    with temp_file as fh:
-        fh.write(response.read())
-    click.echo('..extracting to {}'.format(path))
-    tar = tarfile.open(temp_file.name)
-    tar.extractall(path)
-    tar.close()
-    os.unlink(temp_file.name)
+    try:
+        fetch_and_extract(
+            url, path, cache_dir, download_checksums['steamcmd'])
+    except Exception:
+        shutil.rmtree(path)
+        raise
     click.secho('SteamCMD succesfully installed!', fg='green')
 
 
@@ -60,3 +53,17 @@ def update_acds(steamcmd):
                            password=steam_settings['password'],
                            appid=steam_settings['appid'])
     sub.call(cmd, shell=True)
+
+
+def stage_acds(steamcmd, install_dir):
+    # Install or update the server into install_dir (a staging install next
+    # to the live one), returns the exit code of steamcmd
+    click.secho('Staging Assetto Corsa Dedicated Server update in {}'.format(
+                install_dir), fg='green')
+    return sub.call([steamcmd,
+                     '+@sSteamCmdForcePlatformType', 'windows',
+                     '+force_install_dir', install_dir,
+                     '+login', steam_settings['username'],
+                     steam_settings['password'],
+                     '+app_update', str(steam_settings['appid']), 'validate',
+                     '+quit'])
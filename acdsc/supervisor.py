@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import os
+import signal
+import subprocess as sub
+import time
+
+from collections import deque
+
+from acdsc.metrics import ProcessSampler
+
+# restart delays double from backoff up to max_backoff, a child that stays
+# up for stable_after seconds is considered healthy again. crash_loop exits
+# within crash_window seconds stop the restarts altogether
+backoff = 1
+max_backoff = 60
+stable_after = 60
+crash_loop = 5
+crash_window = 300
+
+
+def write_state(state_file, state):
+    temp_file = '{}.{}.tmp'.format(state_file, os.getpid())
+    with open(temp_file, 'w') as fh:
+        json.dump(state, fh)
+    os.replace(temp_file, state_file)
+
+
+class Child(object):
+
+    def __init__(self, name, args, cwd, state_file, log=None, metrics=None):
+        self.name = name
+        self.args = args
+        self.cwd = cwd
+        self.state_file = state_file
+        self.log = log
+        self.metrics = metrics
+        self.process = None
+        self.state = 'starting'
+        self.started = None
+        self.restarts = 0
+        self.last_exit = None
+        self.last_exit_time = None
+        self.crashes = deque()
+
+    def save(self):
+        write_state(self.state_file, {
+            'name': self.name,
+            'state': self.state,
+            'supervisor': os.getpid(),
+            'pid': self.process.pid if self.process else None,
+            'started': self.started,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'last_exit_time': self.last_exit_time
+        })
+
+    def exited(self, code):
+        now = time.time()
+        self.last_exit = code
+        self.last_exit_time = now
+        self.process = None
+        if now - self.started >= stable_after:
+            self.crashes.clear()
+        self.crashes.append(now)
+        while self.crashes and now - self.crashes[0] > crash_window:
+            self.crashes.popleft()
+        return len(self.crashes) >= crash_loop
+
+    def delay(self):
+        return min(backoff * 2 ** (len(self.crashes) - 1), max_backoff)
+
+
+class Supervisor(object):
+    # Owns one or more child processes, restarting them with exponential
+    # backoff and recording their state to a JSON state file per child.
+    # Children with a metrics ring buffer are sampled every sample_interval
+    # seconds while running
+
+    stop_signals = (signal.SIGTERM, signal.SIGINT)
+    forward_signals = (signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2)
+
+    def __init__(self, children, sample_interval=5):
+        self.children = children
+        self.sample_interval = sample_interval
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for signum in self.stop_signals:
+            loop.add_signal_handler(signum, self.stop)
+        for signum in self.forward_signals:
+            loop.add_signal_handler(signum, self.forward, signum)
+        await asyncio.gather(
+            *(self.supervise(child) for child in self.children))
+
+    async def spawn(self, child):
+        if child.log is None:
+            return await asyncio.create_subprocess_exec(
+                *child.args, cwd=child.cwd, stdin=sub.DEVNULL)
+        return await asyncio.create_subprocess_exec(
+            *child.args, cwd=child.cwd, stdin=sub.DEVNULL, stdout=sub.PIPE,
+            stderr=sub.STDOUT)
+
+    async def capture(self, child, stream):
+        while True:
+            data = await stream.read(64 * 1024)
+            if not data:
+                break
+            child.log.write(data)
+
+    async def sample(self, child):
+        sampler = ProcessSampler()
+        while True:
+            process = child.process
+            if process is not None and process.returncode is None:
+                sample = sampler.sample(process.pid)
+                if sample is not None:
+                    child.metrics.append(sample)
+            await asyncio.sleep(self.sample_interval)
+
+    async def supervise(self, child):
+        sampler = None
+        if child.metrics is not None:
+            sampler = asyncio.ensure_future(self.sample(child))
+        try:
+            await self.keep_running(child)
+        finally:
+            if sampler is not None:
+                sampler.cancel()
+
+    async def keep_running(self, child):
+        child.save()
+        while not self.stopping.is_set():
+            try:
+                child.process = await self.spawn(child)
+            except OSError:
+                # exit code of a shell failing to execute a command
+                child.started = time.time()
+                code = 127
+            else:
+                child.state = 'running'
+                child.started = time.time()
+                child.save()
+                if child.log is None:
+                    code = await child.process.wait()
+                else:
+                    _, code = await asyncio.gather(
+                        self.capture(child, child.process.stdout),
+                        child.process.wait())
+            crash_looping = child.exited(code)
+            if self.stopping.is_set():
+                break
+            child.restarts += 1
+            if crash_looping:
+                child.state = 'crash-loop'
+                child.save()
+                return
+            child.state = 'backoff'
+            child.save()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), child.delay())
+            except asyncio.TimeoutError:
+                pass
+        child.state = 'stopped'
+        child.save()
+
+    def signal_children(self, signum):
+        for child in self.children:
+            if child.process is not None and child.process.returncode is None:
+                try:
+                    child.process.send_signal(signum)
+                except ProcessLookupError:
+                    pass
+
+    def forward(self, signum):
+        self.signal_children(signum)
+
+    def stop(self):
+        self.stopping.set()
+        self.signal_children(signal.SIGTERM)
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+
+import os
+import re
+import shutil
+import time
+
+import psutil
+
+from acdsc.daemon import ACDaemon
+from acdsc.lobby import LobbyQuery, lobby_port
+from acdsc.settings import steam_settings
+
+# Staged updates. The server path becomes a symlink to one of two slots
+# next to it, updates are downloaded into the other slot while the servers
+# keep running from the live one. Once verified, the configuration and
+# results are carried over and the symlink is swapped atomically, running
+# servers switch over when they are restarted
+slots = ('a', 'b')
+# directories of the live install that belong to the host, not to Steam
+carried_over = ('cfg', 'results')
+# seconds between lobby polls while waiting for servers to empty
+empty_poll = 15
+
+
+class UpdateError(Exception):
+    pass
+
+
+def live_path(server_path):
+    return os.path.normpath(os.path.abspath(server_path))
+
+
+def slot_path(live, slot):
+    return '{}.{}'.format(live, slot)
+
+
+def staging_path(live):
+    # the slot the live install does not point at
+    if not os.path.islink(live):
+        if os.path.lexists(slot_path(live, slots[0])):
+            raise UpdateError('{} is not a symlink but {} exists'.format(
+                live, slot_path(live, slots[0])))
+        return slot_path(live, slots[1])
+    active = os.path.realpath(live)
+    for slot in slots:
+        path = slot_path(live, slot)
+        if os.path.realpath(path) != active:
+            return path
+    raise UpdateError('{} points at an unknown slot {}'.format(live, active))
+
+
+def slot_processes(path):
+    # processes (acServer) running from within path
+    path = os.path.realpath(path)
+    found = []
+    for process in psutil.process_iter(['cwd']):
+        cwd = process.info['cwd']
+        if cwd and (cwd == path or cwd.startswith(path + os.sep)):
+            found.append(process)
+    return found
+
+
+def seed(live, staging):
+    # start from a copy of the live install so steamcmd only downloads what
+    # changed, later updates reuse the previous install in the slot
+    if not os.path.exists(staging) and os.path.isdir(live):
+        shutil.copytree(live, staging, symlinks=True)
+    os.makedirs(staging, exist_ok=True)
+
+
+def verify_install(path):
+    # problems of an installed server, empty when it looks complete
+    problems = []
+    server = os.path.join(path, 'acServer')
+    if not os.access(server, os.X_OK):
+        problems.append('{} is missing or not executable'.format(server))
+    for directory in ('content/cars', 'content/tracks'):
+        if not os.path.isdir(os.path.join(path, directory)):
+            problems.append('{} is missing'.format(
+                os.path.join(path, directory)))
+    manifest = os.path.join(path, 'steamapps', 'appmanifest_{}.acf'.format(
+        steam_settings['appid']))
+    try:
+        with open(manifest, 'r') as fh:
+            flags = re.search(r'"StateFlags"\s+"(\d+)"', fh.read())
+    except IOError:
+        problems.append('{} is missing'.format(manifest))
+    else:
+        # 4 is fully installed, anything else is a partial download
+        if flags is None or flags.group(1) != '4':
+            problems.append('{} is not fully installed'.format(path))
+    return problems
+
+
+def carry_over(source, staging, directories=carried_over):
+    # copy the host's files from the install in source, cfg is replaced and
+    # results are only ever added
+    for directory in directories:
+        path = os.path.join(source, directory)
+        if not os.path.isdir(path):
+            continue
+        if directory == 'cfg':
+            shutil.copytree(path, os.path.join(staging, directory),
+                            dirs_exist_ok=True)
+            continue
+        for root, _, files in os.walk(path):
+            target = os.path.join(staging, os.path.relpath(root, source))
+            os.makedirs(target, exist_ok=True)
+            for name in files:
+                if not os.path.exists(os.path.join(target, name)):
+                    shutil.copy2(os.path.join(root, name), target)
+
+
+def swap(live, staging):
+    # Point live at staging, returns the seconds it took. A live directory
+    # (the first staged update) is moved into the other slot first, running
+    # servers keep their working directory through the rename
+    started = time.monotonic()
+    if not os.path.islink(live) and os.path.isdir(live):
+        os.rename(live, slot_path(live, slots[0]))
+    temp_link = '{}.{}.tmp'.format(live, os.getpid())
+    os.symlink(os.path.basename(staging), temp_link)
+    os.replace(temp_link, live)
+    return time.monotonic() - started
+
+
+def restart_server(config, grace, stopped=None):
+    # (seconds, whether the server came back), stopped is called while the
+    # server is down
+    started = time.monotonic()
+    daemon = ACDaemon(config)
+    daemon.stop(grace)
+    if stopped is not None:
+        stopped()
+    spawned = daemon.spawn()
+    return time.monotonic() - started, spawned
+
+
+def restart_when_empty(targets, max_wait, grace, stopped=None):
+    # Restart the (name, config) targets once their lobby reports no
+    # clients, or after max_wait seconds regardless. Yields (name, seconds
+    # waited, seconds the restart took, whether it came back) as servers
+    # are restarted, stopped is called with the name of every server while
+    # it is down
+    started = time.monotonic()
+    pending = list(targets)
+    lobbies = LobbyQuery()
+    try:
+        while pending:
+            waited = time.monotonic() - started
+            if waited >= max_wait:
+                empty = list(pending)
+            else:
+                results = lobbies.query(
+                    [lobby_port(config) for _, config in pending])
+                empty = [target for target, result in zip(pending, results)
+                         if result['error'] is None and
+                         not result['info'].get('clients')]
+            for target in empty:
+                pending.remove(target)
+                elapsed, spawned = restart_server(
+                    target[1], grace,
+                    stopped and (lambda: stopped(target[0])))
+                yield target[0], waited, elapsed, spawned
+            if pending:
+                time.sleep(min(empty_poll, max(max_wait - waited, 0)))
+    finally:
+        lobbies.close()
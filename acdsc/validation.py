@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+
+import os
+
+from collections import OrderedDict, defaultdict
+
+import click
+
+from acdsc.fleet import config_port_keys
+from acdsc.parser import make_ac_parser, split_section
+from acdsc.settings import (
+    entry_list_settings, server_settings, session_settings, weather_settings)
+from acdsc.validators import (
+    content_checks, open_content_index, related_problems)
+
+# Whole configuration validation. The settings are compiled to click types
+# once, every configuration on the host is then read and checked in a
+# single pass: values against their settings, rules spanning several
+# settings and ports colliding between configurations. Cars and tracks are
+# checked against the content of the server each configuration runs from
+
+
+def compile_setting(value):
+    # (type, whether the setting may be left empty, check of the content)
+    check = content_checks.get(value['validator'])
+    if check is not None:
+        return click.STRING, value['default'] == '', check
+    return (click.types.convert_type(value['validator']),
+            value['default'] == '', None)
+
+
+def compile_settings(settings):
+    return OrderedDict((key, compile_setting(value))
+                       for key, value in settings.items())
+
+
+# section -> types of the server configuration, sessions are named sections
+# and weathers numbered ones
+config_schema = OrderedDict([('SERVER', compile_settings(server_settings))])
+config_schema.update((session, compile_settings(settings))
+                     for session, settings in session_settings.items())
+config_prefixes = {'WEATHER': compile_settings(weather_settings)}
+entry_prefixes = {'CAR': compile_settings(entry_list_settings)}
+
+
+def problem(level, name, path, section, key, message):
+    return OrderedDict([('level', level),
+                        ('instance', name),
+                        ('file', path),
+                        ('section', section),
+                        ('key', key),
+                        ('message', message)])
+
+
+def section_types(section, schema, prefixes):
+    types = schema.get(section)
+    if types is None:
+        split = split_section(section)
+        if split is not None:
+            types = prefixes.get(split[0])
+    return types
+
+
+def check_values(name, path, parser, schema, prefixes, index, problems):
+    # every value on its own, then the values depending on other values of
+    # the section (SKIN of MODEL, CONFIG_TRACK of TRACK). Content is not
+    # checked when index is None
+    for section in parser.sections():
+        types = section_types(section, schema, prefixes)
+        if types is None:
+            continue
+        values = OrderedDict(parser.items(section))
+        for key, value in values.items():
+            if key not in types:
+                problems.append(problem('warning', name, path, section, key,
+                                        'unknown setting'))
+                continue
+            kind, optional, check = types[key]
+            if optional and not value:
+                continue
+            try:
+                kind.convert(value, None, None)
+            except click.BadParameter as err:
+                problems.append(problem('error', name, path, section, key,
+                                        err.message))
+                continue
+            message = None
+            if check is not None and index is not None:
+                message = check(index, value)
+            if message is not None:
+                problems.append(problem('error', name, path, section, key,
+                                        message))
+        if index is None:
+            continue
+        for key, message in related_problems(index, values):
+            problems.append(problem('error', name, path, section, key,
+                                    message))
+
+
+def check_server(name, path, parser, problems):
+    server_name = parser.get('SERVER', 'NAME', fallback='')
+    if server_name[:1].isdigit():
+        problems.append(problem('error', name, path, 'SERVER', 'NAME',
+                                'cannot start with a number'))
+    ports = defaultdict(list)
+    for key, protocol, port in config_port_keys(parser):
+        ports[(protocol, port)].append(key)
+    for (protocol, port), keys in sorted(ports.items()):
+        if len(keys) > 1:
+            problems.append(problem(
+                'error', name, path, 'SERVER', keys[-1],
+                '{} {} is also used by {}'.format(
+                    protocol, port, ', '.join(keys[:-1]))))
+
+
+def check_entries(name, path, parser, entry_parser, problems):
+    entries = entry_parser.prefix_sections('CAR')
+    try:
+        max_clients = int(parser.get('SERVER', 'MAX_CLIENTS'))
+    except Exception:
+        max_clients = None
+    if max_clients is not None and len(entries) > max_clients:
+        problems.append(problem(
+            'error', name, path, None, None,
+            '{} entries but MAX_CLIENTS is {}'.format(
+                len(entries), max_clients)))
+    cars = set(parser.get('SERVER', 'CARS', fallback='').split(';'))
+    seen = {}
+    for section in entries:
+        model = entry_parser.get(section, 'MODEL', fallback=None)
+        if model is not None and model not in cars:
+            problems.append(problem('error', name, path, section, 'MODEL',
+                                    '{} is not in CARS'.format(model)))
+        for guid in entry_parser.get(section, 'GUID', fallback='').split(';'):
+            guid = guid.strip()
+            if not guid:
+                continue
+            if guid in seen and seen[guid] != section:
+                problems.append(problem(
+                    'error', name, path, section, 'GUID',
+                    '{} is also in {}'.format(guid, seen[guid])))
+            seen.setdefault(guid, section)
+
+
+def check_config(name, config, index, problems):
+    # -> server configuration parser, None when it does not exist
+    path = config['config-file']
+    if not os.path.exists(path):
+        problems.append(problem('error', name, path, None, None,
+                                'does not exist'))
+        return None
+    parser = make_ac_parser(path)
+    entry_parser = make_ac_parser(config['entry-list'])
+    if not parser.has_section('SERVER'):
+        problems.append(problem('error', name, path, 'SERVER', None,
+                                'missing'))
+        return parser
+    check_values(name, path, parser, config_schema, config_prefixes, index,
+                 problems)
+    check_values(name, config['entry-list'], entry_parser, {},
+                 entry_prefixes, index, problems)
+    check_server(name, path, parser, problems)
+    check_entries(name, config['entry-list'], parser, entry_parser,
+                  problems)
+    return parser
+
+
+def check_port_collisions(parsers, checked, problems):
+    # ports of the checked configurations used by any other configuration
+    users = defaultdict(list)
+    for name, (path, parser) in parsers.items():
+        for key, protocol, port in config_port_keys(parser):
+            users[(protocol, port)].append((name, path, key))
+    collisions = OrderedDict()
+    for (protocol, port), found in sorted(users.items(),
+                                          key=lambda item: item[0][1]):
+        names = set(name for name, _, _ in found)
+        if len(names) < 2:
+            continue
+        for name, path, key in found:
+            if name in checked:
+                others = ', '.join(sorted(names - set([name])))
+                collisions.setdefault(
+                    (name, path, key, port, others), []).append(protocol)
+    for (name, path, key, port, others), protocols in collisions.items():
+        problems.append(problem(
+            'error', name, path, 'SERVER', key,
+            '{} {} is also used by {}'.format(
+                '/'.join(protocols), port, others)))
+
+
+def validate_configs(targets, host=()):
+    # Problems of the (name, config) targets, ports are also checked
+    # against the other configurations on the host
+    problems = []
+    parsers = OrderedDict()
+    # server path -> content index, instances often share a server
+    indexes = {}
+    for name, config in targets:
+        server_path = os.path.abspath(config['server-path'])
+        if server_path not in indexes:
+            indexes[server_path] = open_content_index(config)
+        parser = check_config(name, config, indexes[server_path], problems)
+        if parser is not None:
+            parsers[name] = (config['config-file'], parser)
+    for index in indexes.values():
+        if index is not None:
+            index.save()
+    for name, config in host:
+        if name not in parsers and os.path.exists(config['config-file']):
+            parsers[name] = (config['config-file'],
+                             make_ac_parser(config['config-file']))
+    check_port_collisions(parsers, set(name for name, _ in targets),
+                          problems)
+    return problems
+
+
+def format_problem(found):
+    where = '.'.join(part for part in (found['section'], found['key'])
+                     if part)
+    return '{}: {}: {}{}: {}'.format(
+        found['level'], found['instance'], found['file'],
+        ' [{}]'.format(where) if where else '', found['message'])
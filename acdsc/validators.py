@@ -1,41 +1,179 @@
 #!/usr/bin/python3
 
 import os
+import re
+
+from collections import OrderedDict
 
 import click
 
-# Validators TODO:
-# NAME cannot start with number
-# *_PORT - check for collisions
+from acdsc.content import ContentIndex
+
+
+def open_content_index(config):
+    # content index of the server in config, None when it has no content
+    index = ContentIndex(config['server-path'], config['cache-dir'])
+    if not index.exists():
+        return None
+    return index
+
+
+def content_index():
+    # content index of the server in the current click context, or None when
+    # there is no context or no server content to validate against
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or not isinstance(ctx.obj, dict):
+        return None
+    config = ctx.obj
+    if 'content-index' not in config:
+        index = None
+        if 'server-path' in config:
+            index = open_content_index(config)
+            if index is not None:
+                ctx.find_root().call_on_close(index.save)
+        config['content-index'] = index
+    return config['content-index']
+
+
+def split_list(value):
+    return [item for item in value.split(';') if item]
+
+
+## Settings checked against the content
+
+def check_car(index, value):
+    if not index.has_car(value):
+        return '{} is not a car in content/cars'.format(value)
+
+
+def check_car_list(index, value):
+    missing = [car for car in split_list(value) if not index.has_car(car)]
+    if missing:
+        return '{} not found in content/cars'.format(', '.join(missing))
+
 
+def check_track(index, value):
+    if not index.has_track(value):
+        return '{} is not a track in content/tracks'.format(value)
 
-# stub validators
-def is_car():
-    pass
 
+def check_content(check, value):
+    index = content_index()
+    if index is not None:
+        message = check(index, value)
+        if message is not None:
+            raise ValueError(message)
+    return value
 
-def is_car_skin():
-    pass
 
+def is_car(value):
+    return check_content(check_car, value)
 
-def is_car_list():
-    pass
 
+def is_car_list(value):
+    return check_content(check_car_list, value)
 
-def is_track():
-    pass
+
+def is_track(value):
+    return check_content(check_track, value)
 
 
-def is_track_subversion():
-    pass
+# validator -> its check against the content, for checking configurations
+# against the content of their own server instead of the one in the click
+# context
+content_checks = {
+    is_car: check_car,
+    is_car_list: check_car_list,
+    is_track: check_track
+}
 
 
-def max_clients():
-    pass
+def max_clients(value):
+    clients = int(value)
+    if clients < 1:
+        raise ValueError('{} is not a positive number'.format(value))
+    return value
 
 
-def is_tyre_list():
-    pass
+def is_guid_list(value):
+    # entries may list several Steam GUIDs separated by ;
+    guids = [guid.strip() for guid in split_list(value)]
+    invalid = [guid for guid in guids if not guid.isdigit()]
+    if invalid:
+        raise ValueError('{} is not a Steam GUID'.format(', '.join(invalid)))
+    if len(set(guids)) != len(guids):
+        raise ValueError('{} lists the same GUID twice'.format(value))
+    return value
+
+
+## Settings depending on other settings
+
+def check_skin(index, values):
+    model = values.get('MODEL')
+    skin = values['SKIN']
+    if skin and model and index.has_car(model) and \
+            skin not in index.skins(model):
+        return '{} is not a skin of {}'.format(skin, model)
+
+
+def check_layout(index, values):
+    track = values.get('TRACK')
+    layout = values['CONFIG_TRACK']
+    if layout and track and index.has_track(track) and \
+            layout not in index.layouts(track):
+        return '{} is not a layout of {} (layouts: {})'.format(
+            layout, track, ', '.join(index.layouts(track)) or '-')
+
+
+def check_pits(index, values):
+    track = values.get('TRACK')
+    try:
+        clients = int(values['MAX_CLIENTS'])
+    except ValueError:
+        return None
+    if track and index.has_track(track):
+        pits = index.pits(track, values.get('CONFIG_TRACK') or '')
+        if pits is not None and clients > pits:
+            return '{} has only {} pits'.format(track, pits)
+
+
+def check_tyres(index, values):
+    cars = split_list(values.get('CARS') or '')
+    tyres = index.tyres(cars)
+    # tyre data is not available for encrypted cars
+    unknown = [tyre for tyre in split_list(values['LEGAL_TYRES'])
+               if tyre not in tyres]
+    if tyres and unknown:
+        return '{} not found in tyres of {}'.format(
+            ', '.join(unknown), ', '.join(cars))
+
+
+# setting -> (settings it depends on, check). These are checked against
+# the content once all values of a section are known, so the order the
+# values were given in does not matter
+related_settings = OrderedDict([
+    ('SKIN', (('MODEL',), check_skin)),
+    ('CONFIG_TRACK', (('TRACK',), check_layout)),
+    ('MAX_CLIENTS', (('TRACK', 'CONFIG_TRACK'), check_pits)),
+    ('LEGAL_TYRES', (('CARS',), check_tyres))
+])
+
+
+def related_problems(index, values, changed=None):
+    # (key, message) of the values of a section that do not fit the other
+    # values, only of the changed keys and the keys depending on them when
+    # changed is given
+    problems = []
+    for key, (depends, check) in related_settings.items():
+        if key not in values:
+            continue
+        if changed is not None and key not in changed and \
+                not set(depends) & set(changed):
+            continue
+        message = check(index, values)
+        if message is not None:
+            problems.append((key, message))
+    return problems
 
 
 class SteamPath(click.Path):
@@ -43,3 +181,17 @@ class SteamPath(click.Path):
     def convert(self, value, param, ctx):
         return super(SteamPath, self).convert(
             os.path.join(ctx.params['steam_path'], value), param, ctx)
+
+
+class Duration(click.ParamType):
+    name = 'duration'
+    units = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, (int, float)):
+            return value
+        match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd]?)', value.strip())
+        if match is None:
+            self.fail('{} is not a valid duration (e.g. 90s, 10m, 1h)'.format(
+                      value), param, ctx)
+        return float(match.group(1)) * self.units[match.group(2) or 's']
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+import os
+import time
+
+from acdsc import inotify
+from acdsc.parser import make_ac_parser
+from acdsc.settings import (
+    entry_list_settings, server_settings, session_settings, weather_settings)
+from acdsc.validation import (
+    config_prefixes, config_schema, entry_prefixes, section_types)
+
+# Configuration watching. The directories of every server's configuration
+# are watched with inotify (files are usually replaced by renaming a new
+# copy over them) and a burst of writes settles for debounce seconds before
+# the configuration is read again. Only settings acServer reads count as
+# changes, rewrites with the same values, comments and unknown keys do not.
+# Only changes of settings marked as needing a restart restart the server,
+# the others stay pending until it is restarted
+debounce = 1.0
+watch_mask = (inotify.IN_CLOSE_WRITE | inotify.IN_MOVED_TO |
+              inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MODIFY)
+
+
+def snapshot(config):
+    # {(file, section, key): value} of the settings of a configuration
+    values = {}
+    for kind, path, schema, prefixes in (
+            ('server', config['config-file'], config_schema, config_prefixes),
+            ('entries', config['entry-list'], {}, entry_prefixes)):
+        parser = make_ac_parser(path)
+        for section in parser.sections():
+            types = section_types(section, schema, prefixes)
+            if types is None:
+                continue
+            for key, value in parser.items(section):
+                if key in types:
+                    values[(kind, section, key)] = value
+    return values
+
+
+def restart_free(settings):
+    return frozenset(key for key, value in settings.items()
+                     if not value.get('restart', True))
+
+
+# section -> keys whose changes do not restart the server (acServer still
+# only reads them when it starts), weathers and entries are numbered
+# sections
+restart_free_keys = {'SERVER': restart_free(server_settings)}
+restart_free_keys.update((session, restart_free(settings))
+                         for session, settings in session_settings.items())
+restart_free_prefixes = {'WEATHER': restart_free(weather_settings),
+                         'CAR': restart_free(entry_list_settings)}
+
+
+def needs_restart(changed):
+    # the SECTION.KEY of changed a running server has to be restarted for
+    needed = []
+    for name in changed:
+        section, _, key = name.rpartition('.')
+        keys = section_types(section, restart_free_keys,
+                             restart_free_prefixes)
+        if keys is None or key not in keys:
+            needed.append(name)
+    return needed
+
+
+def changed_keys(old, new):
+    # SECTION.KEY of every setting added, removed or changed
+    return sorted('{}.{}'.format(section, key)
+                  for (kind, section, key) in set(old) | set(new)
+                  if old.get((kind, section, key)) !=
+                  new.get((kind, section, key)))
+
+
+class ConfigWatch(object):
+    # Watches the configurations of (name, config) targets from a single
+    # inotify instance. applied holds the settings each server was last
+    # (re)started with, changes are reported against it
+
+    def __init__(self, targets, settle=debounce):
+        self.targets = dict(targets)
+        self.settle = settle
+        self.applied = {name: snapshot(config)
+                        for name, config in self.targets.items()}
+        self.watcher = inotify.Inotify()
+        self.directories = {}
+        self.paths = {}
+        for name, config in self.targets.items():
+            for path in (config['config-file'], config['entry-list']):
+                path = os.path.abspath(path)
+                self.paths[path] = name
+                directory = os.path.dirname(path)
+                if directory not in self.directories.values():
+                    wd = self.watcher.add_watch(directory, watch_mask)
+                    self.directories[wd] = directory
+
+    def changes(self):
+        # Yield (name, changed keys, keys needing a restart, settings) once
+        # writes to a server's configuration have settled, blocks forever
+        pending = {}
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(min(pending.values()) - time.monotonic(), 0)
+            for wd, _, _, name in self.watcher.read(timeout):
+                path = os.path.join(self.directories.get(wd, ''), name)
+                if path in self.paths:
+                    pending[self.paths[path]] = time.monotonic() + self.settle
+            now = time.monotonic()
+            for name, deadline in sorted(pending.items()):
+                if deadline > now:
+                    continue
+                del pending[name]
+                settings = snapshot(self.targets[name])
+                changed = changed_keys(self.applied[name], settings)
+                yield name, changed, needs_restart(changed), settings
+
+    def close(self):
+        self.watcher.close()
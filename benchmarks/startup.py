@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup budget of bin/acdsc. Monitoring and cron jobs run acdsc thousands
+# of times a day, so importing the command line and running the light
+# commands must stay cheap: heavy modules are only imported by the commands
+# that need them
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+script = os.path.join(root, 'bin', 'acdsc')
+
+# seconds, best of --repeat runs
+budgets = {
+    'import': 0.15,
+    '--help': 0.25,
+    'weather list': 0.25,
+    'server set --help': 0.25,
+    'status': 0.25
+}
+# modules the budgeted commands may not import, status needs psutil to
+# tell a running server from a stale pidfile
+forbidden = ('asyncio', 'psutil', 'sqlite3', 'ssl', 'urllib.request',
+             'http.server', 'difflib')
+allowed = {'status': ('psutil',)}
+# exit codes other than 0, status exits with 3 as nothing is running
+exit_codes = {'status': 3}
+# the budgeted commands after import
+commands = ('--help', 'weather list', 'server set --help', 'status')
+
+# runs bin/acdsc (or only imports it) and reports the imported modules
+driver = '''
+import atexit, runpy, sys
+atexit.register(lambda: sys.stderr.write(
+    '\\nacdsc-modules: {}\\n'.format(' '.join(sorted(sys.modules)))))
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name=sys.argv.pop(1))
+'''
+
+server_cfg = '''[SERVER]
+NAME=benchmark
+CARS=ks_mazda_mx5_cup
+TRACK=ks_vallelunga
+MAX_CLIENTS=10
+UDP_PORT=9600
+TCP_PORT=9600
+HTTP_PORT=8081
+
+[WEATHER_0]
+GRAPHICS=3_clear
+'''
+
+
+def make_environment(directory):
+    # global options pointing at a minimal server in directory
+    server_path = os.path.join(directory, 'server')
+    os.makedirs(os.path.join(server_path, 'cfg'))
+    with open(os.path.join(server_path, 'cfg', 'server_cfg.ini'), 'w') as fh:
+        fh.write(server_cfg)
+    open(os.path.join(server_path, 'cfg', 'entry_list.ini'), 'w').close()
+    return ['--steam-path', directory,
+            '--server-path', 'server',
+            '--steamcmd-path', os.path.join(directory, 'steamcmd'),
+            '--pidfile', os.path.join(directory, 'acds.pid'),
+            '--cache-dir', os.path.join(directory, 'cache'),
+            '--log-dir', os.path.join(directory, 'logs'),
+            '--instances-dir', os.path.join(directory, 'instances')]
+
+
+def run(args, run_name='__main__', extra_env=None):
+    # (seconds, exit code, imported modules)
+    env = dict(os.environ, PYTHONPATH=root, **(extra_env or {}))
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-c', driver, script, run_name] + args,
+        cwd=root, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE)
+    elapsed = time.perf_counter() - started
+    modules = []
+    for line in process.stderr.decode('utf-8', 'replace').splitlines():
+        if line.startswith('acdsc-modules: '):
+            modules = line.split(': ', 1)[1].split()
+    return elapsed, process.returncode, modules
+
+
+def heavy_imports(name, modules):
+    return sorted(module for module in modules if module in forbidden and
+                  module not in allowed.get(name, ()))
+
+
+def measure(name, args, repeat, run_name='__main__'):
+    times = []
+    for _ in range(repeat):
+        elapsed, code, modules = run(args, run_name)
+        times.append(elapsed)
+    heavy = heavy_imports(name, modules)
+    return {'name': name,
+            'best': min(times),
+            'median': statistics.median(times),
+            'budget': budgets[name],
+            'forbidden_imports': heavy,
+            'exit_code': code,
+            'ok': (min(times) <= budgets[name] and not heavy and
+                   code == exit_codes.get(name, 0))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='acdsc startup budget')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        options = make_environment(directory)
+        results = [measure('import', [], args.repeat, 'acdsc_cli')]
+        for name in commands:
+            results.append(
+                measure(name, options + name.split(), args.repeat))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print('{:<20} best {:.3f}s median {:.3f}s budget {:.3f}s '
+                  'exit {} {}{}'.format(
+                      result['name'], result['best'], result['median'],
+                      result['budget'], result['exit_code'],
+                      'ok' if result['ok'] else 'FAIL',
+                      ' imports {}'.format(
+                          ', '.join(result['forbidden_imports']))
+                      if result['forbidden_imports'] else ''))
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+
+import argparse
+import io
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+import timeit
+
+import startup
+
+sys.path.insert(0, startup.root)
+
+from acdsc.daemon import ACDaemon  # noqa: E402
+from acdsc.parser import (  # noqa: E402
+    get_next_section, make_ac_parser, write_ac_parser)
+
+# Benchmarks of the hot paths: reading and writing configurations, entry
+# list edits, CLI startup and daemon start/stop. Every benchmark has a
+# threshold (seconds, best run) and can be compared against the JSON output
+# of an earlier run with --baseline
+sizes = (10, 1000, 10000)
+entry_sizes = (1000, 10000)
+thresholds = {
+    'config.read[10]': 0.002,
+    'config.read[1000]': 0.15,
+    'config.read[10000]': 1.5,
+    'config.write[10]': 0.0005,
+    'config.write[1000]': 0.02,
+    'config.write[10000]': 0.2,
+    'config.prefix_sections[10]': 0.00001,
+    'config.prefix_sections[1000]': 0.0005,
+    'config.prefix_sections[10000]': 0.005,
+    'config.next_section[10]': 0.00001,
+    'config.next_section[1000]': 0.00001,
+    'config.next_section[10000]': 0.00001,
+    'config.get_next_section[10]': 0.0001,
+    'config.get_next_section[1000]': 0.005,
+    'config.get_next_section[10000]': 0.05,
+    'entries.add[1000]': 0.05,
+    'entries.add[10000]': 0.5,
+    'entries.set[1000]': 0.05,
+    'entries.set[10000]': 0.5,
+    'entries.del[1000]': 0.05,
+    'entries.del[10000]': 0.5,
+    'cli.help.cold': 1.5,
+    'cli.help.warm': 0.25,
+    'cli.status.cold': 1.5,
+    'cli.status.warm': 0.25,
+    'daemon.start_to_ready': 1.0,
+    'daemon.stop': 1.0
+}
+
+entry = {
+    'DRIVERNAME': '',
+    'GUID': '',
+    'MODEL': 'ks_mazda_mx5_cup',
+    'TEAM': '',
+    'BALLAST': '0',
+    'SKIN': '00_official',
+    'SPECTATOR_MODE': '0'
+}
+
+# listens on TCP_PORT of the configuration given with -c, like acServer
+# once it is ready for clients
+stub_server = textwrap.dedent('''\
+    #!{}
+    import configparser, signal, socket, sys, time
+    parser = configparser.ConfigParser()
+    parser.read(sys.argv[sys.argv.index('-c') + 1])
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', parser.getint('SERVER', 'TCP_PORT')))
+    listener.listen()
+    print('ready', flush=True)
+    while True:
+        time.sleep(1)
+    ''').format(sys.executable)
+
+
+def write_entry_list(path, count):
+    with open(path, 'w') as fh:
+        for idx in range(count):
+            fh.write('[CAR_{}]\n'.format(idx))
+            for key, value in entry.items():
+                fh.write('{}={}\n'.format(key, value))
+            fh.write('\n')
+
+
+def timed(fn, repeat):
+    # seconds per call of every repeat, fast calls are looped enough times
+    # to be measurable
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return [elapsed / number for elapsed in timer.repeat(repeat, number)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return True
+        except OSError:
+            time.sleep(0.002)
+    return False
+
+
+## Suites
+
+def config_suite(directory, repeat):
+    for size in sizes:
+        path = os.path.join(directory, 'entry_list_{}.ini'.format(size))
+        write_entry_list(path, size)
+        parser = make_ac_parser(path)
+        sections = parser.prefix_sections('CAR')
+        yield ('config.read[{}]'.format(size),
+               timed(lambda: make_ac_parser(path), repeat))
+        yield ('config.write[{}]'.format(size),
+               timed(lambda: parser.write(io.StringIO()), repeat))
+        yield ('config.prefix_sections[{}]'.format(size),
+               timed(lambda: parser.prefix_sections('CAR'), repeat))
+        yield ('config.next_section[{}]'.format(size),
+               timed(lambda: parser.next_section('CAR'), repeat))
+        yield ('config.get_next_section[{}]'.format(size),
+               timed(lambda: get_next_section('CAR', sections), repeat))
+
+
+def entries_suite(directory, repeat):
+    # what entries add/set/del do: edit the entry list and write it
+    for size in entry_sizes:
+        path = os.path.join(directory, 'entries_{}.ini'.format(size))
+        write_entry_list(path, size)
+        parser = make_ac_parser(path)
+        middle = 'CAR_{}'.format(size // 2)
+
+        def add():
+            section = parser.next_section('CAR')
+            parser.add_section(section)
+            for key, value in entry.items():
+                parser.set(section, key, value)
+            write_ac_parser(parser, path)
+
+        def set_values():
+            parser.set(middle, 'BALLAST', '10')
+            parser.set(middle, 'SKIN', '01_custom')
+            write_ac_parser(parser, path)
+
+        removable = iter(parser.prefix_sections('CAR'))
+
+        def remove():
+            parser.remove_section(next(removable))
+            write_ac_parser(parser, path)
+
+        yield 'entries.add[{}]'.format(size), timed(add, repeat)
+        yield 'entries.set[{}]'.format(size), timed(set_values, repeat)
+        yield 'entries.del[{}]'.format(size), timed(remove, repeat)
+
+
+def cli_suite(directory, repeat):
+    # cold runs compile every module (click included) from source, warm
+    # runs reuse the bytecode written by the last cold run. Neither command
+    # runs the steam probes, the environment has no Steam to probe
+    options = startup.make_environment(os.path.join(directory, 'cli'))
+    for name, args in (('help', ['--help']), ('status', ['status'])):
+        cold = []
+        for run in range(repeat):
+            env = {'PYTHONPYCACHEPREFIX': os.path.join(
+                       directory, 'pycache-{}-{}'.format(name, run)),
+                   'PYTHONDONTWRITEBYTECODE': ''}
+            cold.append(startup.run(options + args, extra_env=env)[0])
+        warm = []
+        for _ in range(repeat):
+            warm.append(startup.run(options + args, extra_env=env)[0])
+        yield 'cli.{}.cold'.format(name), cold
+        yield 'cli.{}.warm'.format(name), warm
+
+
+def daemon_suite(directory, repeat):
+    # spawn the daemon with a stub acServer until it accepts connections on
+    # TCP_PORT, then stop it
+    server_path = os.path.join(directory, 'server')
+    os.makedirs(os.path.join(server_path, 'cfg'))
+    stub = os.path.join(server_path, 'acServer')
+    with open(stub, 'w') as fh:
+        fh.write(stub_server)
+    os.chmod(stub, 0o755)
+    port = free_port()
+    config_file = os.path.join(server_path, 'cfg', 'server_cfg.ini')
+    with open(config_file, 'w') as fh:
+        fh.write('[SERVER]\nTCP_PORT={}\n'.format(port))
+    config = {'server-path': server_path,
+              'config-file': config_file,
+              'entry-list': os.path.join(server_path, 'cfg',
+                                         'entry_list.ini'),
+              'pidfile': os.path.join(directory, 'acds.pid'),
+              'log-dir': os.path.join(directory, 'logs')}
+    ready = []
+    stopped = []
+    for _ in range(repeat):
+        daemon = ACDaemon(config)
+        started = time.perf_counter()
+        if not daemon.spawn() or not wait_port(port, 10):
+            daemon.stop(1)
+            raise RuntimeError('stub acServer did not start, see {}'.format(
+                config['log-dir']))
+        ready.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        daemon.stop(10)
+        stopped.append(time.perf_counter() - started)
+    yield 'daemon.start_to_ready', ready
+    yield 'daemon.stop', stopped
+
+
+suites = {
+    'config': config_suite,
+    'entries': entries_suite,
+    'cli': cli_suite,
+    'daemon': daemon_suite
+}
+
+
+def check(name, times, baseline, tolerance):
+    best = min(times)
+    result = {'name': name,
+              'best': best,
+              'median': statistics.median(times),
+              'runs': len(times),
+              'threshold': thresholds[name],
+              'baseline': None,
+              'ok': best <= thresholds[name]}
+    if name in baseline:
+        result['baseline'] = baseline[name]
+        result['ok'] = result['ok'] and best <= baseline[name] * tolerance
+    return result
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 0.001:
+        return '{:.1f}us'.format(seconds * 1000000)
+    if seconds < 1:
+        return '{:.2f}ms'.format(seconds * 1000)
+    return '{:.3f}s'.format(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='acdsc benchmarks')
+    parser.add_argument('-s', '--suite', action='append',
+                        choices=sorted(suites),
+                        help='suites to run (default: all)')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-j', '--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('-o', '--output',
+                        help='write the results as JSON to OUTPUT')
+    parser.add_argument('-b', '--baseline',
+                        help='JSON results of an earlier run to compare to')
+    parser.add_argument('-t', '--tolerance', type=float, default=1.5,
+                        help='allowed slowdown compared to the baseline')
+    args = parser.parse_args()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as fh:
+            baseline = {result['name']: result['best']
+                        for result in json.load(fh)['results']}
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for suite in args.suite or list(suites):
+            suite_dir = os.path.join(directory, suite)
+            os.makedirs(suite_dir)
+            for name, times in suites[suite](suite_dir, args.repeat):
+                results.append(
+                    check(name, times, baseline, args.tolerance))
+                if not args.json:
+                    result = results[-1]
+                    print('{:<32} best {:>10} median {:>10} threshold {:>10} '
+                          'baseline {:>10} {}'.format(
+                              name,
+                              format_seconds(result['best']),
+                              format_seconds(result['median']),
+                              format_seconds(result['threshold']),
+                              format_seconds(result['baseline']),
+                              'ok' if result['ok'] else 'FAIL'))
+    report = {'python': sys.version.split()[0],
+              'time': time.time(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,6 +5,8 @@ import sys
 from setuptools import setup, find_packages
 
 install_requires = ['click', 'psutil']
+# YAML plans (acdsc apply plan.yaml)
+extras_require = {'yaml': ['PyYAML']}
 scripts = ['bin/acdsc']
 package_dir = {'acdsc': 'acdsc'}
 packages = find_packages()
@@ -19,4 +21,5 @@ setup(name='acdsc',
       package_dir=package_dir,
       packages=packages,
       install_requires=install_requires,
+      extras_require=extras_require,
       scripts=scripts)
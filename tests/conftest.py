@@ -0,0 +1,8 @@
+#!/usr/bin/python3
+
+import os
+import sys
+
+# run against the checkout, not an installed acdsc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+
+import http.client
+import os
+import signal
+import socket
+import subprocess as sub
+import sys
+import threading
+import time
+
+import pytest
+
+from acdsc.auth import AuthServer, AuthSources, GuidIndex
+from benchmarks import startup
+
+entry_list = '[CAR_0]\nMODEL=ks_mazda_mx5_cup\nGUID=1001;1002\n'
+
+
+def replace(path, text):
+    # written like the tooling writes them, a new copy renamed over
+    temp_file = '{}.tmp'.format(path)
+    with open(temp_file, 'w') as fh:
+        fh.write(text)
+    os.replace(temp_file, path)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if check():
+                return True
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def auth(tmp_path):
+    options = startup.make_environment(str(tmp_path))
+    replace(str(tmp_path / 'server' / 'cfg' / 'entry_list.ini'), entry_list)
+    allow = str(tmp_path / 'allow.txt')
+    deny = str(tmp_path / 'deny.txt')
+    replace(allow, '2001\n2002 # a comment\n')
+    replace(deny, '3001 cheating\n1002\n2002 left the league\n')
+    processes = []
+
+    def start(*args):
+        port = free_port()
+        process = sub.Popen(
+            [sys.executable, startup.script] + options + [
+                'auth-server', '-l', '127.0.0.1:{}'.format(port),
+                '-a', allow, '-d', deny] + list(args),
+            env=dict(os.environ, PYTHONPATH=startup.root),
+            stdout=sub.DEVNULL)
+        processes.append(process)
+        assert wait_for(lambda: socket.create_connection(
+            ('127.0.0.1', port), 0.5).close() is None)
+        return port
+
+    yield start, allow, deny
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def ask(port, guid):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+    try:
+        connection.request('GET', '/default?guid={}'.format(guid))
+        return connection.getresponse().read().decode('utf-8')
+    finally:
+        connection.close()
+
+
+def test_index():
+    index = GuidIndex({'a': frozenset(['1'])}, frozenset(['2', '3']),
+                      {'3': '', '4': 'cheating'}, True)
+    assert index.check('a', '1') == (True, None)
+    assert index.check('b', '1') == (False, 'not on the allow list')
+    assert index.check('b', '2') == (True, None)
+    # deny wins over every allow source
+    assert index.check('a', '3') == (False, 'banned')
+    assert index.check('a', '4') == (False, 'cheating')
+    index.allowlist = False
+    assert index.check('b', '9') == (True, None)
+    assert index.check('b', '4') == (False, 'cheating')
+
+
+def test_answers(auth):
+    start, _, _ = auth
+    port = start()
+    assert ask(port, '9999') == 'OK|9999'
+    assert ask(port, '2001') == 'OK|2001'
+    assert ask(port, '3001') == 'DENY|cheating'
+    assert ask(port, '2002') == 'DENY|left the league'
+    assert ask(port, '1002') == 'DENY|banned'
+    assert ask(port, '') == 'DENY|no GUID'
+
+
+def test_allowlist(auth):
+    start, _, _ = auth
+    port = start('--allowlist')
+    assert ask(port, '9999') == 'DENY|not on the allow list'
+    # the entry list and the allow file allow, the deny file overrides both
+    assert ask(port, '1001') == 'OK|1001'
+    assert ask(port, '2001') == 'OK|2001'
+    assert ask(port, '1002') == 'DENY|banned'
+    assert ask(port, '2002') == 'DENY|left the league'
+
+
+def test_keep_alive(auth):
+    start, _, _ = auth
+    port = start()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+    try:
+        for guid in ('1', '3001', '2'):
+            connection.request('GET', '/default?guid={}'.format(guid))
+            response = connection.getresponse()
+            assert response.status == 200
+            response.read()
+        sock = connection.sock
+        connection.request('GET', '/nothing')
+        response = connection.getresponse()
+        assert response.status == 404
+        response.read()
+        # every request was answered on the same connection
+        assert connection.sock is sock
+        connection.request('GET', '/default?guid=1',
+                           headers={'Connection': 'close'})
+        response = connection.getresponse()
+        assert response.getheader('Connection') == 'close'
+        assert response.read() == b'OK|1'
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('request_line', [
+    b'GARBAGE\r\n\r\n', b'\r\n\r\n', b'GET\r\nHost: x\r\n\r\n'])
+def test_malformed_requests(auth, request_line):
+    start, _, _ = auth
+    port = start()
+    with socket.create_connection(('127.0.0.1', port), 2) as sock:
+        sock.sendall(request_line)
+        assert sock.recv(1024) == b''
+    assert ask(port, '1') == 'OK|1'
+
+
+def test_hot_reload(auth):
+    start, allow, deny = auth
+    port = start('--allowlist')
+    assert ask(port, '4001') == 'DENY|not on the allow list'
+    replace(allow, '4001\n')
+    assert wait_for(lambda: ask(port, '4001') == 'OK|4001')
+    replace(deny, '4001 banned after all\n')
+    assert wait_for(lambda: ask(port, '4001') == 'DENY|banned after all')
+    # 2002 is no longer denied nor allowed
+    assert ask(port, '2002') == 'DENY|not on the allow list'
+
+
+def test_change_before_watching(tmp_path):
+    # replaced after the sources were loaded, before they are watched
+    deny = str(tmp_path / 'deny.txt')
+    replace(deny, '')
+    replace(str(tmp_path / 'entry_list.ini'), entry_list)
+    port = free_port()
+    server = AuthServer(AuthSources(
+        {'default': str(tmp_path / 'entry_list.ini')}, [], [deny], None,
+        False), ('127.0.0.1', port))
+    server.stop_signals = (signal.SIGUSR1,)
+    replace(deny, '9999 too early\n')
+    answers = []
+
+    def client():
+        try:
+            wait_for(lambda: answers.append(ask(port, '9999')) is None)
+        finally:
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+    thread = threading.Thread(target=client)
+    thread.start()
+    server.run()
+    thread.join()
+    assert answers == ['DENY|too early']
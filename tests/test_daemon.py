@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+
+import subprocess as sub
+import time
+
+import pytest
+
+from acdsc.daemon import Daemon, stop_daemons
+
+
+@pytest.fixture
+def session(tmp_path):
+    # start sh scripts in sessions of their own, like daemonize does, with
+    # a pidfile each
+    started = []
+
+    def start(name, script):
+        process = sub.Popen(['sh', '-c', script], start_new_session=True)
+        started.append(process)
+        pidfile = tmp_path / '{}.pid'.format(name)
+        pidfile.write_text('{}\n'.format(process.pid))
+        return Daemon(str(pidfile))
+    yield start
+    for process in started:
+        process.kill()
+        process.wait()
+
+
+def test_stop_escalates_to_sigkill(session):
+    stubborn = session('stubborn', 'trap "" TERM; while :; do sleep 0.05; '
+                                   'done')
+    polite = session('polite', 'trap "exit 0" TERM; while :; do sleep '
+                               '0.05; done')
+    # give the shells time to set their traps
+    time.sleep(0.2)
+    results = stop_daemons([stubborn, polite, Daemon('/nonexistent.pid')],
+                           0.3)
+    (stubborn_secs, killed), (polite_secs, polite_killed), missing = results
+    assert killed
+    assert stubborn_secs >= 0.3
+    assert not polite_killed
+    assert polite_secs < 0.3
+    assert missing is None
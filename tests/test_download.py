@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+import hashlib
+import io
+import os
+import tarfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from acdsc import download
+
+
+def make_tarball(files):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class Tarballs(BaseHTTPRequestHandler):
+    # serves server.body with server.etag, honouring Range and If-Range
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        body = server.body
+        start = 0
+        ranged = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if ranged and server.ranges and if_range in (None, server.etag):
+            start = int(ranged.split('=')[1].rstrip('-'))
+            if start >= len(body):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', '{}'.format(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Tarballs)
+    httpd.body = make_tarball({'steamcmd.sh': b'#!/bin/sh\n' * 5000})
+    httpd.etag = '"v1"'
+    httpd.ranges = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    httpd.url = 'http://127.0.0.1:{}/steamcmd_linux.tar.gz'.format(
+        httpd.server_address[1])
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def installed(path):
+    with open(os.path.join(path, 'steamcmd.sh'), 'rb') as fh:
+        return fh.read()
+
+
+def test_download_is_cached(server, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    digest = download.fetch_and_extract(server.url, str(tmp_path / 'a'),
+                                        cache_dir)
+    assert digest == hashlib.sha256(server.body).hexdigest()
+    assert installed(str(tmp_path / 'a')) == b'#!/bin/sh\n' * 5000
+    download.fetch_and_extract(server.url, str(tmp_path / 'b'), cache_dir)
+    assert installed(str(tmp_path / 'b')) == b'#!/bin/sh\n' * 5000
+    assert len(server.requests) == 1
+
+
+def test_resume_sends_if_range(server, tmp_path):
+    cache_file = download.cached_download(server.url, str(tmp_path))
+    os.makedirs(os.path.dirname(cache_file))
+    part_file = '{}.part'.format(cache_file)
+    with open(part_file, 'wb') as fh:
+        fh.write(server.body[:100])
+    with open('{}.validator'.format(part_file), 'w') as fh:
+        fh.write('"v1"\n')
+    digest = download.fetch_and_extract(server.url, str(tmp_path / 'a'),
+                                        str(tmp_path))
+    assert digest == hashlib.sha256(server.body).hexdigest()
+    assert server.requests[0]['Range'] == 'bytes=100-'
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert not os.path.exists('{}.validator'.format(part_file))
+
+
+def test_changed_upstream_restarts(server, tmp_path):
+    cache_file = download.cached_download(server.url, str(tmp_path))
+    os.makedirs(os.path.dirname(cache_file))
+    part_file = '{}.part'.format(cache_file)
+    with open(part_file, 'wb') as fh:
+        fh.write(make_tarball({'steamcmd.sh': b'old\n' * 5000})[:100])
+    with open('{}.validator'.format(part_file), 'w') as fh:
+        fh.write('"v0"\n')
+    digest = download.fetch_and_extract(server.url, str(tmp_path / 'a'),
+                                        str(tmp_path))
+    assert digest == hashlib.sha256(server.body).hexdigest()
+    assert installed(str(tmp_path / 'a')) == b'#!/bin/sh\n' * 5000
+    assert len(server.requests) == 1
+
+
+def test_checksum_mismatch_installs_nothing(server, tmp_path):
+    path = tmp_path / 'a'
+    path.mkdir()
+    with pytest.raises(download.ChecksumError):
+        download.fetch_and_extract(server.url, str(path), str(tmp_path),
+                                   '0' * 64)
+    assert os.listdir(str(path)) == []
+    assert sorted(os.listdir(str(tmp_path))) == ['a', 'downloads']
+    assert os.listdir(str(tmp_path / 'downloads')) == []
+
+
+@pytest.mark.skipif(not hasattr(tarfile, 'data_filter'),
+                    reason='tarfile has no extraction filters')
+def test_refuses_members_outside_path(server, tmp_path):
+    server.body = make_tarball({'../escaped': b'x'})
+    with pytest.raises(tarfile.TarError):
+        download.fetch_and_extract(server.url, str(tmp_path / 'a'),
+                                   str(tmp_path / 'cache'))
+    assert not os.path.exists(str(tmp_path / 'escaped'))
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+import csv
+import json
+import os
+import subprocess as sub
+import sys
+
+import pytest
+
+from acdsc.entries import (
+    guid_index, merge_entries, parse_weighted, read_entries, round_robin,
+    weighted, write_entries)
+from acdsc.parser import make_ac_parser
+from benchmarks import startup
+
+
+def test_parse_weighted():
+    assert parse_weighted('a') == ('a', None)
+    assert parse_weighted('a:3') == ('a', 3)
+
+
+@pytest.mark.parametrize('car', ['a:0', 'a:-3', 'a:x', 'a:', ':2'])
+def test_parse_weighted_rejects(car):
+    with pytest.raises(ValueError):
+        parse_weighted(car)
+
+
+def test_distributions():
+    assert round_robin(['a', 'b'], 3) == ['a', 'b', 'a']
+    models = weighted([('a', 2), ('b', 1)], 6)
+    assert models.count('a') == 4
+    assert models.count('b') == 2
+    # interleaved, not in blocks
+    assert models[:3] == ['a', 'b', 'a']
+
+
+def gen_entries(directory, *args):
+    # acdsc gen-entries in the benchmark environment, MAX_CLIENTS=10
+    options = startup.make_environment(directory)
+    os.makedirs(os.path.join(directory, 'steamapps'))
+    result = sub.run(
+        [sys.executable, startup.script] + options +
+        ['gen-entries', '-f'] + list(args),
+        env=dict(os.environ, PYTHONPATH=startup.root),
+        stdout=sub.PIPE, stderr=sub.STDOUT, universal_newlines=True)
+    entries = make_ac_parser(os.path.join(
+        directory, 'server', 'cfg', 'entry_list.ini'))
+    return result, entries.prefix_sections('CAR')
+
+
+def test_count_capped_at_max_clients(tmp_path):
+    result, entries = gen_entries(str(tmp_path), '-c', '20', 'a')
+    assert result.returncode == 0, result.stdout
+    assert 'WARNING: MAX_CLIENTS is 10, generating 10 entries' in \
+        result.stdout
+    assert len(entries) == 10
+
+
+def test_count_capped_at_pits(tmp_path):
+    ui = tmp_path / 'server' / 'content' / 'tracks' / 'ks_vallelunga' / 'ui'
+    os.makedirs(str(ui))
+    os.makedirs(str(tmp_path / 'server' / 'content' / 'cars' / 'a'))
+    (ui / 'ui_track.json').write_text('{"pitboxes": "8"}')
+    result, entries = gen_entries(str(tmp_path), '-c', '20', 'a')
+    assert result.returncode == 0, result.stdout
+    assert 'WARNING: ks_vallelunga has only 8 pits, generating 8 entries' \
+        in result.stdout
+    assert len(entries) == 8
+
+
+@pytest.fixture
+def entry_list(tmp_path):
+    path = tmp_path / 'entry_list.ini'
+    path.write_text('[CAR_0]\nMODEL=a\nSKIN=red\nGUID=1;3\n\n'
+                    '[CAR_1]\nMODEL=b\nSKIN=blue\nGUID=2\n')
+    return make_ac_parser(str(path))
+
+
+def merge(parser, *entries):
+    return merge_entries(parser, [('line {}'.format(number), values)
+                                  for number, values in enumerate(entries)])
+
+
+def test_update_by_guid(entry_list):
+    counts, errors = merge(entry_list, {'GUID': '2', 'DRIVERNAME': 'b'},
+                           {'GUID': '4', 'MODEL': 'c'})
+    assert errors == []
+    assert counts == {'added': 1, 'updated': 1, 'duplicates': 0}
+    assert entry_list.prefix_sections('CAR') == ['CAR_0', 'CAR_1', 'CAR_2']
+    assert entry_list.get('CAR_1', 'DRIVERNAME') == 'b'
+    # settings the entry does not give are kept
+    assert entry_list.get('CAR_1', 'SKIN') == 'blue'
+    assert entry_list.get('CAR_2', 'MODEL') == 'c'
+    assert entry_list.get('CAR_2', 'BALLAST') == '0'
+
+
+def test_guid_moves_between_sections(entry_list):
+    # 3 is dropped from CAR_0 first, the next entry with it is a new car
+    counts, errors = merge(entry_list, {'GUID': '1', 'DRIVERNAME': 'a'},
+                           {'GUID': '3', 'MODEL': 'c'},
+                           {'GUID': '2;3', 'MODEL': 'd'})
+    assert counts == {'added': 1, 'updated': 1, 'duplicates': 0}
+    assert errors == ['line 2: GUIDs are in CAR_1, CAR_2']
+    assert entry_list.get('CAR_0', 'GUID') == '1'
+    assert guid_index(entry_list) == {'1': 'CAR_0', '2': 'CAR_1',
+                                      '3': 'CAR_2'}
+
+
+def test_same_guid_on_two_rows(entry_list):
+    counts, errors = merge(entry_list, {'GUID': '5', 'MODEL': 'c'},
+                           {'GUID': '5', 'SKIN': 'green'})
+    assert errors == []
+    assert counts == {'added': 1, 'updated': 1, 'duplicates': 1}
+    assert entry_list.prefix_sections('CAR') == ['CAR_0', 'CAR_1', 'CAR_2']
+    assert dict(entry_list.items('CAR_2'))['SKIN'] == 'green'
+
+
+def test_invalid_entries_are_skipped(entry_list):
+    counts, errors = merge(entry_list, {'GUID': 'abc'}, {'GUID': '6;6'},
+                           {'BALLAST': 'x'}, 'x', {'GUID': '7'})
+    assert errors == [
+        'line 0.GUID: Invalid value: abc is not a Steam GUID',
+        'line 1.GUID: Invalid value: 6;6 lists the same GUID twice',
+        "line 2.BALLAST: Invalid value: 'x' is not a valid integer.",
+        'line 3: expected a mapping of settings']
+    assert counts == {'added': 1, 'updated': 0, 'duplicates': 0}
+    assert guid_index(entry_list) == {'1': 'CAR_0', '3': 'CAR_0',
+                                      '2': 'CAR_1', '7': 'CAR_2'}
+
+
+@pytest.mark.parametrize('entry_format', ['csv', 'json', 'jsonl'])
+def test_read_what_was_written(entry_list, tmp_path, entry_format):
+    path = str(tmp_path / 'entries.{}'.format(entry_format))
+    with open(path, 'w', newline='') as fh:
+        write_entries(entry_list, fh, entry_format)
+    with open(path, 'r', newline='') as fh:
+        entries = list(read_entries(fh, entry_format))
+    assert [values['GUID'] for _, values in entries] == ['1;3', '2']
+    assert entries[0][1]['SKIN'] == 'red'
+
+
+def environment(directory):
+    options = startup.make_environment(directory)
+    os.makedirs(os.path.join(directory, 'steamapps'))
+    return options
+
+
+def entries_command(options, *args):
+    # acdsc entries in the benchmark environment
+    return sub.run(
+        [sys.executable, startup.script] + options + ['entries'] +
+        list(args), env=dict(os.environ, PYTHONPATH=startup.root),
+        stdout=sub.PIPE, stderr=sub.STDOUT, universal_newlines=True)
+
+
+def write_rows(path, rows):
+    with open(path, 'w', newline='') as fh:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(fh, ['GUID', 'MODEL', 'DRIVERNAME',
+                                         'BALLAST'])
+            writer.writeheader()
+            writer.writerows(rows)
+        elif path.endswith('.jsonl'):
+            fh.writelines('{}\n'.format(json.dumps(row)) for row in rows)
+        else:
+            json.dump(rows, fh)
+
+
+@pytest.mark.parametrize('entry_format', ['csv', 'json', 'jsonl'])
+def test_import_export_round_trip(tmp_path, entry_format):
+    rows = [{'GUID': '1', 'MODEL': 'ks_mazda_mx5_cup', 'DRIVERNAME': 'a',
+             'BALLAST': '10'},
+            {'GUID': '2', 'MODEL': 'ks_mazda_mx5_cup', 'DRIVERNAME': 'b,"c"',
+             'BALLAST': '0'}]
+    source = str(tmp_path / 'rows.{}'.format(entry_format))
+    write_rows(source, rows)
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    options = environment(first)
+    result = entries_command(options, 'import', source)
+    assert result.returncode == 0, result.stdout
+    assert 'Added 2 entries, updated 0' in result.stdout
+    exported = str(tmp_path / 'exported.{}'.format(entry_format))
+    assert entries_command(options, 'export', exported).returncode == 0
+    # the export imported elsewhere gives the same entry list
+    result = entries_command(environment(second), 'import', exported)
+    assert result.returncode == 0, result.stdout
+    entry_lists = [open(os.path.join(directory, 'server', 'cfg',
+                                     'entry_list.ini')).read()
+                   for directory in (first, second)]
+    assert entry_lists[0] == entry_lists[1]
+    parser = make_ac_parser(os.path.join(first, 'server', 'cfg',
+                                         'entry_list.ini'))
+    assert [dict((key, parser.get(section, key)) for key in rows[0])
+            for section in parser.prefix_sections('CAR')] == rows
+
+
+def test_import_dry_run(tmp_path):
+    options = environment(str(tmp_path / 'server_dir'))
+    entry_list = str(tmp_path / 'server_dir' / 'server' / 'cfg' /
+                     'entry_list.ini')
+    source = str(tmp_path / 'rows.csv')
+    write_rows(source, [{'GUID': '1', 'MODEL': 'ks_mazda_mx5_cup'}])
+    assert entries_command(options, 'import', source).returncode == 0
+    with open(entry_list, 'rb') as fh:
+        before = fh.read()
+    write_rows(source, [{'GUID': '1', 'DRIVERNAME': 'a'},
+                        {'GUID': '2', 'MODEL': 'ks_mazda_mx5_cup'},
+                        {'GUID': 'x'}])
+    result = entries_command(options, 'import', '-n', source)
+    assert result.returncode == 1
+    assert 'Would add 1 entries, updated 1' in result.stdout
+    assert 'ERROR: line 4.GUID: Invalid value: x is not a Steam GUID' in \
+        result.stdout
+    with open(entry_list, 'rb') as fh:
+        assert fh.read() == before
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+
+import pytest
+
+from acdsc.fleet import (
+    config_port_keys, config_ports, create_instance, list_instances)
+from acdsc.parser import make_ac_parser
+
+server_cfg = '''[SERVER]
+NAME=template
+UDP_PORT=9600
+TCP_PORT=9600
+HTTP_PORT=8081
+{}'''
+
+
+@pytest.fixture
+def template(tmp_path):
+    def write(plugin=''):
+        config_file = tmp_path / 'server_cfg.ini'
+        config_file.write_text(server_cfg.format(plugin))
+        entry_list = tmp_path / 'entry_list.ini'
+        entry_list.write_text('[CAR_0]\nMODEL=a\n')
+        return str(config_file), str(entry_list)
+    return write
+
+
+def test_config_port_keys(template):
+    config_file, _ = template('UDP_PLUGIN_LOCAL_PORT=11000\n'
+                              'UDP_PLUGIN_ADDRESS=127.0.0.1:12000\n')
+    assert config_port_keys(make_ac_parser(config_file)) == [
+        ('UDP_PORT', 'udp', 9600),
+        ('TCP_PORT', 'tcp', 9600),
+        ('HTTP_PORT', 'udp', 8081),
+        ('HTTP_PORT', 'tcp', 8081),
+        ('UDP_PLUGIN_LOCAL_PORT', 'udp', 11000),
+        ('UDP_PLUGIN_ADDRESS', 'udp', 12000)]
+    # unset or unparseable ports bind nothing
+    config_file, _ = template('UDP_PLUGIN_LOCAL_PORT=0\n'
+                              'UDP_PLUGIN_ADDRESS=\n')
+    parser = make_ac_parser(config_file)
+    parser.set('SERVER', 'TCP_PORT', 'x')
+    assert [key for key, _, _ in config_port_keys(parser)] == [
+        'UDP_PORT', 'HTTP_PORT', 'HTTP_PORT']
+
+
+@pytest.mark.parametrize('plugin', [
+    '',
+    'UDP_PLUGIN_LOCAL_PORT=11000\nUDP_PLUGIN_ADDRESS=127.0.0.1:12000\n'
+])
+def test_instances_get_distinct_ports(tmp_path, template, plugin):
+    instances_dir = str(tmp_path / 'instances')
+    config_file, entry_list = template(plugin)
+    for name in ('a', 'b', 'c'):
+        create_instance(instances_dir, name, config_file, entry_list)
+    instances = list_instances(instances_dir)
+    assert [instance.name for instance in instances] == ['a', 'b', 'c']
+    ports = [config_ports(instance.parser()) for instance in instances]
+    # nothing is shared between the instances nor with the template
+    ports.append(config_ports(make_ac_parser(config_file)))
+    every = [port for found in ports for port in found]
+    assert len(every) == len(set(every))
+    parser = instances[0].parser()
+    assert parser.get('SERVER', 'UDP_PORT') == '9601'
+    assert parser.get('SERVER', 'TCP_PORT') == '9601'
+    assert parser.get('SERVER', 'HTTP_PORT') == '8082'
+    if plugin:
+        assert parser.get('SERVER', 'UDP_PLUGIN_LOCAL_PORT') == '11001'
+        assert parser.get('SERVER', 'UDP_PLUGIN_ADDRESS') == \
+            '127.0.0.1:12001'
+    else:
+        assert not parser.has_option('SERVER', 'UDP_PLUGIN_LOCAL_PORT')
+
+
+def test_ports_used_by_other_instances_are_skipped(tmp_path, template):
+    instances_dir = str(tmp_path / 'instances')
+    config_file, entry_list = template()
+    a = create_instance(instances_dir, 'a', config_file, entry_list)
+    # a was moved by hand onto the game ports the next instance would get,
+    # its HTTP_PORT included
+    parser = a.parser()
+    parser.set('SERVER', 'UDP_PORT', '9602')
+    parser.set('SERVER', 'TCP_PORT', '9602')
+    parser.set('SERVER', 'HTTP_PORT', '9601')
+    with open(a.config_file, 'w') as fh:
+        parser.write(fh)
+    b = create_instance(instances_dir, 'b', config_file, entry_list)
+    parser = b.parser()
+    assert parser.get('SERVER', 'UDP_PORT') == '9603'
+    assert parser.get('SERVER', 'HTTP_PORT') == '8082'
+
+
+def test_create_instance_twice(tmp_path, template):
+    instances_dir = str(tmp_path / 'instances')
+    config_file, entry_list = template()
+    create_instance(instances_dir, 'a', config_file, entry_list)
+    with pytest.raises(FileExistsError):
+        create_instance(instances_dir, 'a', config_file, entry_list)
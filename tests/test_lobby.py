@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from acdsc.lobby import LobbyQuery, ResponseCache
+
+info = {'name': 'test', 'session': 1, 'sessiontypes': [1, 2, 3]}
+cars = {'Cars': [{'DriverName': 'a', 'Model': 'x', 'IsConnected': True},
+                 {'DriverName': '', 'Model': 'y', 'IsConnected': False}]}
+
+
+class Lobby(BaseHTTPRequestHandler):
+    # an acServer lobby endpoint; server.mode decides how it misbehaves
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+        self.served = False
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        mode = server.mode
+        if mode == 'hang':
+            server.release.wait(5)
+            return
+        if mode == 'drop' or (mode == 'stale' and self.served):
+            # closed without an answer, for stale connections after the
+            # client took them from its idle ones
+            self.close_connection = True
+            return
+        self.served = True
+        status = 500 if mode == 'error' else 200
+        if mode == 'garbage':
+            body = b'<html>'
+        elif self.path.startswith('/JSON'):
+            body = json.dumps(cars).encode('utf-8')
+        else:
+            body = json.dumps(info).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', '{}'.format(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if mode == 'closed':
+            # closed although the response says it may be kept alive
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def lobby():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Lobby)
+    httpd.mode = 'ok'
+    httpd.connections = 0
+    httpd.requests = 0
+    httpd.release = threading.Event()
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    httpd.port = '{}'.format(httpd.server_address[1])
+    yield httpd
+    httpd.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def query():
+    lobbies = LobbyQuery(0.5)
+    yield lobbies
+    lobbies.close()
+
+
+def test_query_keeps_connections_alive(lobby, query):
+    for _ in range(3):
+        result, = query.query([lobby.port], with_players=True)
+        assert result['error'] is None
+        assert result['info'] == info
+        assert [player['name'] for player in result['players']] == ['a']
+    # /INFO and /JSON| in parallel, then both connections reused
+    assert lobby.connections == 2
+    assert lobby.requests == 6
+
+
+@pytest.mark.parametrize('mode, requests', [('closed', 3), ('stale', 5)])
+def test_stale_connection_is_retried(lobby, query, mode, requests):
+    lobby.mode = mode
+    for _ in range(3):
+        result, = query.query([lobby.port])
+        assert result['error'] is None
+        assert result['info'] == info
+    assert lobby.connections == 3
+    assert lobby.requests == requests
+
+
+def test_closed_new_connection_is_not_retried(lobby, query):
+    lobby.mode = 'drop'
+    result, = query.query([lobby.port])
+    assert result['error'] == 'connection closed'
+    assert lobby.connections == 1
+
+
+def test_timeout(lobby, query):
+    lobby.mode = 'hang'
+    result, = query.query([lobby.port])
+    assert result['error'] == 'timed out after 0.5s'
+    assert 0.5 <= result['elapsed'] < 1.5
+    # the timed out connection is not kept for the next query
+    lobby.release.set()
+    lobby.mode = 'ok'
+    result, = query.query([lobby.port])
+    assert result['error'] is None
+    assert lobby.connections == 2
+
+
+@pytest.mark.parametrize('mode, error', [
+    ('error', 'HTTP 500'),
+    ('garbage', 'invalid JSON from /INFO')
+])
+def test_bad_responses(lobby, query, mode, error):
+    lobby.mode = mode
+    result, = query.query([lobby.port])
+    assert result['error'] == error
+    assert result['info'] is None
+
+
+def test_one_failure_does_not_hold_up_the_others(lobby, query):
+    results = query.query([lobby.port, '1', None])
+    assert [result['port'] for result in results] == [lobby.port, '1', None]
+    assert results[0]['info'] == info
+    assert results[1]['error']
+    assert results[2]['error'] == 'no HTTP_PORT configured'
+
+
+def test_cached_responses(lobby, tmp_path):
+    cache_file = str(tmp_path / 'lobby.json')
+    lobbies = LobbyQuery(0.5, ResponseCache(cache_file, 60))
+    result, = lobbies.query([lobby.port])
+    assert not result['cached']
+    lobbies.close()
+    lobby.mode = 'error'
+    lobbies = LobbyQuery(0.5, ResponseCache(cache_file, 60))
+    result, = lobbies.query([lobby.port])
+    lobbies.close()
+    assert result['cached']
+    assert result['info'] == info
+    assert lobby.requests == 1
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+from acdsc.logs import RotatingLog, compress, segments, tail_lines
+
+
+def write_lines(path, count, max_bytes):
+    log = RotatingLog(path, max_bytes=max_bytes, keep=100)
+    for number in range(count):
+        log.write('line {}\n'.format(number).encode('ascii'))
+    log.close()
+
+
+def numbers(lines):
+    return [int(line.split()[-1]) for line in lines]
+
+
+def test_tail_reads_rotated_segments(tmp_path):
+    path = str(tmp_path / 'acServer.log')
+    write_lines(path, 50, 200)
+    assert len(segments(path)) > 5
+    assert numbers(tail_lines(path, 20)) == list(range(30, 50))
+    assert numbers(tail_lines(path, 100)) == list(range(50))
+    assert tail_lines(path, 0) == []
+
+
+def test_tail_reads_compressed_segments(tmp_path):
+    path = str(tmp_path / 'acServer.log')
+    write_lines(path, 50, 200)
+    for segment in segments(path)[:-1]:
+        compress(segment)
+    assert all(segment.endswith('.gz') for segment in segments(path)[:-1])
+    assert numbers(tail_lines(path, 45)) == list(range(5, 50))
+
+
+def test_tail_without_log(tmp_path):
+    assert tail_lines(str(tmp_path / 'acServer.log'), 10) == []
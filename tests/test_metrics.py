@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import multiprocessing
+import struct
+import time
+
+from acdsc import metrics
+from acdsc.metrics import RingBuffer, Sample, read_samples
+
+
+def sample(seq):
+    # every field of a sample written as seq tells which write it came from
+    return Sample(float(seq), float(seq), seq, seq, seq, seq, seq, seq, seq)
+
+
+def write_samples(path, capacity, stop):
+    ring = RingBuffer(path, capacity)
+    seq = ring.head
+    while not stop.is_set():
+        ring.append(sample(seq))
+        seq += 1
+    ring.close()
+
+
+def test_read_samples(tmp_path):
+    path = str(tmp_path / 'acds.metrics')
+    ring = RingBuffer(path, 4)
+    for seq in range(6):
+        ring.append(sample(seq))
+    ring.close()
+    # the oldest slot is the next one to be overwritten
+    assert [found.rss for found in read_samples(path)] == [3, 4, 5]
+    assert [found.rss for found in read_samples(path, 4.0)] == [4, 5]
+    assert read_samples(str(tmp_path / 'missing')) == []
+
+
+def consecutive(samples):
+    # every sample whole and in order
+    seqs = [found.rss for found in samples]
+    return (all(len(set(found)) == 1 for found in samples) and
+            seqs == list(range(seqs[0], seqs[0] + len(seqs))))
+
+
+def test_record_in_flight_is_not_returned(tmp_path, monkeypatch):
+    path = str(tmp_path / 'acds.metrics')
+    ring = RingBuffer(path, 4)
+    for seq in range(7):
+        ring.append(sample(seq))
+    # the writer is half way through seq 7: its sequence number is in
+    # place, the rest of the record is still seq 3
+    offset = metrics.header.size + 7 % 4 * metrics.record.size
+    struct.pack_into('<Q', ring.map, offset, 7)
+
+    class Head(object):
+        # the writer completes seq 7 and moves the head right before the
+        # reader first looks at it
+        def __init__(self, real):
+            self.real = real
+            self.calls = 0
+
+        def unpack_from(self, buffer, offset):
+            if not self.calls:
+                self.calls += 1
+                ring.append(sample(7))
+            return self.real.unpack_from(buffer, offset)
+
+        def pack_into(self, *args):
+            self.real.pack_into(*args)
+    monkeypatch.setattr(metrics, 'head', Head(metrics.head))
+    samples = read_samples(path)
+    ring.close()
+    assert consecutive(samples)
+    assert samples[-1].rss == 7
+
+
+def test_no_torn_samples_with_concurrent_writer(tmp_path):
+    path = str(tmp_path / 'acds.metrics')
+    RingBuffer(path, 4).close()
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    writer = context.Process(target=write_samples, args=(path, 4, stop))
+    writer.start()
+    try:
+        reads = 0
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            samples = read_samples(path)
+            if samples:
+                assert consecutive(samples), samples
+                reads += 1
+        assert reads
+    finally:
+        stop.set()
+        writer.join(5)
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+import os
+
+import pytest
+
+from acdsc.fleet import Instance
+from acdsc.overlay import (
+    build_overlay, overlay_source, read_manifest, rebuild_overlay,
+    verify_overlay)
+
+install = {
+    'acServer': '#!/bin/sh\n',
+    'content/cars/ks_mazda_mx5_cup/data.acd': 'car',
+    'content/tracks/ks_vallelunga/models.ini': 'track',
+    'system/data/surfaces.ini': 'surfaces',
+    'cfg/server_cfg.ini': '[SERVER]\n',
+    'results/2024_5_1_20_30_RACE.json': '{}',
+    'logs/server.log': 'log'
+}
+
+
+@pytest.fixture
+def live(tmp_path):
+    # a fake install with the private directories of the live server
+    live = str(tmp_path / 'acds')
+    for path, text in install.items():
+        os.makedirs(os.path.join(live, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(live, path), 'w') as fh:
+            fh.write(text)
+    os.symlink('acServer', os.path.join(live, 'acServer.link'))
+    return live
+
+
+@pytest.fixture
+def instance(tmp_path):
+    instance = Instance(str(tmp_path / 'instances'), 'a')
+    os.makedirs(os.path.dirname(instance.config_file))
+    with open(instance.config_file, 'w') as fh:
+        fh.write('[SERVER]\nNAME=a\n')
+    return instance
+
+
+def test_shared_files_are_linked(live, instance):
+    linked, copied, _ = build_overlay(instance, live)
+    assert (linked, copied) == (4, 0)
+    server = instance.server_path
+    for path in install:
+        if path.split('/')[0] in ('cfg', 'results', 'logs'):
+            continue
+        stat = os.stat(os.path.join(server, path))
+        assert stat.st_ino == os.stat(os.path.join(live, path)).st_ino
+        assert stat.st_nlink == 2
+    assert os.readlink(os.path.join(server, 'acServer.link')) == 'acServer'
+    # the private directories are the instance's own
+    assert os.readlink(os.path.join(server, 'cfg')) == os.path.join(
+        '..', 'cfg')
+    assert os.path.samefile(os.path.join(server, 'cfg', 'server_cfg.ini'),
+                            instance.config_file)
+    assert os.listdir(os.path.join(server, 'results')) == []
+    assert not os.path.exists(os.path.join(server, 'logs'))
+    assert overlay_source(instance) == os.path.realpath(live)
+    assert sorted(read_manifest(instance)['files']) == [
+        'acServer', 'content/cars/ks_mazda_mx5_cup/data.acd',
+        'content/tracks/ks_vallelunga/models.ini',
+        'system/data/surfaces.ini']
+    assert verify_overlay(instance, live) == []
+
+
+def test_rebuild_keeps_results(live, instance):
+    build_overlay(instance, live)
+    result = os.path.join(instance.server_path, 'results', 'race.json')
+    with open(result, 'w') as fh:
+        fh.write('{}')
+    with open(os.path.join(live, 'system', 'new.ini'), 'w') as fh:
+        fh.write('new')
+    rebuild_overlay({'b': instance}, live, 'a')
+    assert not os.path.exists(
+        os.path.join(instance.server_path, 'system', 'new.ini'))
+    rebuild_overlay({'a': instance}, live, 'a')
+    assert os.path.exists(
+        os.path.join(instance.server_path, 'system', 'new.ini'))
+    assert os.path.exists(result)
+    assert not os.path.exists('{}.new'.format(instance.server_path))
+    assert not os.path.exists('{}.old'.format(instance.server_path))
+    assert verify_overlay(instance, live) == []
+
+
+def test_shared_file_modified_in_place(live, instance):
+    build_overlay(instance, live)
+    path = 'system/data/surfaces.ini'
+    with open(os.path.join(live, path), 'a') as fh:
+        fh.write('changed')
+    assert verify_overlay(instance, live) == [
+        ('error', path, 'shared file modified in place (2 links)')]
+
+
+def test_files_replaced_or_missing(live, instance):
+    build_overlay(instance, live)
+    server = instance.server_path
+    os.remove(os.path.join(server, 'acServer'))
+    replaced = os.path.join(server, 'system', 'data', 'surfaces.ini')
+    os.remove(replaced)
+    with open(replaced, 'w') as fh:
+        fh.write('surfaces')
+    # an update replaces files of the live install, the overlay still links
+    # the previous ones
+    car = 'content/cars/ks_mazda_mx5_cup/data.acd'
+    os.remove(os.path.join(live, car))
+    with open(os.path.join(live, car), 'w') as fh:
+        fh.write('updated car')
+    assert verify_overlay(instance, live) == [
+        ('error', 'acServer', 'missing'),
+        ('error', 'system/data/surfaces.ini', 'replaced in the overlay'),
+        ('warning', server, '1 file(s) differ from the live install {} '
+         '(rebuild the overlay)'.format(live))]
+
+
+def test_without_manifest(instance):
+    assert verify_overlay(instance, '/nonexistent') == [
+        ('error', instance.server_path, 'no overlay manifest')]
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+import configparser
+import os
+import stat
+
+import pytest
+
+from acdsc.parser import (
+    ACParser, make_ac_parser, render_ac_parser, split_section, to_ini,
+    write_ac_parser)
+
+
+def test_write_keeps_permissions(tmp_path):
+    config_file = str(tmp_path / 'server_cfg.ini')
+    with open(config_file, 'w') as fh:
+        fh.write('[SERVER]\nNAME=a\n')
+    os.chmod(config_file, 0o640)
+    parser = make_ac_parser(config_file)
+    parser.set('SERVER', 'NAME', 'b')
+    write_ac_parser(parser, config_file)
+    assert stat.S_IMODE(os.stat(config_file).st_mode) == 0o640
+    assert make_ac_parser(config_file).get('SERVER', 'NAME') == 'b'
+    assert os.listdir(str(tmp_path)) == ['server_cfg.ini']
+
+
+entry_list = '''[CAR_0]
+MODEL=a
+SKIN=red
+
+[CAR_10]
+MODEL=c
+SKIN=
+
+[CAR_2]
+MODEL=b
+SKIN=blue
+
+[SERVER_NOTES]
+TEXT=not numbered
+
+'''
+
+
+def parse(text):
+    parser = ACParser()
+    parser.read_string(text)
+    return parser
+
+
+def indexed(parser, prefix):
+    # the sections of prefix listed without the index
+    return sorted((section for section in parser.sections()
+                   if split_section(section) is not None and
+                   split_section(section)[0] == prefix),
+                  key=lambda section: split_section(section)[1])
+
+
+def test_prefix_sections_are_in_numeric_order():
+    parser = parse(entry_list)
+    assert parser.prefix_sections('CAR') == ['CAR_0', 'CAR_2', 'CAR_10']
+    assert parser.prefix_sections('SERVER') == []
+    assert parser.prefix_sections('SERVER_NOTES') == []
+
+
+def test_gaps_and_missing_prefixes():
+    parser = parse('[CAR_0]\n\n[CAR_2]\n')
+    assert parser.next_section('CAR') == 'CAR_3'
+    assert parser.next_section('WEATHER') == 'WEATHER_0'
+    assert parser.prefix_sections('WEATHER') == []
+
+
+def test_index_follows_adds_and_removes():
+    parser = parse(entry_list)
+    for section in ('CAR_5', 'WEATHER_1', 'CAR_11', 'WEATHER_0', 'CAR_1'):
+        parser.add_section(section)
+    for section in ('CAR_10', 'WEATHER_1', 'CAR_0'):
+        assert parser.remove_section(section)
+    assert not parser.remove_section('CAR_10')
+    assert not parser.remove_section('CAR_99')
+    for prefix in ('CAR', 'WEATHER'):
+        assert parser.prefix_sections(prefix) == indexed(parser, prefix)
+    assert parser.prefix_sections('CAR') == ['CAR_1', 'CAR_2', 'CAR_5',
+                                             'CAR_11']
+    assert parser.next_section('CAR') == 'CAR_12'
+    # the last section removed and added again
+    parser.remove_section('CAR_11')
+    assert parser.next_section('CAR') == 'CAR_6'
+    parser.add_section('CAR_11')
+    assert parser.prefix_sections('CAR')[-1] == 'CAR_11'
+    assert parser.next_section('CAR') == 'CAR_12'
+    with pytest.raises(configparser.DuplicateSectionError):
+        parser.add_section('CAR_11')
+    assert parser.prefix_sections('CAR') == indexed(parser, 'CAR')
+    # reading again rebuilds the index from the sections
+    parser.read_string('[CAR_20]\n')
+    assert parser.prefix_sections('CAR') == indexed(parser, 'CAR')
+    assert parser.next_section('CAR') == 'CAR_21'
+
+
+def test_unchanged_file_is_written_as_read(tmp_path):
+    config_file = tmp_path / 'entry_list.ini'
+    config_file.write_bytes(entry_list.encode('utf-8'))
+    parser = make_ac_parser(str(config_file))
+    assert render_ac_parser(parser).encode('utf-8') == entry_list.encode(
+        'utf-8')
+    parser.add_section('CAR_11')
+    parser.remove_section('CAR_11')
+    write_ac_parser(parser, str(config_file))
+    assert config_file.read_bytes() == entry_list.encode('utf-8')
+
+
+def test_to_ini():
+    assert to_ini(('max-clients', 12)) == ('MAX_CLIENTS', '12')
+    assert to_ini(('name', 'ä server')) == ('NAME', 'ä server')
+    assert to_ini(('skin', None)) == ('SKIN', None)
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+import json
+import os
+import subprocess as sub
+import sys
+
+import pytest
+
+from acdsc.parser import make_ac_parser
+from acdsc.plan import PlanError, apply_plan, validate_plan
+from benchmarks import startup
+
+server_cfg = '''[SERVER]
+NAME=test
+MAX_CLIENTS=10
+
+[PRACTICE]
+NAME=Free Practice
+TIME=10
+IS_OPEN=1
+
+[WEATHER_0]
+GRAPHICS=3_clear
+
+[WEATHER_1]
+GRAPHICS=7_heavy_clouds
+'''
+entry_list = '''[CAR_0]
+MODEL=a
+SKIN=red
+
+[CAR_1]
+MODEL=b
+SKIN=blue
+'''
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = {'config-file': str(tmp_path / 'server_cfg.ini'),
+              'entry-list': str(tmp_path / 'entry_list.ini')}
+    with open(config['config-file'], 'w') as fh:
+        fh.write(server_cfg)
+    with open(config['entry-list'], 'w') as fh:
+        fh.write(entry_list)
+    config['parser'] = make_ac_parser(config['config-file'])
+    config['entry-parser'] = make_ac_parser(config['entry-list'])
+    return config
+
+
+def test_every_error_is_listed(config):
+    plan = {
+        'server': {'max-clients': 'many', 'NO_SUCH_KEY': 1},
+        'sessions': {'practice': {'time': -1}, 'warmup': {},
+                     'qualify': None},
+        'weather': {'set': {'5': {'graphics': 'x'}}, 'remove': [7],
+                    'rename': {}},
+        'entries': {'add': [{'ballast': 'heavy'}]},
+        'tracks': {}
+    }
+    with pytest.raises(PlanError) as err:
+        validate_plan(plan, config)
+    errors = err.value.errors
+    assert len(errors) == 11, errors
+    assert 'plan: unknown section tracks' in errors
+    assert 'server: unknown setting NO_SUCH_KEY' in errors
+    assert 'sessions: unknown session WARMUP' in errors
+    assert 'sessions: QUALIFY does not exist' in errors
+    assert 'weather: WEATHER_5 does not exist' in errors
+    assert 'weather: WEATHER_7 does not exist' in errors
+    assert 'weather: unknown operation rename' in errors
+    assert sorted(error.split(': ')[0] for error in errors
+                  if '.' in error.split(': ')[0]) == [
+        'entries.add.0.BALLAST', 'server.MAX_CLIENTS',
+        'sessions.PRACTICE.TIME', 'weather.set.5.GRAPHICS']
+    # nothing was applied
+    assert config['parser'].get('SERVER', 'MAX_CLIENTS') == '10'
+
+
+def test_sections_set_add_remove(config):
+    checked = validate_plan({
+        'server': {'name': 'planned'},
+        'weather': {'set': {'1': {'graphics': '1_heavy_fog'}},
+                    'remove': [0],
+                    'add': [{'graphics': '4_mid_clear'}]},
+        'entries': {'set': {'0': {'skin': 'blue'}},
+                    'remove': [1],
+                    'add': [{'model': 'c'}, {'model': 'd', 'ballast': 20}]}
+    }, config)
+    apply_plan(checked, config)
+    parser, entries = config['parser'], config['entry-parser']
+    assert parser.get('SERVER', 'NAME') == 'planned'
+    assert parser.prefix_sections('WEATHER') == ['WEATHER_1', 'WEATHER_2']
+    assert parser.get('WEATHER_1', 'GRAPHICS') == '1_heavy_fog'
+    assert parser.get('WEATHER_2', 'GRAPHICS') == '4_mid_clear'
+    # added sections are filled in with the defaults
+    assert parser.has_option('WEATHER_2', 'BASE_TEMPERATURE_AMBIENT')
+    assert entries.prefix_sections('CAR') == ['CAR_0', 'CAR_1', 'CAR_2']
+    assert entries.get('CAR_0', 'SKIN') == 'blue'
+    assert [entries.get(section, 'MODEL') for section in
+            entries.prefix_sections('CAR')] == ['a', 'c', 'd']
+    assert entries.get('CAR_2', 'BALLAST') == '20'
+    assert entries.get('CAR_1', 'BALLAST') == '0'
+
+
+def test_sessions(config):
+    checked = validate_plan({'sessions': {'practice': None,
+                                          'race': {'laps': 12}}}, config)
+    apply_plan(checked, config)
+    parser = config['parser']
+    assert not parser.has_section('PRACTICE')
+    assert parser.get('RACE', 'LAPS') == '12'
+    assert parser.get('RACE', 'NAME') == 'Race'
+
+
+def test_dry_run_leaves_files_untouched(tmp_path):
+    options = startup.make_environment(str(tmp_path))
+    os.makedirs(str(tmp_path / 'steamapps'))
+    cfg = tmp_path / 'server' / 'cfg'
+    before = [(cfg / name).read_bytes()
+              for name in ('server_cfg.ini', 'entry_list.ini')]
+    plan_file = tmp_path / 'plan.json'
+    plan_file.write_text(json.dumps({
+        'server': {'name': 'planned'},
+        'entries': {'add': [{'model': 'ks_mazda_mx5_cup'}]}}))
+    command = [sys.executable, startup.script] + options + [
+        'apply', '-n', str(plan_file)]
+    result = sub.run(command, env=dict(os.environ, PYTHONPATH=startup.root),
+                     stdout=sub.PIPE, universal_newlines=True)
+    assert result.returncode == 0
+    assert '+NAME=planned' in result.stdout
+    assert '+[CAR_0]' in result.stdout
+    assert [(cfg / name).read_bytes()
+            for name in ('server_cfg.ini', 'entry_list.ini')] == before
+    result = sub.run(command[:-2] + [str(plan_file)],
+                     env=dict(os.environ, PYTHONPATH=startup.root),
+                     stdout=sub.PIPE, universal_newlines=True)
+    assert result.returncode == 0
+    assert make_ac_parser(str(cfg / 'server_cfg.ini')).get(
+        'SERVER', 'NAME') == 'planned'
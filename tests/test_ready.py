@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+import socket
+import sys
+
+import pytest
+
+from acdsc import ready, supervisor
+from acdsc.daemon import ACDaemon, stop_daemons
+from acdsc.ready import start_servers
+from test_supervisor import stub_acserver
+
+# an acServer (its cwd is the server path) logging when it starts and when
+# it listens on the TCP_PORT of the configuration given with -c
+listen = '''
+name=$(basename $(dirname "$2"))
+echo "start $name" >> events
+{}
+echo "listen $name" >> events
+exec {} -c "import socket, sys, time
+sock = socket.socket()
+sock.bind(('127.0.0.1', int(sys.argv[1])))
+sock.listen()
+time.sleep(60)" $(sed -n 's/^TCP_PORT=//p' "$2")
+'''
+
+
+@pytest.fixture(autouse=True)
+def fast(monkeypatch):
+    # the daemons are forked from the tests and keep their settings,
+    # daemonize redirects the standard streams pytest has replaced
+    for stream in ('stdin', 'stdout', 'stderr'):
+        monkeypatch.setattr(sys, stream, getattr(sys, '__{}__'.format(
+            stream)))
+    monkeypatch.setattr(supervisor, 'backoff', 0.01)
+    monkeypatch.setattr(supervisor, 'max_backoff', 0.04)
+    monkeypatch.setattr(supervisor, 'crash_loop', 3)
+    monkeypatch.setattr(ready, 'poll_interval', 0.02)
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def servers(tmp_path):
+    # (name, config) targets sharing the server in tmp_path, stopped when
+    # the test is done
+    targets = []
+
+    def make(names, script, udp=False):
+        stub_acserver(tmp_path, script)
+        for name in names:
+            directory = tmp_path / name
+            directory.mkdir()
+            (directory / 'server_cfg.ini').write_text(
+                '[SERVER]\nTCP_PORT={}\nUDP_PORT={}\nHTTP_PORT=0\n'.format(
+                    free_port(), free_port(socket.SOCK_DGRAM) if udp else 0))
+            (directory / 'entry_list.ini').write_text('')
+            targets.append((name, {
+                'server-path': str(tmp_path),
+                'config-file': str(directory / 'server_cfg.ini'),
+                'entry-list': str(directory / 'entry_list.ini'),
+                'pidfile': str(directory / 'acds.pid'),
+                'log-dir': str(directory / 'logs')}))
+        return list(targets)
+
+    yield make
+    stop_daemons([ACDaemon(config) for _, config in targets], 1)
+
+
+def events(tmp_path):
+    return (tmp_path / 'events').read_text().split('\n')[:-1]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_jobs_limit_concurrent_starts(tmp_path, servers, jobs):
+    targets = servers(['a', 'b', 'c'],
+                      listen.format('sleep 0.3', sys.executable))
+    results = list(start_servers(targets, jobs, 10))
+    assert [name for name, _, _ in results] == ['a', 'b', 'c']
+    assert [error for _, _, error in results] == [None, None, None]
+    assert all(elapsed >= 0.3 for _, elapsed, _ in results)
+    if jobs == 1:
+        # each server is started once the previous one is ready
+        assert events(tmp_path) == ['start a', 'listen a', 'start b',
+                                    'listen b', 'start c', 'listen c']
+    else:
+        assert events(tmp_path)[:2] == ['start a', 'start b']
+        assert events(tmp_path).index('start c') > 2
+
+
+def test_timeout_reports_pending_probes(tmp_path, servers):
+    targets = servers(['a'], listen.format('sleep 60', sys.executable),
+                      udp=True)
+    assert list(start_servers(targets, 1, 0.5)) == [
+        ('a', None, 'not ready after 0.5s (no TCP_PORT, UDP_PORT)')]
+    assert events(tmp_path) == ['start a']
+
+
+def test_crashed_server_fails(tmp_path, servers):
+    targets = servers(['a', 'b'], 'exit 3')
+    results = list(start_servers(targets, 2, 10))
+    assert sorted(name for name, _, _ in results) == ['a', 'b']
+    for name, elapsed, error in results:
+        assert elapsed is None
+        assert error.startswith('acServer crashed after ')
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+import pytest
+
+from acdsc import plugin
+from acdsc.relay import Relay
+
+car_update = bytes([plugin.CAR_UPDATE]) + bytes(plugin.car_update.size)
+chat = bytes([plugin.CHAT, 3, 1]) + 'x'.encode('utf-32-le')
+
+
+def make_relay(on_event=None):
+    return Relay(('127.0.0.1', 0), ('127.0.0.1', 0), [], on_event=on_event)
+
+
+def test_packets_are_counted_without_decoding(monkeypatch):
+    def decode(packet):
+        raise AssertionError('decoded')
+    monkeypatch.setattr(plugin, 'decode', decode)
+    relay = make_relay()
+    for packet in [car_update, car_update, chat, bytes([99])]:
+        relay.packet(packet)
+    assert relay.stats()['packets'] == {'car_update': 2, 'chat': 1, '99': 1}
+    assert relay.invalid == 0
+
+
+def test_short_packets_are_invalid():
+    relay = make_relay()
+    for packet in [b'', car_update[:-1], bytes([plugin.CHAT, 3])]:
+        relay.packet(packet)
+    assert relay.invalid == 3
+    assert relay.stats()['packets'] == {}
+
+
+def test_events_are_decoded_except_car_updates():
+    events = []
+    relay = make_relay(lambda kind, event: events.append((kind, event)))
+    for packet in [car_update, chat, car_update]:
+        relay.packet(packet)
+    assert events == [(plugin.CHAT, plugin.Chat(3, 'x'))]
+    assert relay.stats()['packets'] == {'car_update': 2, 'chat': 1}
+
+
+@pytest.mark.parametrize('kind', sorted(plugin.min_lengths))
+def test_shortest_packets_decode(kind):
+    packet = bytes([kind]) + bytes(plugin.min_lengths[kind] - 1)
+    assert plugin.decode(packet)[0] == kind
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+from acdsc.results import (
+    best_laps, consistency, ingest_results, leaderboard, open_db, schema,
+    session_ended)
+
+race = '2024_5_1_20_30_RACE.json'
+practice = '2024_5_1_19_45_PRACTICE.json'
+
+
+def lap(guid, lap_time, cuts=0, car='ks_mazda_mx5_cup'):
+    return {'DriverGuid': guid, 'DriverName': 'driver {}'.format(guid),
+            'CarModel': car, 'LapTime': lap_time, 'Cuts': cuts,
+            'Tyre': 'SM', 'Sectors': [lap_time // 2, lap_time // 2]}
+
+
+def session(kind, laps):
+    return {'TrackName': 'ks_vallelunga', 'TrackConfig': 'club_circuit',
+            'Type': kind, 'Laps': laps,
+            'Result': [{'DriverGuid': '1', 'DriverName': 'driver 1',
+                        'CarModel': 'ks_mazda_mx5_cup', 'BestLap': 70000,
+                        'TotalTime': 420000},
+                       {'DriverGuid': '9', 'BestLap': 999999999}]}
+
+
+def write(path, data):
+    with open(path, 'w') as fh:
+        json.dump(data, fh)
+
+
+@pytest.fixture
+def results(tmp_path):
+    directory = str(tmp_path / 'results')
+    os.makedirs(directory)
+    # 1 is fast and steady, 2 slower with a spin, 3 cuts its best lap
+    write(os.path.join(directory, race), session('RACE', [
+        lap('1', 70000), lap('1', 70400), lap('1', 70200), lap('1', 70100),
+        lap('1', 70300), lap('2', 71000), lap('2', 73000), lap('2', 71500),
+        lap('2', 72000), lap('2', 71200), lap('2', 90000),
+        lap('3', 69000, cuts=1), lap('3', 72500)]))
+    write(os.path.join(directory, practice), session('PRACTICE', [
+        lap('1', 69800, car='ks_bmw_m235i_racing'), lap('3', 72000),
+        {'DriverGuid': '4', 'LapTime': 0}]))
+    db = open_db(str(tmp_path / 'results.db'))
+    yield db, directory
+    db.close()
+
+
+def count(db, table):
+    return db.execute('SELECT COUNT(*) FROM {}'.format(table)).fetchone()[0]
+
+
+def test_session_ended():
+    assert session_ended('/r/{}'.format(race), 1.0) == time.mktime(
+        (2024, 5, 1, 20, 30, 0, 0, 0, -1))
+    assert session_ended('/r/race.json', 1.0) == 1.0
+
+
+def test_ingest_once(results):
+    db, directory = results
+    assert ingest_results(db, [directory]) == (2, 15, 0)
+    assert count(db, 'sessions') == 2
+    assert count(db, 'results') == 4
+    # unchanged files are not read again
+    assert ingest_results(db, [directory]) == (0, 0, 0)
+    assert count(db, 'laps') == 15
+
+
+def test_changed_file_replaces_its_rows(results):
+    db, directory = results
+    ingest_results(db, [directory])
+    path = os.path.join(directory, practice)
+    write(path, session('PRACTICE', [lap('5', 75000)]))
+    os.utime(path, ns=(0, 0))
+    assert ingest_results(db, [directory]) == (1, 1, 0)
+    assert count(db, 'files') == 2
+    assert count(db, 'sessions') == 2
+    assert count(db, 'results') == 4
+    assert count(db, 'laps') == 14
+    assert [row['guid'] for row in leaderboard(
+        db, track='ks_vallelunga', session_type='PRACTICE')] == ['5']
+
+
+def test_unreadable_files_are_skipped(results):
+    db, directory = results
+    with open(os.path.join(directory, 'broken.json'), 'w') as fh:
+        fh.write('{')
+    write(os.path.join(directory, 'other.json'), {'Type': 'RACE'})
+    assert ingest_results(db, [directory, '/nonexistent']) == (2, 15, 2)
+
+
+def test_queries(results):
+    db, directory = results
+    ingest_results(db, [directory])
+    found = leaderboard(db, track='ks_vallelunga')
+    assert [(row['guid'], row['best_lap'], row['laps'])
+            for row in found] == [('1', 69800, 6), ('2', 71000, 6),
+                                  ('3', 72000, 2)]
+    # name and car of the best lap
+    assert found[0]['car'] == 'ks_bmw_m235i_racing'
+    assert [row['guid'] for row in leaderboard(
+        db, track='ks_vallelunga', car='ks_mazda_mx5_cup')] == ['1', '2', '3']
+    assert leaderboard(db, track='monza') == []
+    laps = best_laps(db, track='ks_vallelunga', limit=3)
+    assert [row['lap_time'] for row in laps] == [69800, 70000, 70100]
+    assert laps[0]['ended'] == session_ended(practice, 0)
+    assert json.loads(laps[1]['sectors']) == [35000, 35000]
+    # the practice ended before the race, the cut lap never counts
+    assert [row['lap_time'] for row in best_laps(
+        db, track='ks_vallelunga', guid='3',
+        since=session_ended(race, 0))] == [72500]
+    # the spin of 2 is left out, 3 has too few laps
+    found = consistency(db, track='ks_vallelunga', session_type='RACE')
+    assert [(row['guid'], row['laps']) for row in found] == [
+        ('1', 5), ('2', 5)]
+    assert found[0]['stddev'] == pytest.approx(141.42, abs=0.01)
+    assert found[0]['average'] == 70200
+
+
+def test_older_databases_are_migrated(tmp_path):
+    path = str(tmp_path / 'old.db')
+    db = sqlite3.connect(path)
+    # the time of a session was stored as started
+    db.executescript(schema.replace('ended', 'started'))
+    db.execute("INSERT INTO files VALUES (1, '/r/race.json', 1, 1, 1)")
+    db.execute("INSERT INTO sessions VALUES (1, 1, 1.5, 'monza', '', "
+               "'RACE')")
+    db.commit()
+    db.close()
+    db = open_db(path)
+    try:
+        for table in ('sessions', 'laps'):
+            assert 'ended' in [row[1] for row in db.execute(
+                'PRAGMA table_info({})'.format(table))]
+        assert db.execute('SELECT ended FROM sessions').fetchall() == [
+            (1.5,)]
+    finally:
+        db.close()
+    # opened again nothing is left to migrate
+    open_db(path).close()
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+
+import json
+import os
+import stat
+
+import pytest
+
+from acdsc.parser import make_ac_parser
+from acdsc.plan import PlanError
+from acdsc.schedule import (
+    load_schedule, parse_time, pending_events, render_events, swap_in)
+
+server_cfg = '''[SERVER]
+NAME=test
+CARS=a
+MAX_CLIENTS=10
+
+[WEATHER_0]
+GRAPHICS=3_clear
+'''
+entry_list = '[CAR_0]\nMODEL=a\nSKIN=red\n'
+
+
+@pytest.fixture
+def config(tmp_path):
+    server_path = str(tmp_path / 'server')
+    os.makedirs(os.path.join(server_path, 'cfg'))
+    config = {'server-path': server_path,
+              'cache-dir': str(tmp_path / 'cache'),
+              'config-file': os.path.join(server_path, 'cfg',
+                                          'server_cfg.ini'),
+              'entry-list': os.path.join(server_path, 'cfg',
+                                         'entry_list.ini')}
+    with open(config['config-file'], 'w') as fh:
+        fh.write(server_cfg)
+    with open(config['entry-list'], 'w') as fh:
+        fh.write(entry_list)
+    return config
+
+
+def write_schedule(tmp_path, events):
+    schedule_file = str(tmp_path / 'schedule.json')
+    with open(schedule_file, 'w') as fh:
+        json.dump({'events': events}, fh)
+    return schedule_file
+
+
+def test_load_schedule(tmp_path):
+    events = load_schedule(write_schedule(tmp_path, [
+        {'plan': 'gt3-monza.json', 'at': '2026-10-20 20:00'},
+        {'name': 'mx5', 'plan': {}, 'after': 'race'},
+        {'plan': {}}]))
+    assert [(event['name'], event['at'], event['after'])
+            for event in events] == [
+        ('gt3-monza', parse_time('2026-10-20T20:00'), None),
+        ('mx5', None, 'race'),
+        ('event2', None, None)]
+    assert events[0]['plan'] == str(tmp_path / 'gt3-monza.json')
+
+
+def test_load_schedule_errors(tmp_path):
+    with pytest.raises(PlanError) as err:
+        load_schedule(write_schedule(tmp_path, [
+            {'plan': {}, 'at': '2026-10-20 20:00', 'after': 'race'},
+            {'plan': {}, 'at': 'tonight'},
+            {'plan': {}, 'at': '2026-13-01 20:00', 'after': 'qualify'},
+            {'name': 'no plan'},
+            {'plan': {}, 'when': 'now'}]))
+    assert err.value.errors == [
+        'events.0: at and after are exclusive',
+        'events.1.at: tonight is not a time (e.g. 2026-10-20 20:00)',
+        'events.2.at: 2026-13-01 20:00 is not a time '
+        '(e.g. 2026-10-20 20:00)',
+        'events.2.after: expected one of race',
+        'events.3: expected a mapping with a plan',
+        'events.4: unknown key when']
+    with pytest.raises(PlanError) as err:
+        load_schedule(write_schedule(tmp_path, []))
+    assert err.value.errors == ['{}: expected a list of events'.format(
+        tmp_path / 'schedule.json')]
+
+
+def test_pending_events():
+    events = [{'name': name, 'at': at} for name, at in
+              [('a', None), ('b', 100), ('c', 200), ('d', None),
+               ('e', 300)]]
+    # of the events whose time has passed only the last one is switched to
+    assert [event['name'] for event in pending_events(events, 50)] == [
+        'a', 'b', 'c', 'd', 'e']
+    assert [event['name'] for event in pending_events(events, 100)] == [
+        'b', 'c', 'd', 'e']
+    assert [event['name'] for event in pending_events(events, 250)] == [
+        'c', 'd', 'e']
+    assert [event['name'] for event in pending_events(events[-1:], 999)] == [
+        'e']
+
+
+def test_events_build_on_each_other(tmp_path, config):
+    events = render_events([
+        {'name': 'a', 'plan': {'server': {'name': 'first'}}},
+        {'name': 'b', 'plan': {'server': {'max-clients': 4},
+                               'entries': {'set': {'0': {'skin': 'blue'}}}}}
+    ], config, 'default', [], str(tmp_path / 'rendered'))
+    assert events[1]['config-file'] == str(
+        tmp_path / 'rendered' / '01-b' / 'server_cfg.ini')
+    parser = make_ac_parser(events[1]['config-file'])
+    assert parser.get('SERVER', 'NAME') == 'first'
+    assert parser.get('SERVER', 'MAX_CLIENTS') == '4'
+    assert make_ac_parser(events[0]['entry-list']).get(
+        'CAR_0', 'SKIN') == 'red'
+    assert make_ac_parser(events[1]['entry-list']).get(
+        'CAR_0', 'SKIN') == 'blue'
+    # the live configuration is left alone
+    assert make_ac_parser(config['config-file']).get(
+        'SERVER', 'NAME') == 'test'
+
+
+def test_render_stops_on_an_invalid_event(tmp_path, config):
+    directory = str(tmp_path / 'rendered')
+    with pytest.raises(PlanError) as err:
+        render_events([
+            {'name': 'a', 'plan': {'server': {'name': 'first'}}},
+            {'name': 'b', 'plan': {'weather': {'remove': [7]}}},
+            {'name': 'c', 'plan': {'weather': {'remove': [8]}}},
+            {'name': 'd', 'plan': str(tmp_path / 'missing.json')}
+        ], config, 'default', [], directory)
+    assert err.value.errors == ['01-b: weather: WEATHER_7 does not exist']
+    assert sorted(os.listdir(directory)) == ['00-a', '01-b']
+
+
+def test_swap_in(tmp_path, config):
+    event = render_events(
+        [{'name': 'a', 'plan': {'server': {'name': 'swapped'}}}],
+        config, 'default', [], str(tmp_path / 'rendered'))[0]
+    os.chmod(config['config-file'], 0o640)
+    swap_in(event, config)
+    for key in ('config-file', 'entry-list'):
+        with open(config[key], 'rb') as fh, open(event[key], 'rb') as other:
+            assert fh.read() == other.read()
+    assert stat.S_IMODE(os.stat(config['config-file']).st_mode) == 0o640
+    assert sorted(os.listdir(os.path.dirname(config['config-file']))) == [
+        'entry_list.ini', 'server_cfg.ini']
+
+
+def test_render_stops_on_an_event_failing_validation(tmp_path, config):
+    directory = str(tmp_path / 'rendered')
+    with pytest.raises(PlanError) as err:
+        render_events([
+            {'name': 'a', 'plan': {'entries': {'set': {'0': {'model': 'z'}}}}},
+            {'name': 'b', 'plan': {'weather': {'remove': [7]}}}
+        ], config, 'default', [], directory)
+    assert len(err.value.errors) == 1
+    assert err.value.errors[0].startswith('00-a: error: default: ')
+    assert err.value.errors[0].endswith('z is not in CARS')
+    assert os.listdir(directory) == ['00-a']
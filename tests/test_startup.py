@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+
+import pytest
+
+from benchmarks import startup
+
+# The light commands must not import heavy modules. Their wall-clock budgets
+# are left to benchmarks/startup.py, timings are too noisy for tests
+
+
+@pytest.fixture(scope='module')
+def options(tmp_path_factory):
+    return startup.make_environment(str(tmp_path_factory.mktemp('acds')))
+
+
+def test_import():
+    _, code, modules = startup.run([], 'acdsc_cli')
+    assert code == 0
+    assert 'acdsc.settings' in modules
+    assert startup.heavy_imports('import', modules) == []
+
+
+@pytest.mark.parametrize('name', startup.commands)
+def test_commands(options, name):
+    _, code, modules = startup.run(options + name.split())
+    assert code == startup.exit_codes.get(name, 0)
+    assert 'click' in modules
+    assert startup.heavy_imports(name, modules) == []
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+import asyncio
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from acdsc import supervisor
+from acdsc.supervisor import Child, Supervisor
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(supervisor, 'backoff', 0.01)
+    monkeypatch.setattr(supervisor, 'max_backoff', 0.04)
+    monkeypatch.setattr(supervisor, 'crash_loop', 3)
+
+
+def stub_acserver(tmp_path, script):
+    # an acServer standing in for the real one, runs script in sh
+    path = tmp_path / 'acServer'
+    path.write_text('#!/bin/sh\n{}\n'.format(script))
+    path.chmod(0o755)
+    return ['./acServer']
+
+
+def read_state(state_file):
+    with open(state_file, 'r') as fh:
+        return json.load(fh)
+
+
+async def wait_for(predicate, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+def run_until(children, predicate):
+    # run a supervisor until predicate() holds, then stop it
+    async def main():
+        sup = Supervisor(children)
+        task = asyncio.ensure_future(sup.main())
+        await wait_for(lambda: hasattr(sup, 'stopping'))
+        await wait_for(lambda: task.done() or predicate())
+        if not task.done():
+            sup.stop()
+        await asyncio.wait_for(task, 5)
+    asyncio.run(main())
+
+
+def test_crash_loop_stops_restarts(tmp_path):
+    state_file = str(tmp_path / 'acds.state')
+    child = Child('acServer', stub_acserver(tmp_path, 'exit 3'),
+                  str(tmp_path), state_file)
+    run_until([child], lambda: False)
+    state = read_state(state_file)
+    assert state['state'] == 'crash-loop'
+    assert state['restarts'] == 3
+    assert state['last_exit'] == 3
+
+
+def test_backoff_doubles():
+    child = Child('acServer', [], '.', os.devnull)
+    delays = []
+    for _ in range(4):
+        # crashes right after starting
+        child.started = time.time()
+        child.exited(1)
+        delays.append(child.delay())
+    assert delays == [0.01, 0.02, 0.04, 0.04]
+
+
+def test_restarts_after_crash(tmp_path):
+    state_file = str(tmp_path / 'acds.state')
+    # crash on the first run only
+    script = ('if [ ! -e ran ]; then touch ran; exit 1; fi\n'
+              'trap "exit 0" TERM\n'
+              'while :; do sleep 0.05; done')
+    child = Child('acServer', stub_acserver(tmp_path, script),
+                  str(tmp_path), state_file)
+
+    def running():
+        state = read_state(state_file)
+        return state['state'] == 'running' and state['restarts'] == 1
+    run_until([child], running)
+    state = read_state(state_file)
+    assert state['state'] == 'stopped'
+    assert state['restarts'] == 1
+    assert state['last_exit'] == 0
+
+
+def test_forwards_signals(tmp_path):
+    state_file = str(tmp_path / 'acds.state')
+    script = ('trap "touch hup" HUP\n'
+              'trap "exit 0" TERM\n'
+              'touch ready\n'
+              'while :; do sleep 0.05; done')
+    child = Child('acServer', stub_acserver(tmp_path, script),
+                  str(tmp_path), state_file)
+    sent = []
+
+    def forwarded():
+        if not (tmp_path / 'ready').exists():
+            return False
+        if not sent:
+            os.kill(os.getpid(), signal.SIGHUP)
+            sent.append(signal.SIGHUP)
+        return (tmp_path / 'hup').exists()
+    run_until([child], forwarded)
+    assert (tmp_path / 'hup').exists()
+    assert read_state(state_file)['restarts'] == 0
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+import os
+import subprocess as sub
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# steamcmd standing in for the real one: installs version $FAKE_VERSION
+# into +force_install_dir, exits with 5 when $FAKE_STEAMCMD is fail and
+# leaves a partial download when it is partial
+steamcmd_sh = '''#!/bin/sh
+dir=""
+while [ $# -gt 0 ]; do
+  [ "$1" = "+force_install_dir" ] && dir="$2"
+  shift
+done
+[ -z "$dir" ] && exit 0
+[ "$FAKE_STEAMCMD" = fail ] && exit 5
+mkdir -p "$dir/content/cars/a" "$dir/content/tracks/b" "$dir/steamapps" \
+  "$dir/cfg"
+printf '#!/bin/sh\\n' > "$dir/acServer"
+chmod +x "$dir/acServer"
+echo "$FAKE_VERSION" > "$dir/VERSION"
+echo "[SERVER]" > "$dir/cfg/server_cfg.ini"
+[ "$FAKE_STEAMCMD" = partial ] && flags=6 || flags=4
+printf '"AppState"\\n{\\n\\t"StateFlags"\\t\\t"%s"\\n}\\n' $flags \
+  > "$dir/steamapps/appmanifest_302550.acf"
+'''
+
+
+def write_script(path, script):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fh:
+        fh.write(script)
+    os.chmod(path, 0o755)
+
+
+def read(*path):
+    with open(os.path.join(*path), 'r') as fh:
+        return fh.read().strip()
+
+
+@pytest.fixture
+def host(tmp_path):
+    # a host with steam, steamcmd and a server installed by steamcmd, with
+    # its own configuration and results
+    directory = str(tmp_path)
+    write_script(os.path.join(directory, 'bin', 'steam'), '#!/bin/sh\n')
+    write_script(os.path.join(directory, 'steamcmd', 'steamcmd.sh'),
+                 steamcmd_sh)
+    live = os.path.join(directory, 'Steam', 'server')
+    install(directory, 1, live)
+    with open(os.path.join(live, 'cfg', 'server_cfg.ini'), 'w') as fh:
+        fh.write('[SERVER]\nNAME=host\n')
+    os.makedirs(os.path.join(live, 'results'))
+    with open(os.path.join(live, 'results', 'race.json'), 'w') as fh:
+        fh.write('{}')
+    return directory
+
+
+def run(directory, command, version, mode):
+    env = dict(os.environ, PYTHONPATH=root, FAKE_VERSION=str(version),
+               FAKE_STEAMCMD=mode,
+               PATH='{}:{}'.format(os.path.join(directory, 'bin'),
+                                   os.environ['PATH']))
+    return sub.run(command, env=env, stdout=sub.PIPE, stderr=sub.STDOUT,
+                   universal_newlines=True)
+
+
+def install(directory, version, install_dir):
+    steamcmd = os.path.join(directory, 'steamcmd', 'steamcmd.sh')
+    run(directory, [steamcmd, '+force_install_dir', install_dir], version,
+        '').check_returncode()
+
+
+def update(directory, version, mode=''):
+    return run(directory, [
+        sys.executable, os.path.join(root, 'bin', 'acdsc'),
+        '--steam-path', os.path.join(directory, 'Steam'),
+        '--server-path', 'server',
+        '--steamcmd-path', os.path.join(directory, 'steamcmd'),
+        '--pidfile', os.path.join(directory, 'acds.pid'),
+        '--cache-dir', os.path.join(directory, 'cache'),
+        '--log-dir', os.path.join(directory, 'logs'),
+        '--instances-dir', os.path.join(directory, 'instances'),
+        'update', '--staged', '--no-restart'], version, mode)
+
+
+def test_staged_update_switches_slots(host):
+    live = os.path.join(host, 'Steam', 'server')
+    result = update(host, 2)
+    assert result.returncode == 0, result.stdout
+    assert os.readlink(live) == 'server.b'
+    assert read(live, 'VERSION') == '2'
+    # the configuration and results of the host were carried over, the
+    # previous install is kept in the other slot
+    assert read(live, 'cfg', 'server_cfg.ini') == '[SERVER]\nNAME=host'
+    assert os.path.exists(os.path.join(live, 'results', 'race.json'))
+    assert read(live + '.a', 'VERSION') == '1'
+    result = update(host, 3)
+    assert result.returncode == 0, result.stdout
+    assert os.readlink(live) == 'server.a'
+    assert read(live, 'VERSION') == '3'
+    assert read(live, 'cfg', 'server_cfg.ini') == '[SERVER]\nNAME=host'
+    assert read(live + '.b', 'VERSION') == '2'
+
+
+@pytest.mark.parametrize('mode, message', [
+    ('fail', 'steamcmd exited with 5'),
+    ('partial', 'is incomplete')
+])
+def test_failed_stage_leaves_live_install(host, mode, message):
+    live = os.path.join(host, 'Steam', 'server')
+    # the first staged update moves the live directory into a slot only
+    # once the staged install is good
+    result = update(host, 2, mode)
+    assert result.returncode != 0
+    assert message in result.stdout
+    assert 'the live install was not touched' in result.stdout
+    assert not os.path.islink(live)
+    assert read(live, 'VERSION') == '1'
+    assert update(host, 2).returncode == 0
+    result = update(host, 3, mode)
+    assert result.returncode != 0
+    assert os.readlink(live) == 'server.b'
+    assert read(live, 'VERSION') == '2'
+    assert read(live, 'cfg', 'server_cfg.ini') == '[SERVER]\nNAME=host'
+    # the failed slot is reused by the next update
+    assert update(host, 3).returncode == 0
+    assert os.readlink(live) == 'server.a'
+    assert read(live, 'VERSION') == '3'
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+import os
+
+import click
+
+from acdsc.validation import validate_configs
+
+
+def make_server(root, cars, server_cfg, entry_list):
+    # a server with a track and the given cars and configuration
+    for car in cars:
+        os.makedirs(os.path.join(root, 'content', 'cars', car, 'skins',
+                                 'red'))
+    os.makedirs(os.path.join(root, 'content', 'tracks', 'monza', 'data'))
+    os.makedirs(os.path.join(root, 'cfg'))
+    config = {'server-path': root,
+              'cache-dir': os.path.join(os.path.dirname(root), 'cache'),
+              'config-file': os.path.join(root, 'cfg', 'server_cfg.ini'),
+              'entry-list': os.path.join(root, 'cfg', 'entry_list.ini')}
+    with open(config['config-file'], 'w') as fh:
+        fh.write(server_cfg)
+    with open(config['entry-list'], 'w') as fh:
+        fh.write(entry_list)
+    return config
+
+
+def messages(problems):
+    return sorted((found['instance'], found['key'], found['message'])
+                  for found in problems if found['level'] == 'error')
+
+
+def test_content_of_each_target(tmp_path):
+    # the overlay of b has a car the live server does not have
+    server_cfg = ('[SERVER]\nCARS={}\nTRACK=monza\nHTTP_PORT={}\n'
+                  'TCP_PORT={}\nUDP_PORT={}\n')
+    entry_list = '[CAR_0]\nMODEL={}\nSKIN=red\n'
+    a = make_server(str(tmp_path / 'a'), ['x'],
+                    server_cfg.format('x', 8081, 9601, 9601),
+                    entry_list.format('x'))
+    b = make_server(str(tmp_path / 'b'), ['x', 'y'],
+                    server_cfg.format('y', 8082, 9602, 9602),
+                    entry_list.format('y'))
+    targets = [('a', a), ('b', b)]
+    assert messages(validate_configs(targets)) == []
+    # whatever server the click context is about
+    with click.Context(click.Command('test'), obj=dict(a)):
+        assert messages(validate_configs(targets)) == []
+    b['server-path'] = a['server-path']
+    assert messages(validate_configs(targets)) == [
+        ('b', 'CARS', 'y not found in content/cars'),
+        ('b', 'MODEL', 'y is not a car in content/cars')]
+
+
+def test_without_content(tmp_path):
+    config = make_server(str(tmp_path / 'a'), [],
+                         '[SERVER]\nCARS=x\nTRACK=nowhere\n',
+                         '[CAR_0]\nMODEL=x\nSKIN=blue\n')
+    os.rename(os.path.join(config['server-path'], 'content'),
+              str(tmp_path / 'content'))
+    assert messages(validate_configs([('a', config)])) == []
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+import os
+
+import click
+import pytest
+
+from acdsc.parser import make_ac_parser
+from acdsc.plan import PlanError, validate_plan
+from acdsc.validators import content_index, related_problems
+
+
+def make_dirs(root, *paths):
+    for path in paths:
+        os.makedirs(os.path.join(root, path))
+
+
+@pytest.fixture
+def server(tmp_path):
+    # a server with content to validate against, in a click context
+    server_path = str(tmp_path / 'server')
+    make_dirs(server_path,
+              'content/cars/a/skins/red',
+              'content/cars/b/skins/blue',
+              'content/tracks/vallelunga/club_circuit/data',
+              'content/tracks/vallelunga/extended_circuit/data',
+              'cfg')
+    with open(os.path.join(server_path, 'cfg', 'server_cfg.ini'), 'w') as fh:
+        fh.write('[SERVER]\nTRACK=vallelunga\nCONFIG_TRACK=club_circuit\n')
+    with open(os.path.join(server_path, 'cfg', 'entry_list.ini'), 'w') as fh:
+        fh.write('[CAR_0]\nMODEL=a\nSKIN=red\n')
+    config = {
+        'server-path': server_path,
+        'cache-dir': str(tmp_path / 'cache'),
+        'parser': make_ac_parser(
+            os.path.join(server_path, 'cfg', 'server_cfg.ini')),
+        'entry-parser': make_ac_parser(
+            os.path.join(server_path, 'cfg', 'entry_list.ini'))
+    }
+    with click.Context(click.Command('test'), obj=config):
+        yield config
+
+
+def plan_errors(plan, config):
+    with pytest.raises(PlanError) as err:
+        validate_plan(plan, config)
+    return err.value.errors
+
+
+@pytest.mark.parametrize('values', [
+    {'skin': 'red', 'model': 'b'},
+    {'model': 'b', 'skin': 'red'}
+])
+def test_skin_checked_whatever_the_order(server, values):
+    errors = plan_errors({'entries': {'set': {'0': values},
+                                      'add': [values]}}, server)
+    assert errors == ['entries.set.0.SKIN: red is not a skin of b',
+                      'entries.add.0.SKIN: red is not a skin of b']
+
+
+@pytest.mark.parametrize('values', [
+    {'config_track': 'club_circuit', 'track': 'monza'},
+    {'track': 'vallelunga', 'config_track': 'gp'}
+])
+def test_layout_checked_against_planned_track(server, values):
+    if values['track'] == 'monza':
+        make_dirs(server['server-path'], 'content/tracks/monza/data')
+    errors = plan_errors({'server': values}, server)
+    assert len(errors) == 1
+    assert errors[0].startswith('server.CONFIG_TRACK: ')
+
+
+def test_unchanged_settings_are_not_checked(server):
+    values = {'MODEL': 'b', 'SKIN': 'red', 'DRIVERNAME': 'x'}
+    index = content_index()
+    assert related_problems(index, values, ['DRIVERNAME']) == []
+    assert related_problems(index, values, ['MODEL']) == [
+        ('SKIN', 'red is not a skin of b')]
+    assert validate_plan({'server': {'config_track': 'extended_circuit'}},
+                         server)['server'] == {
+        'CONFIG_TRACK': 'extended_circuit'}
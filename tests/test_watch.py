@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+import os
+import subprocess as sub
+import sys
+import threading
+import time
+
+import pytest
+
+from acdsc import inotify
+from acdsc.watch import ConfigWatch, needs_restart
+from benchmarks import startup
+
+pytestmark = pytest.mark.skipif(not inotify.available(),
+                                reason='inotify is not available')
+
+server_cfg = '[SERVER]\nNAME=test\nTRACK={}\n\n[RACE]\nNAME={}\nLAPS=5\n'
+entry_list = '[CAR_0]\nMODEL=a\nDRIVERNAME={}\n'
+
+
+def replace(path, text):
+    # written like the tooling writes them, a new copy renamed over
+    temp_file = '{}.tmp'.format(path)
+    with open(temp_file, 'w') as fh:
+        fh.write(text)
+    os.replace(temp_file, path)
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = {'config-file': str(tmp_path / 'server_cfg.ini'),
+              'entry-list': str(tmp_path / 'entry_list.ini')}
+    replace(config['config-file'], server_cfg.format('monza', 'Race'))
+    replace(config['entry-list'], entry_list.format('a'))
+    return config
+
+
+@pytest.fixture
+def watch(config):
+    watcher = ConfigWatch([('test', config)], 0.2)
+    yield watcher, watcher.changes()
+    watcher.close()
+
+
+def test_needs_restart():
+    assert needs_restart(['CAR_3.DRIVERNAME', 'CAR_3.TEAM', 'RACE.NAME',
+                          'QUALIFY.NAME']) == []
+    assert needs_restart(['SERVER.NAME', 'CAR_3.MODEL', 'RACE.LAPS',
+                          'WEATHER_0.GRAPHICS', 'UNKNOWN.NAME']) == [
+        'SERVER.NAME', 'CAR_3.MODEL', 'RACE.LAPS', 'WEATHER_0.GRAPHICS',
+        'UNKNOWN.NAME']
+
+
+def test_names_change_without_restart(config, watch):
+    watcher, changes = watch
+    replace(config['entry-list'], entry_list.format('b'))
+    replace(config['config-file'], server_cfg.format('monza', 'Sprint'))
+    name, changed, restart, _ = next(changes)
+    assert name == 'test'
+    assert changed == ['CAR_0.DRIVERNAME', 'RACE.NAME']
+    assert restart == []
+
+
+def test_restart_when_a_restart_setting_changes(config, watch):
+    watcher, changes = watch
+    replace(config['entry-list'], entry_list.format('b'))
+    replace(config['config-file'], server_cfg.format('spa', 'Race'))
+    _, changed, restart, _ = next(changes)
+    assert changed == ['CAR_0.DRIVERNAME', 'SERVER.TRACK']
+    assert restart == ['SERVER.TRACK']
+
+
+def test_writes_are_debounced(config, watch):
+    watcher, changes = watch
+    for track in ('a', 'b', 'c', 'd', 'e'):
+        replace(config['config-file'], server_cfg.format(track, 'Race'))
+        time.sleep(0.05)
+    written = time.monotonic()
+    name, changed, _, settings = next(changes)
+    assert time.monotonic() - written >= 0.15
+    assert settings[('server', 'SERVER', 'TRACK')] == 'e'
+    # the burst was a single change: once applied, the next change is all
+    # that is reported
+    watcher.applied[name] = settings
+    replace(config['entry-list'], entry_list.format('b'))
+    assert next(changes)[1] == ['CAR_0.DRIVERNAME']
+
+
+def test_watch_command(tmp_path):
+    options = startup.make_environment(str(tmp_path))
+    config_file = str(tmp_path / 'server' / 'cfg' / 'server_cfg.ini')
+    with open(config_file, 'r') as fh:
+        original = fh.read()
+    # a running server as far as acdsc can tell, watched with --no-restart
+    server = sub.Popen(['sleep', '30'])
+    pidfile = tmp_path / 'acds.pid'
+    pidfile.write_text('{}'.format(server.pid))
+    env = dict(os.environ, PYTHONPATH=startup.root)
+    process = sub.Popen(
+        [sys.executable, startup.script] + options + [
+            'watch', '-d', '0.1', '--no-restart'],
+        env=env, stdout=sub.PIPE, universal_newlines=True)
+    timer = threading.Timer(10, process.kill)
+    timer.start()
+    try:
+        assert process.stdout.readline().startswith('Watching 1 ')
+        replace(config_file, original + '\n[RACE]\nNAME=Sprint\n')
+        assert process.stdout.readline().split() == [
+            'default:', 'changed', 'RACE.NAME']
+        assert process.stdout.readline().strip() == (
+            'default: pending until the next restart')
+        # still pending, reported with the next change
+        sessions = '\n[QUALIFY]\nNAME=Q\n\n[RACE]\nNAME={}\n'
+        replace(config_file, original + sessions.format('Sprint'))
+        assert process.stdout.readline().split() == [
+            'default:', 'changed', 'QUALIFY.NAME,', 'RACE.NAME']
+        assert process.stdout.readline().strip() == (
+            'default: pending until the next restart')
+        # the server is not running, it starts with the new configuration
+        # and nothing is left pending
+        pidfile.unlink()
+        changed = original.replace('ks_vallelunga', 'monza')
+        replace(config_file, changed + sessions.format('Sprint'))
+        assert process.stdout.readline().split() == [
+            'default:', 'changed', 'QUALIFY.NAME,', 'RACE.NAME,',
+            'SERVER.TRACK']
+        replace(config_file, changed + sessions.format('Final'))
+        assert process.stdout.readline().split() == [
+            'default:', 'changed', 'RACE.NAME']
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+        server.kill()
+        server.wait()